@@ -0,0 +1,374 @@
+# Vectorized rules engine: thousands of games held as NumPy arrays and moved
+# forward one turn at a time, all together, for bot training and for
+# simulate.py --engine batch. Needs numpy (the rest of the project doesn't).
+#
+# Each game's state is a row: hands as card counts over the 54 card kinds
+# (games x seats x kinds), deck and discard pile as card id stacks, and the
+# top card, chosen wild color, pending draw, direction and current seat.
+# Legal moves for every game come from one lookup into the CAN_PLAY_ON table
+# by match key, exactly as card.Game does it, and plays, draws, penalties and
+# passes are applied to all the games that make them in one step.
+#
+# Games are dealt from the same seeds as card.Game and record the same move
+# stream (Game.moves), so any game can be replayed through card.Game and
+# compared with the arrays; --check does that for every game.
+#
+#   python batch.py --games 20000 --players 4 --policies greedy
+#   python batch.py --games 2000 --check
+
+import argparse
+import random
+import time
+import numpy as np
+import replay
+from card import BLACK
+from card import CAN_PLAY_ON
+from card import CARD_COLOR_INDEX
+from card import CARD_KINDS
+from card import CARD_VALUE_INDEX
+from card import COLORS
+from card import DECK_SIZE
+from card import FULL_DECK_IDS
+from card import MOVE_DRAW
+from card import MOVE_PASS
+from card import MOVE_PENALTY
+from card import MOVE_PLAY
+from card import STACK_KEYS
+from card import WILD_KEYS
+
+MAX_TURNS = 500  # Same limit as simulate.py
+HAND_SIZE = 7  # Cards dealt to each player, as Deck.deal does
+BATCH_SIZE = 4096  # Games held in memory at once by run_games
+
+# Per card id tables. PLAYABLE has CAN_PLAY_ON's rows plus a last one for
+# "no top card yet, anything goes" (match key None in card.Game).
+ANY_KEY = len(CAN_PLAY_ON)
+PLAYABLE = np.array([list(row) for row in CAN_PLAY_ON] + [[1] * len(CARD_KINDS)], dtype=bool)
+CARD_COLOR = np.frombuffer(CARD_COLOR_INDEX, dtype=np.uint8).astype(np.intp)
+CARD_STACK_KEY = np.array(STACK_KEYS)[np.frombuffer(CARD_VALUE_INDEX, dtype=np.uint8)]
+COLOR_MATRIX = np.eye(BLACK + 1, dtype=np.int16)[CARD_COLOR]  # hand counts @ this = color counts
+FIRST_WILD_KEY = WILD_KEYS[COLORS[0]]
+IS_SKIP = np.array([value == 'Skip' for _, value in CARD_KINDS])
+IS_REVERSE = np.array([value == 'Reverse' for _, value in CARD_KINDS])
+DRAW_PENALTY = np.array([2 if value == 'Draw Two' else 4 if value == 'Wild Draw Four' else 0
+                         for _, value in CARD_KINDS], dtype=np.int16)
+IS_ACTION = np.array([not value.isdigit() for _, value in CARD_KINDS], dtype=np.int16)
+IS_COLORED = CARD_COLOR != BLACK
+
+
+class BatchGames:
+    # `seeds` gives one game each; every game has `num_players` seats named
+    # p0, p1, ... With record=False the move streams aren't kept, which saves
+    # memory but means games can't be replayed or checked.
+    def __init__(self, seeds, num_players, max_turns=MAX_TURNS, record=True, rng=None):
+        count = len(seeds)
+        self.seeds = list(seeds)
+        self.num_players = num_players
+        self.names = [f"p{seat}" for seat in range(num_players)]
+        self.rng = rng if rng is not None else np.random.default_rng()  # For the random policy
+        # Each deck shuffles with its own random.Random, like Deck.rng, so
+        # the deal and every reshuffle match card.Game for the same seed
+        self.deck_rngs = [random.Random(seed) for seed in self.seeds]
+        self.deck = np.empty((count, DECK_SIZE), dtype=np.uint8)
+        for index, deck_rng in enumerate(self.deck_rngs):
+            ids = list(FULL_DECK_IDS)
+            deck_rng.shuffle(ids)
+            self.deck[index] = ids
+
+        # Deal from the top of the deck, one card per seat per round
+        dealt = HAND_SIZE * num_players
+        order = self.deck[:, DECK_SIZE - dealt:][:, ::-1].reshape(count, HAND_SIZE, num_players)
+        self.hands = np.zeros((count, num_players, len(CARD_KINDS)), dtype=np.int8)
+        np.add.at(self.hands, (np.arange(count)[:, None, None], np.arange(num_players), order), 1)
+        self.deck_size = np.full(count, DECK_SIZE - dealt, dtype=np.intp)
+        self.discard = np.zeros((count, DECK_SIZE), dtype=np.uint8)
+        self.discard_size = np.zeros(count, dtype=np.intp)
+
+        self.top = np.full(count, -1, dtype=np.intp)  # Top card id, -1 before the first play
+        self.wild_color = np.full(count, -1, dtype=np.intp)  # Index into COLORS, -1 if no wild on top
+        self.pending = np.zeros(count, dtype=np.int16)  # Cards owed after Draw Two / Wild Draw Four
+        self.direction = np.ones(count, dtype=np.intp)
+        self.current = np.zeros(count, dtype=np.intp)
+        self.winner = np.full(count, -1, dtype=np.intp)  # Winning seat
+        self.stalled = np.zeros(count, dtype=bool)
+        self.turns = np.zeros(count, dtype=np.intp)
+        self.idle_turns = np.zeros(count, dtype=np.intp)  # Turns in a row with no card played and no deck
+
+        # Move streams in Game.moves format; a turn adds at most two moves
+        self.moves = np.zeros((count, 4 * max_turns if record else 0), dtype=np.uint8)
+        self.moves_size = np.zeros(count, dtype=np.intp)
+        self.record = record
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def live(self):
+        # Indexes of the games still being played
+        return np.flatnonzero((self.winner < 0) & ~self.stalled)
+
+    def match_keys(self, games):
+        # match_key() for each game: the row of PLAYABLE that applies now
+        top = self.top[games]
+        card = np.maximum(top, 0)
+        wild = self.wild_color[games]
+        keys = np.where(wild >= 0, FIRST_WILD_KEY + wild, card)
+        keys = np.where(self.pending[games] > 0, CARD_STACK_KEY[card], keys)
+        return np.where(top < 0, ANY_KEY, keys)
+
+    def legal_mask(self, games):
+        # games x card kinds: which cards the current player holds and may play
+        return (self.hands[games, self.current[games]] > 0) & PLAYABLE[self.match_keys(games)]
+
+    def step(self, policies):
+        # One turn in every live game, following simulate.play_turn: play a
+        # legal card if there is one; otherwise take the draw penalty, or
+        # draw once and play if that made a move possible, else pass.
+        # policies[seat] picks a card for the games where that seat is up.
+        games = self.live()
+        legal = self.legal_mask(games)
+        can_play = legal.any(axis=1)
+        stuck = games[~can_play]
+        owing = self.pending[stuck] > 0
+        self.take_penalty(stuck[owing])
+
+        drawing = stuck[~owing]
+        self.record_moves(drawing, MOVE_DRAW)
+        drew = self.draw(drawing)
+        drawn = drawing[drew]
+        drawn_legal = self.legal_mask(drawn)
+        drawn_can_play = drawn_legal.any(axis=1)
+        passing = np.concatenate((drawing[~drew], drawn[~drawn_can_play]))
+        self.record_moves(passing, MOVE_PASS)
+        self.advance(passing, 1)
+
+        playing = np.concatenate((games[can_play], drawn[drawn_can_play]))
+        playing_legal = np.concatenate((legal[can_play], drawn_legal[drawn_can_play]))
+        cards = np.empty(len(playing), dtype=np.intp)
+        seats = self.current[playing]
+        for policy in dict.fromkeys(policies):  # In seat order, so runs repeat exactly
+            chosen = np.isin(seats, [seat for seat, seat_policy in enumerate(policies) if seat_policy is policy])
+            if chosen.any():
+                cards[chosen] = policy(self, playing[chosen], playing_legal[chosen])
+        self.play(playing, cards)
+
+        # Same stall rule as simulate.play_game
+        self.turns[games] += 1
+        self.idle_turns[playing] = 0
+        idle = np.setdiff1d(games, playing, assume_unique=True)
+        idle = idle[self.deck_size[idle] == 0]
+        self.idle_turns[idle] += 1
+        self.stalled[idle[self.idle_turns[idle] >= self.num_players]] = True
+
+    def run(self, policies, max_turns=MAX_TURNS):
+        # Play every game to the end; games still going after max_turns
+        # count as stalled
+        for _ in range(max_turns):
+            if not len(self.live()):
+                break
+            self.step(policies)
+        self.stalled[self.live()] = True
+
+    def record_moves(self, games, op, args=0):
+        if not self.record or not len(games):
+            return
+        position = self.moves_size[games]
+        self.moves[games, position] = op
+        self.moves[games, position + 1] = args
+        self.moves_size[games] += 2
+
+    def advance(self, games, steps):
+        self.current[games] = (self.current[games] + steps * self.direction[games]) % self.num_players
+
+    def draw(self, games):
+        # The current player draws one card in each game, reshuffling the
+        # discard pile where the deck is empty. Returns a mask of the games
+        # where a card was drawn.
+        for index in games[self.deck_size[games] == 0]:
+            self.reshuffle(index)
+        drew = self.deck_size[games] > 0
+        games = games[drew]
+        self.deck_size[games] -= 1
+        cards = self.deck[games, self.deck_size[games]]
+        self.hands[games, self.current[games], cards] += 1
+        return drew
+
+    def reshuffle(self, index):
+        # Deck.recycle for one game: everything under the top card goes back
+        # into the (empty) deck and is shuffled with the game's own Random
+        count = self.discard_size[index] - 1
+        if count < 1:
+            return
+        ids = self.discard[index, :count].tolist()
+        self.discard[index, 0] = self.discard[index, count]
+        self.discard_size[index] = 1
+        self.deck_rngs[index].shuffle(ids)
+        self.deck[index, :count] = ids
+        self.deck_size[index] = count
+
+    def take_penalty(self, games):
+        # Game.take_penalty: draw everything owed (fewer if the cards run
+        # out) and lose the turn
+        self.record_moves(games, MOVE_PENALTY)
+        owed = self.pending[games].astype(np.intp)
+        while True:
+            owing = np.flatnonzero(owed > 0)
+            if not len(owing):
+                break
+            drew = self.draw(games[owing])
+            owed[owing] -= 1
+            owed[owing[~drew]] = 0
+        self.pending[games] = 0
+        self.advance(games, 1)
+
+    def play(self, games, cards):
+        # Game.play_card for a legal card in each game. Wilds are called as
+        # the color the player then holds most of, as play_card does when no
+        # color is given.
+        seats = self.current[games]
+        self.hands[games, seats, cards] -= 1
+        self.discard[games, self.discard_size[games]] = cards
+        self.discard_size[games] += 1
+        self.top[games] = cards
+        wild = ~IS_COLORED[cards]
+        color_counts = self.hands[games, seats] @ COLOR_MATRIX
+        colors = np.where(wild, color_counts[:, :len(COLORS)].argmax(axis=1), -1)
+        self.wild_color[games] = colors
+        self.record_moves(games, MOVE_PLAY, cards | np.maximum(colors, 0) << 6)
+
+        # Card effects, see card.EFFECTS
+        steps = np.where(IS_SKIP[cards], 2, 1)
+        reversing = IS_REVERSE[cards]
+        if self.num_players == 2:
+            steps[reversing] = 2
+        else:
+            self.direction[games[reversing]] *= -1
+        self.pending[games] += DRAW_PENALTY[cards]
+
+        out = self.hands[games, seats].sum(axis=1) == 0
+        self.winner[games[out]] = seats[out]
+        self.advance(games[~out], steps[~out])
+
+    def game_moves(self, index):
+        return bytes(self.moves[index, :self.moves_size[index]])
+
+    def replay(self, index):
+        # The game played again on card.Game from its seed and move stream
+        if not self.record:
+            raise ValueError("Moves weren't recorded for this batch")
+        return replay.replay(self.seeds[index], self.names, self.game_moves(index))
+
+    def check(self, index):
+        # Replay one game through card.Game and compare every part of the
+        # final state with the arrays. Returns the Game; raises ValueError
+        # naming the first difference.
+        game = self.replay(index)
+        wild = COLORS[self.wild_color[index]] if self.wild_color[index] >= 0 else None
+        winner = self.names[self.winner[index]] if self.winner[index] >= 0 else None
+        expected = [
+            ('deck', bytes(self.deck[index, :self.deck_size[index]]), game.deck.to_ids()),
+            ('discard pile', bytes(self.discard[index, :self.discard_size[index]]), game.discard_pile.to_ids()),
+            ('current seat', int(self.current[index]), game.current_index),
+            ('direction', int(self.direction[index]), game.direction),
+            ('wild color', wild, game.wild_color),
+            ('pending draw', int(self.pending[index]), game.pending_draw),
+            ('winner', winner, game.winner),
+        ]
+        for seat, name in enumerate(self.names):
+            expected.append((f"{name}'s hand", bytes(self.hands[index, seat].astype(np.uint8)),
+                             bytes(game.player_hands[name].counts)))
+        for what, ours, theirs in expected:
+            if ours != theirs:
+                raise ValueError(f"Game {index} (seed {self.seeds[index]}): {what} is {ours!r}, card.Game has {theirs!r}")
+        return game
+
+
+# Policies pick a card in many games at once: policy(batch, games, legal)
+# gets the games' indexes and their legal move masks and returns card ids.
+# They make the same choice as the policies in simulate.py.
+
+def random_policy(batch, games, legal):
+    # Uniform over the legal kinds: the legal card with the highest random key
+    return np.where(legal, batch.rng.random(legal.shape), -1).argmax(axis=1)
+
+def greedy_policy(batch, games, legal):
+    # simulate.greedy_policy: wilds only when nothing else fits; otherwise
+    # the most-held color, action cards before numbers, lowest id on a tie
+    color_counts = batch.hands[games, batch.current[games]] @ COLOR_MATRIX
+    score = color_counts[:, CARD_COLOR] * 2 + IS_ACTION
+    colored = legal & IS_COLORED
+    best = np.where(colored, score, -1).argmax(axis=1)
+    return np.where(colored.any(axis=1), best, legal.argmax(axis=1))
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+}
+
+
+def run_games(num_games, policy_names, seed, max_turns=MAX_TURNS, record=False, on_batch=None):
+    # simulate.run_batch on the batch engine, BATCH_SIZE games at a time.
+    # Seeds come from random.Random(seed) the way simulate.play_game draws
+    # them, so with only greedy players (no random choices) both engines
+    # play exactly the same games. on_batch(batch) sees each finished batch.
+    seeds = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    policies = [POLICIES[name] for name in policy_names]
+    wins = [0] * len(policies)
+    stalled = 0
+    turns = 0
+    for start in range(0, num_games, BATCH_SIZE):
+        size = min(BATCH_SIZE, num_games - start)
+        batch = BatchGames([seeds.getrandbits(64) for _ in range(size)], len(policies), max_turns, record, rng)
+        batch.run(policies, max_turns)
+        stalled += int(batch.stalled.sum())
+        turns += int(batch.turns.sum())
+        for seat, count in enumerate(np.bincount(batch.winner[batch.winner >= 0], minlength=len(policies))):
+            wins[seat] += int(count)
+        if on_batch is not None:
+            on_batch(batch)
+    return {'games': num_games, 'wins': wins, 'stalled': stalled, 'turns': turns}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run UNO games on the vectorized batch engine")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--policies', default='random',
+                        help=f"comma separated, cycled over the seats ({', '.join(POLICIES)})")
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--check', action='store_true',
+                        help="replay every game through card.Game and compare the final states")
+    args = parser.parse_args()
+
+    names = args.policies.split(',')
+    for name in names:
+        if name not in POLICIES:
+            parser.error(f"unknown policy {name}")
+    if not 2 <= args.players <= 10:
+        parser.error("--players must be between 2 and 10")
+    seat_policies = [names[seat % len(names)] for seat in range(args.players)]
+
+    mismatches = []
+
+    def check_batch(batch):
+        for index in range(len(batch)):
+            try:
+                batch.check(index)
+            except ValueError as e:
+                mismatches.append(str(e))
+
+    start = time.perf_counter()
+    stats = run_games(args.games, seat_policies, args.seed, args.max_turns, args.check,
+                      check_batch if args.check else None)
+    elapsed = time.perf_counter() - start
+    games = stats['games']
+    print(f"Played {games} games in {elapsed:.2f}s ({games / elapsed:,.0f} games/sec, seed {args.seed})")
+    print(f"Average game length: {stats['turns'] / games:.1f} turns, stalled: {stats['stalled']}")
+    for seat, name in enumerate(seat_policies):
+        print(f"  seat {seat} ({name}): {stats['wins'][seat]} wins ({100 * stats['wins'][seat] / games:.1f}%)")
+    if args.check:
+        for mismatch in mismatches[:10]:
+            print(mismatch)
+        print(f"Checked against card.Game: {games - len(mismatches)} of {games} games match")
+        raise SystemExit(1 if mismatches else 0)
@@ -0,0 +1,189 @@
+# AI opponents. A bot sits at a table like any other username; when it is its
+# turn the server takes a GameView snapshot (only what that seat may know) and
+# hands it to a worker process, so a slow search never holds up the server.
+#
+# A strategy answers with the card to play, or None to draw / pass.
+
+import random
+import time
+from card import CARD_COLOR_INDEX
+from card import CARDS
+from card import Deck
+from card import Game
+from card import Hand
+from card import match_key
+from simulate import greedy_policy
+from simulate import play_turn
+
+# Cards of each kind in a full deck, used to work out which cards are unseen
+FULL_DECK_COUNTS = Hand(Deck(verbose=False)).counts
+
+
+class GameView:
+    # What one seat can see of a game, copied out so that a worker can think
+    # about it while the real game moves on. Picklable.
+    def __init__(self, player_name, hand, top_card, wild_color, pending_draw, players, hand_sizes,
+                 current_index, direction, discard_pile, deck_size, has_drawn):
+        self.player_name = player_name
+        self.hand = hand  # A Hand
+        self.top_card = top_card
+        self.wild_color = wild_color
+        self.pending_draw = pending_draw
+        self.match_key = match_key(top_card, wild_color, pending_draw)
+        self.players = players
+        self.hand_sizes = hand_sizes  # Username -> number of cards held
+        self.current_index = current_index
+        self.direction = direction
+        self.discard_pile = discard_pile  # Card ids, bottom first
+        self.deck_size = deck_size
+        self.has_drawn = has_drawn
+
+    @classmethod
+    def from_game(cls, game, player_name):
+        return cls(
+            player_name,
+            Hand(game.player_hands[player_name]),
+            game.top_card,
+            game.wild_color,
+            game.pending_draw,
+            list(game.players),
+            {name: len(hand) for name, hand in game.player_hands.items()},
+            game.current_index,
+            game.direction,
+            game.discard_pile.to_ids(),
+            len(game.deck),
+            game.players_drawn.get(player_name, False),
+        )
+
+    def legal_moves(self):
+        return self.hand.playable(self.match_key)
+
+    def unseen_cards(self):
+        # Everything not in our hand and not on the discard pile: these are
+        # spread over the opponents' hands and the deck in some unknown way.
+        counts = bytearray(FULL_DECK_COUNTS)
+        for card_id, count in enumerate(self.hand.counts):
+            counts[card_id] -= min(count, counts[card_id])
+        for card_id in self.discard_pile:
+            if counts[card_id]:
+                counts[card_id] -= 1
+        unseen = []
+        for card_id, count in enumerate(counts):
+            unseen.extend([CARDS[card_id]] * count)
+        return unseen
+
+
+class Strategy:
+    name = None
+
+    def choose(self, view, deadline):
+        # Return a Card from view.legal_moves(), or None to draw / pass.
+        # `deadline` is a time.perf_counter() value to be done by.
+        raise NotImplementedError
+
+
+class HeuristicStrategy(Strategy):
+    # Cheap rules of thumb: keep wilds for emergencies, stay in the color we
+    # hold most of, and play action cards when the next player is close to
+    # going out.
+    name = 'heuristic'
+
+    def choose(self, view, deadline):
+        moves = view.legal_moves()
+        if not moves:
+            return None
+        colored = [card for card in moves if card.color != 'Black']
+        if not colored:
+            return moves[0]
+        next_player = view.players[(view.current_index + view.direction) % len(view.players)]
+        threatened = view.hand_sizes.get(next_player, 7) <= 2
+        color_counts = view.hand.color_counts
+
+        def score(card):
+            is_action = not card.value.isdigit()
+            return (threatened and is_action, color_counts[CARD_COLOR_INDEX[card.id]], is_action)
+        return max(colored, key=score)
+
+
+class MonteCarloStrategy(Strategy):
+    # For each legal move, repeatedly guess the hidden cards (deal the unseen
+    # cards at random into hands of the right sizes and the deck), play the
+    # move, finish the game with greedy play and count how often we win.
+    # Keeps sampling until the deadline, then picks the best average.
+    name = 'mc'
+    rollout_turns = 200  # Rollouts that run longer are scored by hand size
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.fallback = HeuristicStrategy()
+
+    def choose(self, view, deadline):
+        moves = view.legal_moves()
+        if len(moves) <= 1:
+            return moves[0] if moves else None
+        unseen = view.unseen_cards()
+        totals = {card: 0.0 for card in moves}
+        rollouts = 0
+        while time.perf_counter() < deadline:
+            for card in moves:
+                totals[card] += self.rollout(view, card, unseen)
+            rollouts += 1
+        if not rollouts:
+            return self.fallback.choose(view, deadline)
+        return max(moves, key=totals.__getitem__)
+
+    def rollout(self, view, card, unseen):
+        rng = self.rng
+        game = self.determinize(view, unseen)
+        me = view.player_name
+        game.play_card(me, card)
+        if game.winner is not None:
+            return 1.0
+        for _ in range(self.rollout_turns):
+            player_name = game.players[game.current_index]
+            play_turn(game, player_name, greedy_policy, rng)
+            if game.winner is not None:
+                return 1.0 if game.winner == me else 0.0
+        # No winner yet: credit having fewer cards than the others
+        mine = len(game.player_hands[me])
+        best_other = min(len(hand) for name, hand in game.player_hands.items() if name != me)
+        return 0.5 if mine < best_other else 0.0
+
+    def determinize(self, view, unseen):
+        # Build a Game consistent with everything this seat knows
+        pool = list(unseen)
+        self.rng.shuffle(pool)
+        game = Game(Deck(verbose=False))
+        game.players = list(view.players)
+        game.players_drawn = {name: False for name in view.players}
+        game.players_drawn[view.player_name] = view.has_drawn
+        game.player_hands = {}
+        for name in view.players:
+            if name == view.player_name:
+                game.player_hands[name] = Hand(view.hand)
+            else:
+                size = view.hand_sizes.get(name, 0)
+                game.player_hands[name] = Hand(pool[:size])
+                del pool[:size]
+        game.deck.load(pool)
+        game.top_card = view.top_card
+        game.wild_color = view.wild_color
+        game.pending_draw = view.pending_draw
+        game.update_match_key()
+        game.discard_pile.load_ids(view.discard_pile)
+        game.current_index = view.current_index
+        game.direction = view.direction
+        return game
+
+
+STRATEGIES = {
+    HeuristicStrategy.name: HeuristicStrategy,
+    MonteCarloStrategy.name: MonteCarloStrategy,
+}
+
+
+def choose_move(strategy_name, view, budget):
+    # Worker pool entry point. Returns a card id, or None to draw / pass.
+    deadline = time.perf_counter() + budget
+    card = STRATEGIES[strategy_name]().choose(view, deadline)
+    return None if card is None else card.id
@@ -1,154 +1,584 @@
+import logging
 import random
+import zlib
+
+log = logging.getLogger('card')
+
+# Every game records its moves in Game.moves, two bytes each: an op and its
+# argument. With the seed the deck was shuffled with, that is enough to play
+# the game again exactly (see replay.py).
+MOVE_PLAY = 0  # Argument: card id, plus the chosen color's index << 6 for a wild
+MOVE_DRAW = 1
+MOVE_PENALTY = 2
+MOVE_PASS = 3
+MOVE_LEAVE = 4  # Argument: the seat that left
 
 class Game:
-    def start_game(self):
-        # Shuffle and deal the cards here, then set starting_top_card to None
+    # The rules. Every card has an effect handler (CARD_EFFECTS, looked up by
+    # card id) and what may be played next is a single match key into the
+    # PLAYABLE_ON / CAN_PLAY_ON tables (see match_key), so checking or
+    # applying a move never searches anything.
+    def start_game(self, seed=None):
+        # Shuffle and deal the cards here, then set starting_top_card to None.
+        # The deck gets its own generator seeded with `seed` (a fresh random
+        # one if not given), so the deal and every reshuffle follow from it.
+        self.reset()
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.deck.rng = random.Random(self.seed)
         self.deck.shuffle()
         self.player_hands = self.deck.deal(self.players)
 
         # Let the game begin without a starting top card
         self.top_card = None
+        if self.journal is not None:
+            self.journal.started(self)
 
         return self.player_hands
     
     def draw_card(self, player_name):
         # Draw only 1 card from the deck and add it to the player's hand.
-        if not self.deck.cards:  # If the deck is empty, reshuffle the discard pile
+        self.moves += bytes((MOVE_DRAW, 0))
+        return self._draw(player_name)
+
+    def _draw(self, player_name):
+        deck = self.deck
+        if not deck.size:  # If the deck is empty, reshuffle the discard pile
             self.reshuffle_discard_pile()
-        if self.deck.cards:
-            card = self.deck.cards.pop()
+        if deck.size:
+            deck.size -= 1
+            card = CARDS[deck.ids[deck.size]]
             self.player_hands[player_name].append(card)
             self.players_drawn[player_name] = True
+            if self.journal is not None:
+                self.journal.drew(self, player_name, card)
             return card  # Return the drawn card not as a list, but rather as a Card object
         return None  # If no cards in the deck, return None
 
+    def take_penalty(self, player_name):
+        # The player couldn't (or wouldn't) stack on a Draw Two / Wild Draw
+        # Four: they draw everything owed and lose their turn. Returns the
+        # cards drawn.
+        self.moves += bytes((MOVE_PENALTY, 0))
+        drawn = []
+        for _ in range(self.pending_draw):
+            card = self._draw(player_name)
+            if card is None:
+                break
+            drawn.append(card)
+        self.pending_draw = 0
+        self.update_match_key()
+        self._advance(1)
+        return drawn
+
+    def reshuffle_discard_pile(self):
+        # Turn everything under the top card back into the deck
+        if self.discard_pile.size < 2:
+            return
+        self.deck.recycle(self.discard_pile)
+        if self.journal is not None:
+            self.journal.reshuffled(self)
+
     # Modify or add a method to set the top card when the first player plays
     def set_top_card(self, card):
         self.top_card = card
+        self.update_match_key()
         
     def __init__(self, deck):
         self.deck = deck  # Use the deck instance passed in as an argument
-        self.discard_pile = []  # Initialize an empty discard pile        
+        self.discard_pile = CardArray()  # Initialize an empty discard pile
         self.players = []  # Will keep track of player order
         self.players_drawn = {}  # Initialize the empty dictionary for tracking draws
         self.top_card = None
+        self.wild_color = None  # Color chosen for the wild on top, if it is one
+        self.pending_draw = 0  # Cards owed by the current player after Draw Two / Wild Draw Four
+        self.match_key = None  # Row of PLAYABLE_ON that applies now; None means anything goes
+        self.winner = None
         self.direction = 1  # 1 for clockwise, -1 for counter-clockwise
         self.current_index = 0
         self.player_hands = {}  # Initialize the player_hands dictionary here
+        self.journal = None  # Optional persistence.Journal that records every change
+        self.seed = None  # What the deck was shuffled with; None for a restored game
+        self.moves = bytearray()  # Move stream since start_game, see MOVE_PLAY
 
 
+    def reset(self):
+        # Ready for another game with the same players and storage
+        self.deck.reset()
+        self.discard_pile.clear()
+        self.top_card = None
+        self.wild_color = None
+        self.pending_draw = 0
+        self.match_key = None
+        self.winner = None
+        self.direction = 1
+        self.current_index = 0
+        self.players_drawn = {player_name: False for player_name in self.players}
+        self.moves.clear()
+
     def add_player(self, player_name):
         self.players.append(player_name)
         self.players_drawn[player_name] = False  # Initialize draw tracking to False
 
+    def remove_player(self, player_name):
+        # Take a player out of the turn order, keeping the turn on a valid seat
+        if player_name in self.players:
+            index = self.players.index(player_name)
+            self.moves += bytes((MOVE_LEAVE, index))
+            self.players.remove(player_name)
+            # Seats after the leaver move down one; if the leaver had the
+            # turn it passes on in the current direction
+            if index < self.current_index or (index == self.current_index and self.direction == -1):
+                self.current_index -= 1
+            if self.journal is not None:
+                self.journal.removed(self, player_name)
+        self.players_drawn.pop(player_name, None)
+        if self.players:
+            self.current_index %= len(self.players)
+
     def set_starting_top_card(self):
         # Make sure there's a card to draw
-        if self.deck.cards:
-            self.top_card = self.deck.cards.pop()
+        if self.deck:
+            self.set_top_card(self.deck.draw())
     def can_play_card(self, player_name, card):
-        current_player = self.get_current_player()
-        if player_name != current_player:
+        if player_name != self.players[self.current_index]:
             # It's not the player's turn
             return False
+        return self.is_playable(card)
 
-        # Check if the card being played matches the top card's color or value,
-        # or if it's a wild card.
-        if (card.color == self.top_card.color or
-            card.value == self.top_card.value or
-            card.color == 'Black'):  # Assuming 'Black' is the color for Wild cards
+    def update_match_key(self):
+        self.match_key = match_key(self.top_card, self.wild_color, self.pending_draw)
+
+    def is_playable(self, card):
+        # Does the card match the top card's color (or the color chosen for a
+        # wild) or value, or is it a wild? While a draw penalty is pending
+        # only the same draw card may be stacked. One table lookup.
+        if self.match_key is None:
             return True
-        else:
-            # The card does not match the color or value, and it's not a wild card
-            return False
+        return CAN_PLAY_ON[self.match_key][card.id] == 1
+
+    def has_legal_move(self, player_name):
+        # O(1) check against the hand's color/value counts
+        return self.player_hands[player_name].has_playable(self.match_key)
+
+    def legal_moves(self, player_name):
+        # Distinct cards the player could put on the current top card
+        return self.player_hands[player_name].playable(self.match_key)
     def get_current_player(self):
         return self.players[self.current_index]
 
     def advance_to_next_player(self):
+        # Pass: the turn moves on without a card played
+        self.moves += bytes((MOVE_PASS, 0))
+        self._advance(1)
+
+    def _advance(self, steps):
         # Reset draw flag for the current player
         self.players_drawn[self.get_current_player()] = False
-        # Move to the next player
-        self.current_index = (self.current_index + self.direction) % len(self.players)
+        # Move to the next player (steps=2 skips one)
+        self.current_index = (self.current_index + steps * self.direction) % len(self.players)
+        if self.journal is not None:
+            self.journal.turned(self)
 
     def reverse_direction(self):
         self.direction *= -1
-        # Skip over the next player in the new direction
-        self.advance_to_next_player()
 
-    def play_card(self, player_name, card):
-        if self.get_current_player() != player_name:
+    def score(self):
+        # Points for the winner: the value of every card left in other hands
+        return sum(hand.points() for name, hand in self.player_hands.items()
+                   if name != self.winner and name in self.players)
+
+    def play_card(self, player_name, card, color=None):
+        # Play a card and carry out its effect; unless the player has just
+        # gone out, the turn then moves on. `color` is the color chosen for
+        # a wild (the player's most-held color if not given).
+        if self.winner is not None or self.get_current_player() != player_name:
             # It's not the player's turn, so they can't play a card
             return False
+        player_hand = self.player_hands[player_name]
+        if not self.is_playable(card) or card not in player_hand:
+            # The play was not valid
+            return False
 
-        # If it's the first turn of the game (indicated by `self.top_card` being None)
-        # set the first played card as the top card if it's in the player's hand
-        if self.top_card is None or (
-           card.color == self.top_card.color or
-           card.value == self.top_card.value or
-           card.color == 'Black'):
-            # The play is valid
-            player_hand = self.player_hands[player_name]
-            if card in player_hand:
-                player_hand.remove(card)
-                self.top_card = card
-                self.discard_pile.append(card)
-                if card.value == 'Reverse':
-                    self.reverse_direction()
-                elif card.value == 'Skip':
-                    self.advance_to_next_player()
-                # Successfully played a card
-                return True
-        
-        # The play was not valid 
-        return False
+        player_hand.remove(card)
+        self.top_card = card
+        self.discard_pile.append(card)
+        if CARD_COLOR_INDEX[card.id] == BLACK:
+            self.wild_color = color if color in COLORS else player_hand.best_color()
+            self.moves += bytes((MOVE_PLAY, card.id | COLORS.index(self.wild_color) << 6))
+        else:
+            self.wild_color = None
+            self.moves += bytes((MOVE_PLAY, card.id))
+        if self.journal is not None:
+            self.journal.played(self, player_name, card)
+        steps = CARD_EFFECTS[card.id](self)
+        self.update_match_key()
+        if not player_hand:
+            self.winner = player_name
+            if self.journal is not None:
+                self.journal.turned(self)  # The effect still changed direction / penalty
+        else:
+            self._advance(steps)
+        # Successfully played a card
+        return True
 
 class Card:
-    def __init__(self, color, value):
-        self.color = color
-        self.value = value
+    # Cards are immutable flyweights: there is exactly one Card object per
+    # distinct card (54 of them, see CARD_KINDS), and Card(color, value) just
+    # looks it up. That makes equality an identity check, lets cards be used
+    # as dict keys, and means parsing a PLAY command allocates nothing.
+    __slots__ = ('color', 'value', 'id')
+
+    def __new__(cls, color, value):
+        try:
+            return _INTERNED[(color, value)]
+        except KeyError:
+            raise ValueError(f"There is no {color} {value} card") from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card objects are immutable")
+
     def __eq__(self, other):
-        if isinstance(other, Card):
-            return self.color == other.color and self.value == other.value
-        return False
+        return self is other
+
+    def __hash__(self):
+        return self.id
+
+    def __reduce__(self):
+        # Unpickle through Card() so we get the interned instance back
+        return (Card, (self.color, self.value))
+
     def __repr__(self):
         return f"{self.color} {self.value}"
 
-class Deck:
-    def __init__(self):
-        self.cards = []
+COLORS = ['Red', 'Yellow', 'Green', 'Blue']
+VALUES = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'Skip', 'Reverse', 'Draw Two']
+SPECIALS = ['Wild', 'Wild Draw Four']
+
+# Every distinct card gets a one-byte id: the 13 values of each color in
+# order, then the two wilds. 54 kinds cover the whole 108-card deck.
+CARD_KINDS = [(color, value) for color in COLORS for value in VALUES] + [('Black', special) for special in SPECIALS]
+CARD_IDS = {kind: card_id for card_id, kind in enumerate(CARD_KINDS)}
+
+# Color and value of every card id as small integers, for the per-hand
+# indexes below. 'Black' is the last color; wild values come after VALUES.
+ALL_COLORS = COLORS + ['Black']
+ALL_VALUES = VALUES + SPECIALS
+CARD_COLOR_INDEX = bytes(ALL_COLORS.index(color) for color, _ in CARD_KINDS)
+CARD_VALUE_INDEX = bytes(ALL_VALUES.index(value) for _, value in CARD_KINDS)
+BLACK = ALL_COLORS.index('Black')
+
+# What may be played next depends on more than the top card, so the rules
+# are indexed by a "match key". Each key says which color and which value
+# match (-1 for none) and whether wilds may be played:
+#   0..53   the top card with that id
+#   54..57  a wild on top with this color chosen (WILD_KEYS)
+#   58..72  a draw penalty pending: only a card of the same value may be
+#           stacked on it (STACK_KEYS, by value index)
+WILD_KEYS = {color: len(CARD_KINDS) + index for index, color in enumerate(COLORS)}
+STACK_KEYS = [len(CARD_KINDS) + len(COLORS) + index for index in range(len(ALL_VALUES))]
+KEY_COLOR = list(CARD_COLOR_INDEX) + list(range(len(COLORS))) + [-1] * len(ALL_VALUES)
+KEY_VALUE = list(CARD_VALUE_INDEX) + [-1] * len(COLORS) + list(range(len(ALL_VALUES)))
+KEY_WILD = bytes([1] * (len(CARD_KINDS) + len(COLORS)) + [0] * len(ALL_VALUES))
+
+def _matches(key, card):
+    return (CARD_COLOR_INDEX[card] == KEY_COLOR[key] or CARD_VALUE_INDEX[card] == KEY_VALUE[key]
+            or (KEY_WILD[key] and CARD_COLOR_INDEX[card] == BLACK))
+
+# PLAYABLE_ON[key] lists the card ids that may be played, and
+# CAN_PLAY_ON[key][card id] is the same answer as a 0/1 lookup.
+PLAYABLE_ON = [tuple(card for card in range(len(CARD_KINDS)) if _matches(key, card)) for key in range(len(KEY_COLOR))]
+CAN_PLAY_ON = [bytes(_matches(key, card) for card in range(len(CARD_KINDS))) for key in range(len(KEY_COLOR))]
+
+def match_key(top_card, wild_color=None, pending_draw=0):
+    if top_card is None:
+        return None  # First play of the game: anything goes
+    if pending_draw:
+        return STACK_KEYS[CARD_VALUE_INDEX[top_card.id]]
+    if wild_color is not None:
+        return WILD_KEYS[wild_color]
+    return top_card.id
+
+# Card effects, applied after a card lands on the pile. Each returns how
+# many seats the turn moves on; CARD_EFFECTS has the handler for every id.
+def _no_effect(game):
+    return 1
+
+def _skip(game):
+    return 2
+
+def _reverse(game):
+    # With two players a Reverse works like a Skip
+    if len(game.players) == 2:
+        return 2
+    game.reverse_direction()
+    return 1
+
+def _draw_two(game):
+    # The next player draws two unless they stack another Draw Two
+    game.pending_draw += 2
+    return 1
+
+def _wild_draw_four(game):
+    game.pending_draw += 4
+    return 1
+
+EFFECTS = {
+    'Skip': _skip,
+    'Reverse': _reverse,
+    'Draw Two': _draw_two,
+    'Wild Draw Four': _wild_draw_four,
+}
+CARD_EFFECTS = [EFFECTS.get(value, _no_effect) for _, value in CARD_KINDS]
+
+# What each card is worth to the winner: face value for numbers, 20 for the
+# other colored cards, 50 for wilds
+CARD_POINTS = bytes(int(value) if value.isdigit() else 50 if color == 'Black' else 20
+                    for color, value in CARD_KINDS)
+
+# The interning table behind Card(): each card is built once here, since
+# Card() itself only ever looks cards up.
+CARDS = []
+_INTERNED = {}
+for _card_id, (_color, _value) in enumerate(CARD_KINDS):
+    _card = object.__new__(Card)
+    object.__setattr__(_card, 'color', _color)
+    object.__setattr__(_card, 'value', _value)
+    object.__setattr__(_card, 'id', _card_id)
+    CARDS.append(_card)
+    _INTERNED[(_color, _value)] = _card
+del _card_id, _color, _value, _card
+
+def card_to_id(card):
+    return card.id
+
+def card_from_id(card_id):
+    return CARDS[card_id]
+
+def encode_hand(hand):
+    # A hand on the wire is one byte per card
+    return bytes([card.id for card in hand])
+
+def decode_hand(data):
+    return [CARDS[card_id] for card_id in data]
+
+def hand_checksum(hand):
+    # Order-independent fingerprint of a hand: CRC32 over the per-kind card
+    # counts, so the server and a client's mirror agree whatever the order.
+    if isinstance(hand, Hand):
+        return zlib.crc32(hand.counts)
+    counts = bytearray(len(CARD_KINDS))
+    for card in hand:
+        counts[card.id] += 1
+    return zlib.crc32(counts)
+
+class Hand:
+    # A player's hand stored as a count per card kind, so adding, removing and
+    # membership are O(1) index operations instead of list scans. It keeps
+    # the list methods the rest of the code uses (append, remove, in, len,
+    # iteration); iterating yields the cards sorted by kind.
+    #
+    # It also keeps how many cards it holds of each color and of each value
+    # (wilds are the 'Black' color count), so "is there any legal move" is
+    # a couple of lookups rather than a scan.
+    __slots__ = ('counts', 'size', 'color_counts', 'value_counts')
+
+    def __init__(self, cards=()):
+        self.counts = bytearray(len(CARD_KINDS))
+        self.color_counts = [0] * len(ALL_COLORS)
+        self.value_counts = [0] * len(ALL_VALUES)
+        self.size = 0
+        for card in cards:
+            self.append(card)
+
+    def append(self, card):
+        card_id = card.id
+        self.counts[card_id] += 1
+        self.color_counts[CARD_COLOR_INDEX[card_id]] += 1
+        self.value_counts[CARD_VALUE_INDEX[card_id]] += 1
+        self.size += 1
+
+    def remove(self, card):
+        card_id = card.id
+        if not self.counts[card_id]:
+            raise ValueError(f"{card} is not in the hand")
+        self.counts[card_id] -= 1
+        self.color_counts[CARD_COLOR_INDEX[card_id]] -= 1
+        self.value_counts[CARD_VALUE_INDEX[card_id]] -= 1
+        self.size -= 1
+
+    def wild_count(self):
+        return self.color_counts[BLACK]
+
+    def has_playable(self, key):
+        # O(1): matching color, matching value, or any wild where allowed.
+        # `key` is a match key (see match_key); None means anything goes.
+        if key is None:
+            return self.size > 0
+        color, value = KEY_COLOR[key], KEY_VALUE[key]
+        return bool((color >= 0 and self.color_counts[color]) or
+                    (value >= 0 and self.value_counts[value]) or
+                    (KEY_WILD[key] and self.color_counts[BLACK]))
+
+    def playable(self, key):
+        # The distinct cards in this hand that may be played under `key`.
+        # Only the (at most 25) candidate kinds for that key are looked at.
+        counts = self.counts
+        if key is None:
+            return [CARDS[card_id] for card_id in range(len(counts)) if counts[card_id]]
+        return [CARDS[card_id] for card_id in PLAYABLE_ON[key] if counts[card_id]]
+
+    def best_color(self):
+        # The color held most, which is what a wild should be called as
+        color_counts = self.color_counts
+        return COLORS[max(range(len(COLORS)), key=color_counts.__getitem__)]
+
+    def points(self):
+        return sum(CARD_POINTS[card_id] * count for card_id, count in enumerate(self.counts) if count)
+
+    def count(self, card):
+        return self.counts[card.id]
+
+    def __contains__(self, card):
+        return isinstance(card, Card) and self.counts[card.id] > 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for card_id, count in enumerate(self.counts):
+            if count:
+                card = CARDS[card_id]
+                for _ in range(count):
+                    yield card
+
+    def __eq__(self, other):
+        if isinstance(other, Hand):
+            return self.counts == other.counts
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+# The full 108-card deck as card ids, in the order a new deck comes in:
+# per color one 0 and two of every other value, then four of each wild.
+FULL_DECK_IDS = bytes(
+    [card_id for color in COLORS
+     for card_id in [CARD_IDS[(color, '0')]] + [CARD_IDS[(color, value)] for value in VALUES[1:] for _ in range(2)]] +
+    [CARD_IDS[('Black', special)] for special in SPECIALS for _ in range(4)])
+DECK_SIZE = len(FULL_DECK_IDS)
+
+class CardArray:
+    # A stack of cards stored as one byte (card id) each in a bytearray that
+    # is allocated once at full-deck size and never resized. Push and pop
+    # are O(1) and nothing is allocated per card. The deck and the discard
+    # pile are both CardArrays; the top of the stack is the end.
+    __slots__ = ('ids', 'size')
+
+    def __init__(self, cards=()):
+        self.ids = bytearray(DECK_SIZE)
+        self.size = 0
+        self.load(cards)
+
+    def append(self, card):
+        self.ids[self.size] = card.id
+        self.size += 1
+
+    def pop(self):
+        self.size -= 1
+        return CARDS[self.ids[self.size]]
+
+    def top(self):
+        return CARDS[self.ids[self.size - 1]] if self.size else None
+
+    def clear(self):
+        self.size = 0
+
+    def load(self, cards):
+        self.load_ids(bytes([card.id for card in cards]))
+
+    def load_ids(self, ids):
+        # Replace the contents, bottom card first, without reallocating
+        self.ids[:len(ids)] = ids
+        self.size = len(ids)
+
+    def to_ids(self):
+        return bytes(self.ids[:self.size])
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        # Bottom to top
+        for card_id in self.ids[:self.size]:
+            yield CARDS[card_id]
+
+    def __repr__(self):
+        return repr(list(self))
+
+class Deck(CardArray):
+    # Cards still to be drawn. Drawing takes the top card in O(1); the
+    # discard pile is recycled back in place when the deck runs out, and
+    # reset() refills it for the next game without building a new Deck.
+    __slots__ = ('verbose', 'rng')
+
+    def __init__(self, verbose=True):
+        super().__init__()
+        self.verbose = verbose  # Log every dealt card at DEBUG (off for simulations)
+        self.rng = random  # Game.start_game gives each game its own seeded Random
         self.create_deck()  # Create the deck when object is instantiated
 
     def create_deck(self):
-        colors = ['Red', 'Yellow', 'Green', 'Blue']
-        values = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'Skip', 'Reverse', 'Draw Two']
-        specials = ['Wild', 'Wild Draw Four']
-        # Add number cards
-        for color in colors:
-            # Add one '0' card per color
-            self.cards.append(Card(color, '0'))
-            # Add two of each number for each color
-            for value in values[1:]:
-                self.cards.append(Card(color, value))
-                self.cards.append(Card(color, value))
-        # Add wild and wild draw four cards
-        for special in specials:
-            for _ in range(4):
-                self.cards.append(Card('Black', special))
+        self.reset()
+
+    def reset(self):
+        # Back to a full, unshuffled deck, reusing the same storage
+        self.ids[:] = FULL_DECK_IDS
+        self.size = DECK_SIZE
 
     def shuffle(self):
-        random.shuffle(self.cards)
+        # Fisher-Yates over the cards in the deck, in place
+        self.rng.shuffle(memoryview(self.ids)[:self.size])
+
+    def draw(self):
+        # The top card, or None if the deck is empty
+        if not self.size:
+            return None
+        self.size -= 1
+        return CARDS[self.ids[self.size]]
+
+    def remove(self, card):
+        # Take one particular card out, keeping the order of the rest
+        index = self.ids.rfind(bytes([card.id]), 0, self.size)
+        if index < 0:
+            raise ValueError(f"{card} is not in the deck")
+        self.ids[index:self.size - 1] = self.ids[index + 1:self.size]
+        self.size -= 1
+
+    def recycle(self, discard_pile):
+        # Move everything under the discard pile's top card into the deck and
+        # shuffle. Bytes are copied between the two preallocated buffers; the
+        # top card stays where it is.
+        count = len(discard_pile) - 1
+        if count < 1:
+            return
+        self.ids[self.size:self.size + count] = memoryview(discard_pile.ids)[:count]
+        self.size += count
+        discard_pile.ids[0] = discard_pile.ids[count]
+        discard_pile.size = 1
+        self.shuffle()
 
     def deal(self, player_names, num_cards=7):
-        player_hands = {player_name: [] for player_name in player_names}
+        player_hands = {player_name: Hand() for player_name in player_names}
         for _ in range(num_cards):
             for player_name in player_names:
-                if self.cards:  # Check that there are still cards to deal
-                    card = self.cards.pop()
+                if self.size:  # Check that there are still cards to deal
+                    card = self.draw()
                     player_hands[player_name].append(card)
-                    print(f"Dealed {card} to {player_name}")
+                    if self.verbose:
+                        log.debug(f"Dealed {card} to {player_name}")
                 else:
-                    print("The deck is out of cards!")
+                    log.warning("The deck is out of cards!")
                     break
         return player_hands
     def __repr__(self):
-        return f"Deck of {len(self.cards)} cards"
-
+        return f"Deck of {self.size} cards"
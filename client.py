@@ -1,13 +1,41 @@
+import argparse
 import socket
+import sys
+import textwrap
 import threading
-import pickle
 import time
+import pickle
+import queue
+from collections import deque
+import discovery
+from card import CARDS
+from card import card_from_id
+from card import decode_hand
+from card import Hand
+from card import hand_checksum
+from commands import COLOR_NAMES
+from protocol import FrameDecoder
+from protocol import iter_frames
+from protocol import send_frame
+
+try:
+    import curses
+except ImportError:  # Windows without the windows-curses package
+    curses = None
 
-# Server's IP address
-SERVER_IP = '172.16.1.88'  # Replace with your server's IP address
 SERVER_PORT = 65432
+DISCOVERY_TIMEOUT = 3  # Seconds to look for servers on the LAN before asking for an address
+server_address = None  # (host, port) we play on, from --host or discovery
+
+# Hand encodings this client understands, best first
+HAND_CODECS = ['delta', 'hand', 'pickle']
 
-def get_valid_username(prompt="Enter your username: "):
+# If the connection drops we keep trying to get back in this long; the server
+# holds our seat for about as long
+RECONNECT_TIMEOUT = 60
+session_token = None  # From the server's SESSION frame once we are seated
+
+def get_valid_username(prompt="Enter your username (or /watch <room> to spectate): "):
     """Prompt the user for a valid username, which cannot be blank or contain only spaces."""
     while True:
         username = input(prompt).strip()  # Removes leading and trailing whitespace
@@ -15,114 +43,468 @@ def get_valid_username(prompt="Enter your username: "):
             return username  # Valid username entered
         print("Username cannot be blank or only contain spaces. Please enter a valid username.")
 
-my_turn = False  # Global flag to indicate if it's my turn
+def choose_server(host, port):
+    """Return the (host, port) to connect to: the one given, the only server found on the LAN, or the one the user picks."""
+    if host:
+        return host, port
+    print("Looking for servers on the LAN...")
+    servers = discovery.find_servers(DISCOVERY_TIMEOUT)
+    if not servers:
+        address = input("No server answered. Enter the server's address: ").strip()
+        host, _, typed_port = address.partition(':')
+        return host, int(typed_port) if typed_port.isdigit() else port
+    if len(servers) == 1:
+        host, port, name = servers[0]
+        print(f"Found {name} at {host}:{port}.")
+        return host, port
+    for number, (host, port, name) in enumerate(servers, 1):
+        print(f"{number}) {name} at {host}:{port}")
+    while True:
+        choice = input("Which server? ").strip()
+        if choice.isdigit() and 1 <= int(choice) <= len(servers):
+            host, port, _ = servers[int(choice) - 1]
+            return host, port
+        print(f"Enter a number from 1 to {len(servers)}.")
+
+def send_login(client_socket, username):
+    # "/watch <room>" asks to spectate a room instead of taking a seat
+    if username.startswith('/watch '):
+        send_frame(client_socket, 'WATCH ' + username[7:].strip())
+    else:
+        send_frame(client_socket, username)
 
-def receive_messages(client_socket, username):
-    global my_turn
+# The receive thread posts MY_TURN when the server's TURN frame names us, and
+# DISCONNECTED when the connection ends; the input loop waits on this queue.
+# The full-screen view also posts REDRAW when part of the screen is out of
+# date, so that all drawing happens on the input thread.
+MY_TURN = 'turn'
+DISCONNECTED = 'disconnected'
+REDRAW = 'redraw'
+events = queue.Queue()
 
-    while True:
+# Local mirror of our hand, kept up to date from the server's delta updates
+hand = Hand()
+hand_seq = 0
+
+def apply_hand_update(client_socket, message):
+    # Apply one HSYNC/HADD/HREM/HSUM frame to the local hand mirror. Returns
+    # True if the hand changed. A gap in the sequence numbers or a checksum
+    # mismatch means we missed something, so ask the server for a full RESYNC.
+    global hand, hand_seq
+    tag, _, body = message.partition(b':')
+    seq = int.from_bytes(body[:4], 'big')
+    if tag == b'HSYNC':
+        hand = Hand(decode_hand(body[4:]))
+        hand_seq = seq
+        return True
+    if tag == b'HSUM':
+        if seq == hand_seq and hand_checksum(hand) != int.from_bytes(body[4:8], 'big'):
+            send_frame(client_socket, 'RESYNC')
+        return False
+    if seq != hand_seq + 1:
+        send_frame(client_socket, 'RESYNC')
+        return False
+    hand_seq = seq
+    card = card_from_id(body[4])
+    if tag == b'HADD':
+        hand.append(card)
+    elif card in hand:
+        hand.remove(card)
+    else:
+        send_frame(client_socket, 'RESYNC')
+    return True
+
+# Cards are picked by number: the hand's distinct cards in kind order, so
+# numbers only change when the hand does. A wild takes a color after its
+# number ("7 blue" or "7 b"); without one the server picks our best color.
+COLOR_CHOICES = dict(COLOR_NAMES, **{name[0]: color for name, color in COLOR_NAMES.items()})
+
+def numbered_cards(player_hand):
+    return [CARDS[card_id] for card_id, count in enumerate(player_hand.counts) if count]
+
+def describe_hand(player_hand):
+    # One entry per distinct card, so the length is bounded by the 54 kinds
+    # however many cards are held
+    return [f"{number}) {card}" + (f" x{player_hand.counts[card.id]}" if player_hand.counts[card.id] > 1 else '')
+            for number, card in enumerate(numbered_cards(player_hand), 1)]
+
+def parse_move(text, player_hand):
+    # What to send for what the player typed: a card number (plus a color
+    # for a wild), a card name, or 'pass' to draw. Returns (frame, None) or
+    # (None, reason it isn't a move).
+    words = text.split()
+    if not words:
+        return None, "No card entered."
+    if text.lower() in ('pass', 'draw'):
+        return 'DRAW', None
+    if not words[0].isdigit():
+        return f'PLAY {text}', None  # A card by name; the server checks it
+    cards = numbered_cards(player_hand)
+    number = int(words[0])
+    if not 1 <= number <= len(cards):
+        return None, f"Pick a card from 1 to {len(cards)}."
+    card = cards[number - 1]
+    if len(words) == 1:
+        return f'PLAY {card}', None
+    color = COLOR_CHOICES.get(words[1].lower())
+    if card.color != 'Black' or color is None or len(words) > 2:
+        return None, f"Only a wild takes a color, e.g. '{number} blue'."
+    return f'PLAY {card} {color}', None
+
+MOVE_PROMPT = "Your move (card number, a color after a wild's number, a card name, or 'pass' to draw): "
+
+
+class LineView:
+    # Plain terminal output. The hand is printed once per turn, when we are
+    # asked for a move, rather than after every change to it.
+    def start(self, username):
+        pass
+
+    def stop(self):
+        pass
+
+    def show(self, text):
+        print(text, flush=True)
+
+    def hand_changed(self):
+        pass
+
+    def game_event(self, text):
+        pass
+
+    def turn(self, player_name):
+        pass
+
+    def redraw(self):
+        pass
+
+    def read_move(self):
+        print("Your hand:", '  '.join(describe_hand(hand)) or "(empty)", flush=True)
+        return input(MOVE_PROMPT)
+
+
+class CursesView:
+    # Full-screen view in four regions, each its own curses window: a status
+    # line, the numbered hand, a scrolling message log and the input line.
+    # The receive thread only records what changed and marks those regions
+    # dirty; the input thread redraws just the dirty ones, and the log only
+    # adds its new lines. curses then sends the terminal only the characters
+    # that differ, so an update costs the same whatever the size of the hand.
+    LOG_LINES = 500  # Kept for redrawing the log after a resize
+    HAND_WIDTH = 24  # Columns per hand entry
+
+    def __init__(self, server_name):
+        self.server_name = server_name
+        self.lock = threading.Lock()
+        self.log = deque(maxlen=self.LOG_LINES)
+        self.new_lines = []  # Messages not yet on screen
+        self.dirty = set()  # Regions to redraw: 'status', 'hand', 'log'
+        self.redraw_pending = False
+        self.username = ''
+        self.current_player = ''
+        self.top_card = ''
+        self.prompt = ''
+        self.typed = ''
+        self.screen = None
+
+    def start(self, username):
+        self.username = username
+        self.screen = curses.initscr()
+        curses.noecho()
+        curses.cbreak()
+        self.screen.keypad(True)
+        self.layout()
+
+    def stop(self):
+        if self.screen is not None:
+            curses.nocbreak()
+            curses.echo()
+            curses.endwin()
+            self.screen = None
+            for line in list(self.log)[-5:]:
+                print(line)  # Leave the last few messages on the terminal
+
+    def layout(self):
+        # (Re)create the windows for the current terminal size
+        rows, cols = self.screen.getmaxyx()
+        hand_rows = max(1, min(6, rows - 4))
+        self.width = cols
+        self.status_window = curses.newwin(1, cols, 0, 0)
+        self.hand_window = curses.newwin(hand_rows, cols, 1, 0)
+        self.log_window = curses.newwin(max(1, rows - hand_rows - 2), cols, hand_rows + 1, 0)
+        self.log_window.scrollok(True)
+        self.input_window = curses.newwin(1, cols, rows - 1, 0)
+        self.input_window.keypad(True)
+        with self.lock:
+            self.dirty = {'status', 'hand', 'full log'}
+            self.new_lines = []
+        self.redraw()
+
+    def mark(self, region):
+        # Called with the lock held
+        self.dirty.add(region)
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            events.put(REDRAW)
+
+    def show(self, text):
+        with self.lock:
+            for line in text.splitlines() or ['']:
+                self.log.append(line)
+                self.new_lines.append(line)
+            self.mark('log')
+
+    def hand_changed(self):
+        with self.lock:
+            self.mark('hand')
+            self.mark('status')
+
+    def game_event(self, text):
+        # Follow the top card from the table's messages
+        with self.lock:
+            if ' played: ' in text:
+                self.top_card = text.split(' played: ', 1)[1]
+            elif text.startswith('The color is now '):
+                self.top_card = f"{self.top_card.split(' (')[0]} ({text[len('The color is now '):].rstrip('.')})"
+            else:
+                return
+            self.mark('status')
+
+    def turn(self, player_name):
+        with self.lock:
+            self.current_player = player_name
+            self.mark('status')
+
+    def redraw(self):
+        if self.screen is None:
+            return
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            new_lines, self.new_lines = self.new_lines, []
+            self.redraw_pending = False
+            status = (f" {self.server_name} | {self.username} | turn: {self.current_player or '-'} | "
+                      f"top: {self.top_card or '-'} | {len(hand)} cards")
+            entries = describe_hand(hand) if 'hand' in dirty else None
         try:
-            header = client_socket.recv(4)
-            if not header:
-                print("Server closed the connection unexpectedly.", flush=True)
-                break
-            message_length = int.from_bytes(header, byteorder='big')
-            
-            if message_length:
-                message = client_socket.recv(message_length)
-                if not message:
-                    print("Server closed the connection.", flush=True)
-                    break
-
-                if message.startswith(b'PICKLE:'):
-                    hand = pickle.loads(message[7:])
-                    print("Received your hand of cards:", hand, flush=True)
-                elif message.startswith(b'TEXT:'):
-                    text_message = message[5:].decode('utf-8')
-                    print(text_message, flush=True)
-
-                    # Check if it's the user's turn or if they need to try again
-                    if "your turn to play." in text_message or "Try again" in text_message:
-                        my_turn = True
-                    else:
-                        my_turn = False
+            if 'status' in dirty:
+                self.status_window.erase()
+                self.status_window.addnstr(0, 0, status, self.width - 1, curses.A_REVERSE)
+                self.status_window.noutrefresh()
+            if entries is not None:
+                self.draw_hand(entries)
+            if 'full log' in dirty:
+                self.log_window.erase()
+                new_lines = list(self.log)
+            if new_lines:
+                rows, cols = self.log_window.getmaxyx()
+                wrapped = [row for line in new_lines for row in textwrap.wrap(line, cols - 1) or ['']]
+                for row in wrapped[-rows:]:
+                    self.log_window.scroll()
+                    self.log_window.addstr(rows - 1, 0, row)
+                self.log_window.noutrefresh()
+            self.draw_input()
+            curses.doupdate()
+        except curses.error:
+            pass  # Terminal too small for something; the next resize redraws
 
-        except Exception as e:
-            print("An error occurred:", e, flush=True)
-            break
+    def draw_hand(self, entries):
+        rows, cols = self.hand_window.getmaxyx()
+        per_row = max(1, cols // self.HAND_WIDTH)
+        self.hand_window.erase()
+        for index, entry in enumerate(entries[:rows * per_row]):
+            self.hand_window.addnstr(index // per_row, (index % per_row) * self.HAND_WIDTH, entry, self.HAND_WIDTH - 1)
+        self.hand_window.noutrefresh()
 
+    def draw_input(self):
+        self.input_window.erase()
+        text = self.prompt + self.typed
+        self.input_window.addnstr(0, 0, text[-(self.width - 1):], self.width - 1)
+        self.input_window.noutrefresh()
+
+    def read_move(self):
+        # Edit one line, redrawing whatever the receive thread changes meanwhile
+        self.prompt, self.typed = "Your move (number, number + color for a wild, or pass): ", ''
+        self.input_window.timeout(100)
+        try:
+            while True:
+                self.redraw()
+                try:
+                    key = self.input_window.get_wch()
+                except curses.error:
+                    continue  # Timed out; check for changes
+                if key in ('\n', '\r', curses.KEY_ENTER):
+                    return self.typed
+                if key in ('\b', '\x7f', curses.KEY_BACKSPACE):
+                    self.typed = self.typed[:-1]
+                elif key == curses.KEY_RESIZE:
+                    self.layout()
+                elif isinstance(key, str) and key.isprintable():
+                    self.typed += key
+        finally:
+            self.prompt = self.typed = ''
+            self.redraw()
+
+view = LineView()
+
+def receive_messages(client_socket, frames, username):
+    # `frames` is the same frame iterator the login handshake read from, so
+    # nothing the server sent in the same packet as the welcome is lost.
+    # Turn changes are handed to the input loop through the `events` queue.
+    global session_token, hand
+    try:
+        for message in frames:
+            if message.startswith(b'SESSION:'):
+                session_token = message[8:].decode('ascii')
+            elif message[:5] in (b'HSYNC', b'HADD:', b'HREM:', b'HSUM:'):
+                if apply_hand_update(client_socket, message):
+                    view.hand_changed()
+            elif message.startswith(b'HAND:'):
+                hand = Hand(decode_hand(message[5:]))
+                view.hand_changed()
+            elif message.startswith(b'PICKLE:'):
+                hand = Hand(pickle.loads(message[7:]))
+                view.hand_changed()
+            elif message.startswith(b'TURN:'):
+                current_player = message[5:].decode('utf-8')
+                view.turn(current_player)
+                if current_player == username:
+                    events.put(MY_TURN)
+            elif message.startswith(b'TEXT:'):
+                text_message = message[5:].decode('utf-8')
+                view.game_event(text_message)
+                view.show(text_message)
+        view.show("Server closed the connection.")
+    except Exception as e:
+        view.show(f"An error occurred: {e}")
+    finally:
+        events.put(DISCONNECTED)
 
 
 def send_messages(client_socket):
-    global my_turn
-    
+    # Sleeps in events.get() until the server says it's our turn, then asks
+    # for exactly one move. Screen updates are drawn here too.
     while True:
-        if my_turn:
-            try:
-                card_to_play = input("Enter the card you want to play (e.g., 'Red 4'), or 'pass' to draw a card: ").strip()                
-                if card_to_play.lower() == 'pass':
-                    # If the player chooses to pass, the 'DRAW' message is sent to the server
-                    client_socket.sendall('DRAW'.encode('utf-8'))
-                elif card_to_play:  
-                    # If the player entered something other than 'pass', the 'PLAY' message is sent
-                    message = f'PLAY {card_to_play}'
-                    client_socket.sendall(message.encode('utf-8'))
-                else:
-                    # If the player didn't enter anything, they are prompted again
-                    print("No card entered. Try again.")
-                    continue  # Keeps the while loop running for a new input
-                
-                my_turn = False  # Reset the flag; it will be set to True again if the server sends a turn message
-            except Exception as e:
-                print(f"Failed to send message: {e}")
-
-        time.sleep(0.1)  # Small delay to keep the loop from using too much CPU
+        event = events.get()
+        if event == DISCONNECTED:
+            return
+        if event == REDRAW:
+            view.redraw()
+            continue
+        while True:
+            frame, problem = parse_move(view.read_move().strip(), hand)
+            if frame is not None:
+                break
+            # If the player didn't enter a move, they are prompted again
+            view.show(f"{problem} Try again.")
+        try:
+            send_frame(client_socket, frame)
+        except Exception as e:
+            view.show(f"Failed to send message: {e}")
+
 
+def login(client_socket, frames, username):
+    # Wait for the server to accept us. Returns the username we ended up
+    # with, or None if the connection closed first.
+    global session_token
+    for response in frames:
+        if response.startswith(b'SESSION:'):
+            session_token = response[8:].decode('ascii')
+        elif response.startswith(b'TEXT:'):
+            text_response = response[5:].decode('utf-8')
+            print(text_response)
+            if ("Welcome to the game!" in text_response or "Welcome back" in text_response
+                    or "has joined the game." in text_response or "You are now watching" in text_response):
+                # The username was accepted; move on to the main part of the client
+                return username
+            elif "Username has been taken" in text_response or "No room named" in text_response:
+                # The username (or room to watch) was rejected; prompt again
+                username = get_valid_username()
+                send_login(client_socket, username)
+            elif "Your session has expired" in text_response:
+                # Our seat is gone (or the server restarted); log in as usual
+                session_token = None
+                send_frame(client_socket, username)
+    return None
 
+def reconnect():
+    # Keep trying to reach the server, backing off, until RECONNECT_TIMEOUT
+    deadline = time.monotonic() + RECONNECT_TIMEOUT
+    delay = 0.5
+    while time.monotonic() < deadline:
+        try:
+            client_socket = socket.create_connection(server_address, timeout=5)
+            client_socket.settimeout(None)
+            return client_socket
+        except OSError:
+            time.sleep(delay)
+            delay = min(delay * 2, 5)
+    return None
 
 def start_client():
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    username = None
+    client_socket = None
     try:
-        client_socket.connect((SERVER_IP, SERVER_PORT))
+        client_socket = socket.create_connection(server_address)
         print("Connected to server.")
-        
-        # Request and send the username to the server
-        username = get_valid_username()
-        client_socket.sendall(username.encode('utf-8'))
 
-        # Wait for a response regarding username acceptance
         while True:
-            response_header = client_socket.recv(4)
-            if not response_header:
+            # Ask for the compact hand encoding; pickle only as a fallback
+            send_frame(client_socket, 'CODECS ' + ' '.join(HAND_CODECS))
+
+            if session_token is not None:
+                # Back after a dropped connection: tell the server how far our
+                # hand mirror got so it only resends what we are missing
+                send_frame(client_socket, f'RESUME {session_token} {hand_seq} {hand_checksum(hand)} {username}')
+            else:
+                # Request and send the username to the server
+                username = get_valid_username()
+                send_login(client_socket, username)
+
+            # Wait for a response regarding username acceptance
+            frames = iter_frames(client_socket, FrameDecoder())
+            username = login(client_socket, frames, username)
+            if username is None:
                 print("Connection closed by server.")
                 return
 
-            message_length = int.from_bytes(response_header, byteorder='big')
-            response = client_socket.recv(message_length)
+            # Now that the username has been accepted, start receiving messages
+            view.start(username)
+            thread_receiving = threading.Thread(target=receive_messages, args=(client_socket, frames, username))
+            thread_receiving.start()
 
-            if response.startswith(b'TEXT:'):
-                text_response = response[5:].decode('utf-8')
-                print(text_response)
-                if "Welcome to the game!" in text_response or "has joined the game." in text_response:
-                    # The username was accepted; move on to the main part of the client
-                    break
-                elif "Username has been taken" in text_response:
-                    # The username was rejected; prompt for a new username
-                    username = get_valid_username()
-                    client_socket.sendall(username.encode('utf-8'))
-
-        # Now that the username has been accepted, start receiving messages
-        thread_receiving = threading.Thread(target=receive_messages, args=(client_socket, username))
-        thread_receiving.start()
+            # Also start sending messages (like card plays)
+            try:
+                send_messages(client_socket)
+            finally:
+                view.stop()
+            thread_receiving.join()
+            client_socket.close()
 
-        # Also start sending messages (like card plays)
-        send_messages(client_socket)
+            if session_token is None:
+                return
+            print("Trying to get back into the game...")
+            client_socket = reconnect()
+            if client_socket is None:
+                print("Could not reach the server again.")
+                return
+            while not events.empty():
+                events.get()  # Stale turn notices from the old connection
 
     except Exception as e:
         print(f"An exception occurred: {e}")
     finally:
-        client_socket.close()
+        if client_socket is not None:
+            client_socket.close()
         print("Client socket closed.")
 
 if __name__ == "__main__":
-    start_client()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="UNO LAN client")
+    parser.add_argument('--host', default=None, help="server address (found on the LAN by itself if not given)")
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--plain', action='store_true', help="plain scrolling output instead of the full-screen view")
+    args = parser.parse_args()
+
+    server_address = choose_server(args.host, args.port)
+    if curses is not None and not args.plain and sys.stdout.isatty():
+        view = CursesView(f"{server_address[0]}:{server_address[1]}")
+    start_client()
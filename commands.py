@@ -0,0 +1,81 @@
+# Client command parsing. Every frame a client sends is turned into a
+# Command in one pass: the first word picks the opcode from VERBS, and for
+# PLAY the rest is looked up whole in CARD_NAMES, a precomputed table of
+# every way of naming every card (case-insensitive, any spacing). Anything
+# that isn't a known verb is chat.
+#
+#   PLAY Red 4               -> Command(PLAY, Red 4, None, 'Red 4')
+#   PLAY red  draw two       -> Command(PLAY, Red Draw Two, None, ...)
+#   PLAY Wild Draw Four Blue -> Command(PLAY, Black Wild Draw Four, 'Blue', ...)
+#   /join table2             -> Command(JOIN, None, None, 'table2')
+
+from collections import namedtuple
+from card import CARDS
+from card import COLORS
+
+# Opcodes
+CHAT = 0
+PLAY = 1
+DRAW = 2
+RESYNC = 3
+ROOMS = 4
+JOIN = 5
+CODECS = 6
+RESUME = 7
+WATCH = 8
+QUEUE = 9
+
+# First word of a frame -> opcode. Verbs are matched exactly, so chat that
+# happens to start with "play" stays chat.
+VERBS = {
+    'PLAY': PLAY,
+    'DRAW': DRAW,
+    'RESYNC': RESYNC,
+    '/rooms': ROOMS,
+    '/join': JOIN,
+    '/queue': QUEUE,
+    'CODECS': CODECS,
+    'RESUME': RESUME,
+    'WATCH': WATCH,
+}
+
+# op: an opcode; card: the Card for PLAY (None if it named no card); color:
+# the color chosen for a wild, if given; arg: the text after the verb
+Command = namedtuple('Command', ['op', 'card', 'color', 'arg'])
+
+def _card_names():
+    # "red 4", "red draw two", and for wilds both "black wild" and "wild"
+    names = {}
+    for card in CARDS:
+        names[f"{card.color} {card.value}".lower()] = card
+        if card.color == 'Black':
+            names[card.value.lower()] = card
+    return names
+
+CARD_NAMES = _card_names()
+COLOR_NAMES = {color.lower(): color for color in COLORS}
+
+
+def parse_card(text):
+    # "Red 4" / "wild draw four blue" -> (Card or None, chosen color or None)
+    words = text.lower().split()
+    card = CARD_NAMES.get(' '.join(words))
+    if card is not None:
+        return card, None
+    # A wild may be followed by the color it should count as
+    if len(words) > 1 and words[-1] in COLOR_NAMES:
+        card = CARD_NAMES.get(' '.join(words[:-1]))
+        if card is not None and card.color == 'Black':
+            return card, COLOR_NAMES[words[-1]]
+    return None, None
+
+
+def parse(message):
+    verb, _, rest = message.partition(' ')
+    op = VERBS.get(verb, CHAT)
+    if op == PLAY:
+        card, color = parse_card(rest)
+        return Command(PLAY, card, color, rest)
+    if op == CHAT:
+        return Command(CHAT, None, None, message)
+    return Command(op, None, None, rest.strip())
@@ -0,0 +1,131 @@
+# Finding servers on the LAN without typing an address.
+#
+# A server announces itself over UDP on DISCOVERY_PORT: it broadcasts a
+# beacon every BEACON_INTERVAL seconds, and answers a client's probe right
+# away, so joining doesn't wait for the next beacon. A beacon is just
+# "UNO <tcp port> <server name>"; the address is wherever the datagram came
+# from, so the server never has to work out its own LAN IP.
+#
+#   python discovery.py    (lists the servers on this network)
+
+import argparse
+import logging
+import socket
+import threading
+import time
+
+DISCOVERY_PORT = 65433
+BEACON_INTERVAL = 2.0
+PROBE_INTERVAL = 0.5  # Clients repeat their probe this often in case one is lost
+SETTLE_TIME = 0.2  # After the first answer, how long a client waits for other servers
+PROBE = b'UNO?'
+BEACON = b'UNO '
+
+log = logging.getLogger('discovery')
+
+
+def encode_beacon(port, name):
+    return BEACON + f"{port} {name}".encode('utf-8')
+
+
+def decode_beacon(data):
+    # (tcp port, server name), or None if this isn't a beacon
+    if not data.startswith(BEACON):
+        return None
+    port, _, name = data[len(BEACON):].decode('utf-8', 'replace').partition(' ')
+    if not port.isdigit():
+        return None
+    return int(port), name
+
+
+def broadcast_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    return sock
+
+
+class Beacon:
+    # Runs on a daemon thread in the server (the router, when sharded)
+    def __init__(self, port, name, discovery_port=DISCOVERY_PORT, interval=BEACON_INTERVAL):
+        self.message = encode_beacon(port, name)
+        self.discovery_port = discovery_port
+        self.interval = interval
+        self.sock = broadcast_socket()
+        # Several servers on one machine can all listen for probes
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    def start(self):
+        self.sock.bind(('', self.discovery_port))
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        next_beacon = 0
+        while True:
+            now = time.monotonic()
+            if now >= next_beacon:
+                self.send(('<broadcast>', self.discovery_port))
+                next_beacon = now + self.interval
+            self.sock.settimeout(next_beacon - now)
+            try:
+                data, address = self.sock.recvfrom(64)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                log.warning(f"Discovery socket failed: {e}")
+                return
+            if data == PROBE:
+                self.send(address)
+
+    def send(self, address):
+        try:
+            self.sock.sendto(self.message, address)
+        except OSError as e:
+            log.debug(f"Could not send a beacon to {address}: {e}")
+
+
+def find_servers(timeout=3.0, discovery_port=DISCOVERY_PORT, wait_all=False):
+    # Probe the LAN and return [(host, port, name)] in the order the servers
+    # answered. Returns shortly after the first answer unless wait_all, and
+    # with an empty list if nobody answers within `timeout` seconds.
+    sock = broadcast_socket()
+    servers = []
+    start = time.monotonic()
+    deadline = start + timeout
+    next_probe = start
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now >= next_probe:
+                try:
+                    sock.sendto(PROBE, ('<broadcast>', discovery_port))
+                except OSError as e:
+                    log.debug(f"Could not send a discovery probe: {e}")
+                next_probe = now + PROBE_INTERVAL
+            sock.settimeout(max(0.01, min(next_probe, deadline) - now))
+            try:
+                data, (host, _) = sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            beacon = decode_beacon(data)
+            if beacon is None or (host, beacon[0]) in [(known[0], known[1]) for known in servers]:
+                continue
+            servers.append((host, *beacon))
+            if not wait_all:
+                deadline = min(deadline, time.monotonic() + SETTLE_TIME)
+    finally:
+        sock.close()
+    return servers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the UNO servers on this network")
+    parser.add_argument('--timeout', type=float, default=2.0)
+    parser.add_argument('--discovery-port', type=int, default=DISCOVERY_PORT)
+    args = parser.parse_args()
+    found = find_servers(args.timeout, args.discovery_port, wait_all=True)
+    for host, port, name in found:
+        print(f"{name} at {host}:{port}")
+    if not found:
+        print("No servers found.")
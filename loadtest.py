@@ -0,0 +1,240 @@
+# Load generator: starts a server (or uses a running one), connects N scripted
+# clients that speak the real protocol, seats them at many tables, starts the
+# games and lets them play legal cards from their own hand as fast as turns
+# come round. Reports action -> turn notification latency percentiles,
+# messages per second and the server's CPU time and memory.
+#
+#   python loadtest.py --clients 400 --table-size 4 --duration 20 --asyncio
+#
+# With --matchmaking the clients don't pick tables: the server is started
+# with --match-size and its queue seats them and starts every game. With
+# --workers the server runs sharded and each table lives on the worker its
+# room name hashes to.
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from card import Card
+from card import Hand
+from card import card_from_id
+from card import decode_hand
+from card import match_key
+from protocol import FrameDecoder
+from protocol import RECV_SIZE
+from protocol import encode_frame
+
+
+class ScriptedClient:
+    def __init__(self, username, room_name, think_time):
+        self.username = username
+        self.room_name = room_name
+        self.think_time = think_time
+        self.hand = Hand()
+        self.top_card = None
+        self.wild_color = None
+        self.pending_draw = 0  # Cards we owe unless we stack
+        self.sent_at = None  # When our last move went out
+        self.last_rejected = False
+        self.latencies = []
+        self.frames = 0
+        self.writer = None
+
+    async def run(self, host, port, joined, stop):
+        reader, self.writer = await asyncio.open_connection(host, port)
+        self.send('CODECS delta')
+        if self.room_name is not None:
+            self.send(f'/join {self.room_name}')  # Before the name, so a router sends us straight there
+        self.send(self.username)
+        joined.release()
+        decoder = FrameDecoder()
+        try:
+            while not stop.is_set():
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    break
+                for frame in decoder.feed(data):
+                    self.frames += 1
+                    await self.handle(frame)
+        finally:
+            self.writer.close()
+
+    def send(self, text):
+        self.writer.write(encode_frame(text.encode('utf-8')))
+
+    async def handle(self, frame):
+        tag = frame[:5]
+        if tag == b'TURN:':
+            if self.sent_at is not None:
+                self.latencies.append(time.perf_counter() - self.sent_at)
+                self.sent_at = None
+            if frame[5:].decode('utf-8') == self.username:
+                await self.take_turn()
+        elif tag == b'HSYNC':
+            # A full hand comes with every new deal; forget the last table
+            self.hand = Hand(decode_hand(frame[10:]))
+            self.top_card = None
+            self.wild_color = None
+        elif tag == b'HADD:':
+            self.hand.append(card_from_id(frame[9]))
+        elif tag == b'HREM:':
+            card = card_from_id(frame[9])
+            if card in self.hand:
+                self.hand.remove(card)
+        elif tag == b'TEXT:':
+            text = frame[5:].decode('utf-8')
+            if ' played: ' in text:
+                color, value = text.split(' played: ', 1)[1].split(' ', 1)
+                try:
+                    self.top_card = Card(color, value)
+                    self.wild_color = None
+                except ValueError:
+                    pass
+            elif text.startswith('The color is now '):
+                self.wild_color = text[len('The color is now '):].rstrip('.')
+            elif text.startswith('Stack a '):
+                self.pending_draw = int(text.split(' draw ')[1].split()[0])
+            elif 'Try again' in text:
+                self.last_rejected = True
+
+    async def take_turn(self):
+        if self.think_time:
+            await asyncio.sleep(self.think_time)
+        moves = self.hand.playable(match_key(self.top_card, self.wild_color, self.pending_draw))
+        self.pending_draw = 0
+        if moves and not self.last_rejected:
+            self.send(f'PLAY {moves[0]}')
+        else:
+            # Nothing to play, or the server didn't accept our last attempt
+            self.send('DRAW')
+        self.last_rejected = False
+        self.sent_at = time.perf_counter()
+
+
+def process_tree(pid):
+    # The process and its descendants (a sharded server's workers), from /proc
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as children_file:
+            for child in children_file.read().split():
+                pids += process_tree(int(child))
+    except OSError:
+        pass
+    return pids
+
+
+def read_process_stats(pid):
+    # CPU seconds used and resident memory in KiB, from /proc (Linux only),
+    # summed over the server process and its children
+    cpu = rss = 0
+    try:
+        for member in process_tree(pid):
+            with open(f'/proc/{member}/stat') as stat_file:
+                fields = stat_file.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+            with open(f'/proc/{member}/status') as status_file:
+                rss += next(int(line.split()[1]) for line in status_file if line.startswith('VmRSS:'))
+        return cpu, rss
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None, None
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def run_load(args, server_process):
+    num_tables = (args.clients + args.table_size - 1) // args.table_size
+    clients = [ScriptedClient(f"load{i}", None if args.matchmaking else f"table{i // args.table_size}",
+                              args.think_ms / 1000)
+               for i in range(args.clients)]
+    stop = asyncio.Event()
+    joined = asyncio.Semaphore(0)
+    tasks = []
+    for scripted in clients:
+        tasks.append(asyncio.create_task(scripted.run(args.host, args.port, joined, stop)))
+        await joined.acquire()
+    await asyncio.sleep(0.5)  # Let the server finish seating everyone
+
+    pid = server_process.pid if server_process else args.server_pid
+    cpu_before, _ = read_process_stats(pid) if pid else (None, None)
+    if args.matchmaking:
+        pass  # The server's queue starts the games
+    elif server_process:
+        server_process.stdin.write(b'/s\n')
+        server_process.stdin.flush()
+    else:
+        print("Type /s on the server console to start the games.")
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        await asyncio.sleep(min(0.5, args.duration))
+        if server_process and not args.matchmaking:
+            # Games end now; start every table that has finished again
+            server_process.stdin.write(b'/s\n')
+            server_process.stdin.flush()
+    elapsed = time.perf_counter() - start
+    cpu_after, rss = read_process_stats(pid) if pid else (None, None)
+
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = sorted(latency for scripted in clients for latency in scripted.latencies)
+    frames = sum(scripted.frames for scripted in clients)
+    print(f"{args.clients} clients at {num_tables} tables for {elapsed:.1f}s")
+    print(f"Moves: {len(latencies)} ({len(latencies) / elapsed:,.0f}/s), "
+          f"messages received: {frames} ({frames / elapsed:,.0f}/s)")
+    print("Move -> turn notification latency: "
+          f"p50 {percentile(latencies, 0.50) * 1000:.2f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    if cpu_before is not None and cpu_after is not None:
+        print(f"Server CPU: {cpu_after - cpu_before:.2f}s ({100 * (cpu_after - cpu_before) / elapsed:.0f}% of one core), "
+              f"RSS: {rss / 1024:.1f} MiB")
+
+
+def start_server(args):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py'),
+               '--host', args.host, '--port', str(args.port), '--beacon-port', '0']
+    if args.asyncio:
+        command.append('--asyncio')
+    if args.matchmaking:
+        command += ['--match-size', str(args.table_size)]
+    if args.workers > 1:
+        command += ['--workers', str(args.workers)]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    time.sleep(1)  # Give it time to bind
+    return process
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the UNO server with scripted clients")
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--table-size', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10, help="seconds to play once the games start")
+    parser.add_argument('--think-ms', type=float, default=0, help="delay before each scripted move")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=65432)
+    parser.add_argument('--asyncio', action='store_true', help="start the server in asyncio mode")
+    parser.add_argument('--matchmaking', action='store_true',
+                        help="let the server's matchmaking queue form the tables and start the games")
+    parser.add_argument('--workers', type=int, default=1, help="start the server sharded over this many worker processes")
+    parser.add_argument('--connect', action='store_true',
+                        help="use a server that is already running instead of starting one")
+    parser.add_argument('--server-pid', type=int, default=None,
+                        help="pid of the running server, for CPU/RSS figures with --connect")
+    args = parser.parse_args()
+
+    server_process = None if args.connect else start_server(args)
+    try:
+        asyncio.run(run_load(args, server_process))
+    finally:
+        if server_process:
+            server_process.kill()
@@ -0,0 +1,105 @@
+# Lobby queue that groups waiting players into tables.
+#
+# Players are queued by rating band (everyone shares band 0 unless the
+# server matches by rating); each band is a heap ordered by arrival, so
+# queueing is O(log n) and a table is formed the moment a band holds enough
+# players. When someone has waited too long, take_waiting gives them a table
+# from their own band topped up from the nearest bands, and the server fills
+# any seats still empty with bots. Leaving the queue only marks the entry;
+# it is skipped when it reaches the top of its heap.
+
+import heapq
+import itertools
+import threading
+import time
+
+DEFAULT_RATING = 1000
+RATING_K = 32  # Most rating points one game against one opponent can move
+
+
+class Matchmaker:
+    def __init__(self, table_size, band_width=0):
+        self.table_size = table_size
+        self.band_width = band_width  # 0 puts everyone in one band
+        self.bands = {}  # Band -> heap of [queued at, sequence, username]
+        self.counts = {}  # Band -> live entries in its heap
+        self.entries = {}  # Username -> (band, entry)
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def band(self, rating):
+        return int(rating // self.band_width) if self.band_width else 0
+
+    def join(self, username, rating=DEFAULT_RATING):
+        # Queue a player. Returns a full table of usernames if this one
+        # completed it, otherwise None.
+        with self.lock:
+            if username in self.entries:
+                return None
+            band = self.band(rating)
+            entry = [time.monotonic(), next(self.sequence), username]
+            heapq.heappush(self.bands.setdefault(band, []), entry)
+            self.entries[username] = (band, entry)
+            self.counts[band] = self.counts.get(band, 0) + 1
+            if self.counts[band] >= self.table_size:
+                return self.pop_band(band, self.table_size)
+            return None
+
+    def leave(self, username):
+        with self.lock:
+            found = self.entries.pop(username, None)
+            if found is None:
+                return False
+            band, entry = found
+            entry[2] = None
+            self.counts[band] -= 1
+            return True
+
+    def queued_at(self, username):
+        found = self.entries.get(username)
+        return None if found is None else found[1][0]
+
+    def take_waiting(self, username):
+        # Seat a player who has waited long enough: everyone in their band,
+        # then the closest bands, up to a full table. Returns the usernames
+        # (which may be just theirs), or None if they are no longer queued.
+        with self.lock:
+            found = self.entries.get(username)
+            if found is None:
+                return None
+            home = found[0]
+            table = []
+            for band in sorted(self.bands, key=lambda band: abs(band - home)):
+                table += self.pop_band(band, self.table_size - len(table))
+                if len(table) == self.table_size:
+                    break
+            return table
+
+    def pop_band(self, band, limit):
+        # Called with the lock held: up to `limit` players, longest waiting first
+        heap = self.bands[band]
+        taken = []
+        while heap and len(taken) < limit:
+            username = heapq.heappop(heap)[2]
+            if username is not None:
+                del self.entries[username]
+                taken.append(username)
+        self.counts[band] -= len(taken)
+        if not heap:
+            del self.bands[band]
+            del self.counts[band]
+        return taken
+
+
+def update_ratings(ratings, winner, losers):
+    # Elo, with the winner counted as beating each loser once
+    winner_rating = ratings.get(winner, DEFAULT_RATING)
+    for loser in losers:
+        loser_rating = ratings.get(loser, DEFAULT_RATING)
+        expected = 1 / (1 + 10 ** ((loser_rating - winner_rating) / 400))
+        change = RATING_K * (1 - expected)
+        ratings[winner] = ratings.get(winner, DEFAULT_RATING) + change
+        ratings[loser] = loser_rating - change
@@ -0,0 +1,163 @@
+# Lightweight in-process metrics: counters, gauges and latency histograms,
+# rendered as Prometheus-style text for the metrics port or as a short
+# human summary for the server console's /stats command.
+
+import bisect
+import functools
+import http.server
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds: 10us doubling up to ~10s
+BUCKETS = [0.00001 * 2 ** i for i in range(21)]
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+    def summary(self):
+        return f"{self.name}: {self.value}"
+
+
+class Gauge:
+    # Either set/inc/dec by hand, or give it a function to read on demand
+    def __init__(self, name, help_text, read=None):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self.read = read
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def get(self):
+        return self.read() if self.read is not None else self.value
+
+    def render(self):
+        return [f"# TYPE {self.name} gauge", f"{self.name} {self.get()}"]
+
+    def summary(self):
+        return f"{self.name}: {self.get()}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket holding the requested rank
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return 0.0
+
+    def render(self):
+        lines = [f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.total}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+    def summary(self):
+        if not self.count:
+            return f"{self.name}: no samples"
+        return (f"{self.name}: n={self.count} avg={1000 * self.total / self.count:.3f}ms "
+                f"p50<={1000 * self.quantile(0.5):.3f}ms p95<={1000 * self.quantile(0.95):.3f}ms "
+                f"p99<={1000 * self.quantile(0.99):.3f}ms")
+
+
+registry = {}
+
+
+def counter(name, help_text=''):
+    return registry.setdefault(name, Counter(name, help_text))
+
+def gauge(name, help_text='', read=None):
+    return registry.setdefault(name, Gauge(name, help_text, read))
+
+def histogram(name, help_text=''):
+    return registry.setdefault(name, Histogram(name, help_text))
+
+
+def timed(name):
+    # Decorator recording how long each call takes into histogram `name`
+    timings = histogram(name)
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timings.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def render():
+    lines = []
+    for metric in registry.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def summary():
+    return "\n".join(metric.summary() for metric in registry.values())
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line each
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    # Plain-text metrics on http://host:port/ from a background thread
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
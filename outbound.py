@@ -0,0 +1,215 @@
+# Per-client outbound buffering for both server modes.
+#
+# Handlers never write to a socket directly. They hand frames to the
+# client's connection object, which queues them. Inside a coalesce() block
+# (one client command, one bot move, ...) nothing is written until the block
+# ends; then each client touched gets everything it was sent in a single
+# write. A client that stops reading is cut off once too much is queued
+# for it, instead of stalling everyone else's turn.
+
+import asyncio
+import collections
+import logging
+import socket
+import threading
+from contextlib import contextmanager
+import metrics
+
+MAX_PENDING_BYTES = 256 * 1024  # Queued-but-unsent bytes before we evict a client
+
+log = logging.getLogger('outbound')
+bytes_out = metrics.counter('uno_bytes_out_total', "Bytes written to clients")
+evictions = metrics.counter('uno_slow_client_evictions_total', "Clients cut off for not reading")
+
+_batch = threading.local()
+
+
+@contextmanager
+def coalesce():
+    # Hold back writes made on this thread until the outermost block exits
+    if getattr(_batch, 'touched', None) is not None:
+        yield
+        return
+    _batch.touched = {}
+    try:
+        yield
+    finally:
+        touched = _batch.touched
+        _batch.touched = None
+        for connection in touched:
+            connection.flush()
+
+
+def _defer(connection):
+    # Returns True if a coalesce() block is open and will flush connection
+    touched = getattr(_batch, 'touched', None)
+    if touched is None:
+        return False
+    touched[connection] = None  # Dict as an ordered set
+    return True
+
+
+class OutboundQueue:
+    # Threaded mode: frames go into a deque and a writer thread per client
+    # drains it, joining everything queued into one sendall. A blocked
+    # client only ever blocks its own writer.
+    def __init__(self, sock, max_pending=MAX_PENDING_BYTES):
+        self.sock = sock
+        self.max_pending = max_pending
+        self.frames = collections.deque()
+        self.pending_bytes = 0
+        self.closed = False
+        self.hanging_up = False  # Shut the socket once what's queued is sent
+        self.detaching = False  # Stop writing once what's queued is sent
+        self.ready = threading.Condition(threading.Lock())
+        self.writer = threading.Thread(target=self.drain, daemon=True)
+        self.writer.start()
+
+    def sendall(self, data):
+        with self.ready:
+            if self.closed or self.detaching:
+                return
+            self.frames.append(data)
+            self.pending_bytes += len(data)
+            if self.pending_bytes > self.max_pending:
+                self.evict()
+                return
+        if not _defer(self):
+            self.flush()
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def flush(self):
+        with self.ready:
+            self.ready.notify()
+
+    def drain(self):
+        while True:
+            with self.ready:
+                while not self.frames and not self.closed and not self.hanging_up and not self.detaching:
+                    self.ready.wait()
+                if self.closed:
+                    return
+                data = b''.join(self.frames)
+                self.frames.clear()
+                self.pending_bytes = 0
+                hanging_up = self.hanging_up
+                detaching = self.detaching
+            try:
+                if data:
+                    self.sock.sendall(data)
+                    bytes_out.inc(len(data))
+                if detaching:
+                    return
+                if hanging_up:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                    return
+            except OSError:
+                with self.ready:
+                    self.evict()
+                return
+
+    def evict(self):
+        # Called with self.ready held. Shutting the socket down makes the
+        # client's reader thread see EOF and run the normal disconnect path.
+        if self.closed:
+            return
+        self.closed = True
+        self.frames.clear()
+        self.ready.notify()
+        evictions.inc()
+        log.warning("Evicting slow client")
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def getpeername(self):
+        return self.sock.getpeername()
+
+    def shutdown(self):
+        # Hang up once everything queued so far is written; the client's
+        # reader then sees EOF and runs the normal disconnect path
+        with self.ready:
+            self.hanging_up = True
+            self.ready.notify()
+
+    def detach(self, timeout=5):
+        # Write out everything queued so far and stop, leaving the socket
+        # open for its next owner. False if that didn't happen in time.
+        with self.ready:
+            self.detaching = True
+            self.ready.notify()
+        self.writer.join(timeout)
+        return not self.writer.is_alive() and not self.closed
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.frames.clear()
+            self.ready.notify()
+        self.sock.close()
+
+
+class StreamConnection:
+    # Asyncio mode: socket-like wrapper around a StreamWriter. write() only
+    # buffers on the transport, so it never blocks the loop; frames written
+    # during a coalesce() block are joined into one write. If the transport
+    # buffer grows past max_pending the client isn't keeping up and is
+    # aborted, which ends its reader coroutine.
+    def __init__(self, writer, max_pending=MAX_PENDING_BYTES):
+        self.writer = writer
+        self.max_pending = max_pending
+        self.frames = []
+
+    def sendall(self, data):
+        if self.writer.is_closing():
+            return
+        self.frames.append(data)
+        if not _defer(self):
+            self.flush()
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def flush(self):
+        if not self.frames:
+            return
+        data = b''.join(self.frames)
+        self.frames.clear()
+        if self.writer.is_closing():
+            return
+        self.writer.write(data)
+        bytes_out.inc(len(data))
+        if self.writer.transport.get_write_buffer_size() > self.max_pending:
+            evictions.inc()
+            log.warning(f"Evicting slow client {self.getpeername()}")
+            self.writer.transport.abort()
+
+    def getpeername(self):
+        return self.writer.get_extra_info('peername')
+
+    def shutdown(self):
+        # The transport writes out its buffer before closing
+        self.flush()
+        self.writer.transport.close()
+
+    async def detach(self, timeout=5):
+        # As OutboundQueue.detach: wait until the transport has written
+        # everything, leaving the socket open for its next owner
+        self.flush()
+        if self.writer.is_closing():
+            return False
+        self.writer.transport.set_write_buffer_limits(0)
+        try:
+            await asyncio.wait_for(self.writer.drain(), timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            return False
+        return not self.writer.is_closing()
+
+    def close(self):
+        self.frames.clear()
+        self.writer.close()
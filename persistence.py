@@ -0,0 +1,375 @@
+# Crash recovery for running games.
+#
+# Every started game gets a Journal: the Game reports each change (cards
+# dealt, a card played, a card drawn, the turn moving on, a reshuffle, a
+# player leaving) and the journal turns it into a few bytes in an append-only
+# log. Every SNAPSHOT_INTERVAL records the whole table is written out as one
+# compact snapshot and the log starts over. Nothing is written on the game's
+# thread: records are buffered and a single flusher thread writes and fsyncs
+# all journals together every FSYNC_INTERVAL seconds, so a crash loses at most
+# that much play.
+#
+# Files for room <name> in the data directory:
+#   <name>.snap  "UNOS", version, generation, then the table (see encode_snapshot)
+#   <name>.log   generation (4 bytes), then records: kind, 2-byte length, payload
+# A log is only replayed on top of the snapshot with the same generation.
+
+import logging
+import os
+import threading
+import time
+import urllib.parse
+import metrics
+from card import CARDS
+from card import COLORS
+from card import Deck
+from card import Game
+from card import Hand
+
+SNAPSHOT_INTERVAL = 256  # Log records between snapshots
+FSYNC_INTERVAL = 0.05  # Seconds between group fsyncs
+SNAPSHOT_MAGIC = b'UNOS'
+SNAPSHOT_VERSION = 2
+NO_CARD = 255  # Card id byte meaning "no card" (no top card yet)
+NO_COLOR = 255  # Color byte meaning "no wild color chosen"
+
+# Log record kinds
+PLAY = b'P'  # seat, card id, chosen wild color (index into COLORS or NO_COLOR)
+DRAW = b'D'  # seat, card id
+TURN = b'T'  # new current index, direction (1 or 0 for -1), cards pending
+RESHUFFLE = b'S'  # new deck order as card ids
+REMOVE = b'R'  # username
+
+log = logging.getLogger('persistence')
+records_written = metrics.counter('uno_journal_records_total', "Game events written to the journal")
+fsync_seconds = metrics.histogram('uno_journal_fsync_seconds')
+
+
+def encode_string(text):
+    data = text.encode('utf-8')
+    return len(data).to_bytes(2, 'big') + data
+
+def encode_cards(cards):
+    return len(cards).to_bytes(2, 'big') + bytes(card.id for card in cards)
+
+def encode_ids(card_array):
+    ids = card_array.to_ids()
+    return len(ids).to_bytes(2, 'big') + ids
+
+def encode_color(color):
+    return NO_COLOR if color is None else COLORS.index(color)
+
+def decode_color(index):
+    return None if index == NO_COLOR else COLORS[index]
+
+def encode_record(kind, payload):
+    return kind + len(payload).to_bytes(2, 'big') + payload
+
+
+def encode_snapshot(game, bots, generation):
+    # Everything needed to rebuild the Game, plus which seats are bots
+    parts = [SNAPSHOT_MAGIC, bytes([SNAPSHOT_VERSION]), generation.to_bytes(4, 'big'),
+             len(game.players).to_bytes(2, 'big')]
+    for name in game.players:
+        parts.append(encode_string(name))
+        parts.append(bytes([game.players_drawn.get(name, False)]))
+        parts.append(encode_cards(list(game.player_hands[name])))
+    parts.append(encode_ids(game.deck))
+    parts.append(encode_ids(game.discard_pile))
+    parts.append(bytes([NO_CARD if game.top_card is None else game.top_card.id,
+                        game.current_index, game.direction == 1, encode_color(game.wild_color),
+                        game.pending_draw]))
+    parts.append(len(bots).to_bytes(2, 'big'))
+    for name, strategy_name in bots.items():
+        parts.append(encode_string(name))
+        parts.append(encode_string(strategy_name))
+    return b''.join(parts)
+
+
+class Reader:
+    # Pulls length-prefixed fields off a bytes object
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+
+    def take(self, size):
+        if self.offset + size > len(self.data):
+            raise ValueError("Truncated snapshot")
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def number(self, size):
+        return int.from_bytes(self.take(size), 'big')
+
+    def string(self):
+        return self.take(self.number(2)).decode('utf-8')
+
+    def ids(self):
+        return self.take(self.number(2))
+
+    def cards(self):
+        return [CARDS[card_id] for card_id in self.ids()]
+
+
+def decode_snapshot(data):
+    # Returns (generation, game, bots)
+    if data[:4] != SNAPSHOT_MAGIC or data[4] != SNAPSHOT_VERSION:
+        raise ValueError("Not a snapshot this server understands")
+    reader = Reader(data, 5)
+    generation = reader.number(4)
+    game = Game(Deck(verbose=False))
+    for _ in range(reader.number(2)):
+        name = reader.string()
+        game.add_player(name)
+        game.players_drawn[name] = bool(reader.number(1))
+        game.player_hands[name] = Hand(reader.cards())
+    game.deck.load_ids(reader.ids())
+    game.discard_pile.load_ids(reader.ids())
+    top_id, game.current_index, clockwise, color, game.pending_draw = reader.take(5)
+    game.top_card = None if top_id == NO_CARD else CARDS[top_id]
+    game.direction = 1 if clockwise else -1
+    game.wild_color = decode_color(color)
+    game.update_match_key()
+    bots = {}
+    for _ in range(reader.number(2)):
+        name = reader.string()
+        bots[name] = reader.string()
+    return generation, game, bots
+
+
+def apply_record(game, kind, payload):
+    # Redo one logged change. Records describe what happened, not what was
+    # asked for, so this needs none of the game rules.
+    if kind == PLAY:
+        player_name = game.players[payload[0]]
+        card = CARDS[payload[1]]
+        game.player_hands[player_name].remove(card)
+        game.top_card = card
+        game.discard_pile.append(card)
+        game.wild_color = decode_color(payload[2])
+        if not game.player_hands[player_name]:
+            game.winner = player_name
+    elif kind == DRAW:
+        player_name = game.players[payload[0]]
+        card = CARDS[payload[1]]
+        if game.deck.top() is card:
+            game.deck.draw()
+        else:
+            game.deck.remove(card)
+        game.player_hands[player_name].append(card)
+        game.players_drawn[player_name] = True
+    elif kind == TURN:
+        game.players_drawn[game.get_current_player()] = False
+        game.current_index = payload[0]
+        game.direction = 1 if payload[1] else -1
+        game.pending_draw = payload[2]
+    elif kind == RESHUFFLE:
+        top = game.discard_pile.top()
+        game.discard_pile.clear()
+        game.discard_pile.append(top)
+        game.deck.load_ids(payload)
+    elif kind == REMOVE:
+        game.remove_player(payload.decode('utf-8'))
+    else:
+        raise ValueError(f"Unknown journal record {kind!r}")
+
+
+def replay_log(game, data, generation):
+    # Apply every complete record; a torn record at the end (the server died
+    # mid-write) is ignored. Returns the number of records applied.
+    if len(data) < 4 or int.from_bytes(data[:4], 'big') != generation:
+        return 0
+    view = memoryview(data)
+    offset, applied = 4, 0
+    while offset + 3 <= len(data):
+        size = int.from_bytes(view[offset + 1:offset + 3], 'big')
+        if offset + 3 + size > len(data):
+            break
+        apply_record(game, bytes(view[offset:offset + 1]), bytes(view[offset + 3:offset + 3 + size]))
+        offset += 3 + size
+        applied += 1
+    game.update_match_key()
+    return applied
+
+
+class Journal:
+    # The log for one game. Game methods call the hooks below (under the
+    # room lock); the Store's flusher thread calls sync().
+    def __init__(self, store, name, bots):
+        self.store = store
+        self.name = name
+        self.bots = bots  # The room's bot dict, so snapshots see bots added later
+        self.generation = 0
+        self.records = []  # Encoded records not yet written
+        self.snapshot = None  # Encoded snapshot not yet written
+        self.since_snapshot = 0
+        self.log_file = None
+        self.closed = False
+        self.lock = threading.Lock()  # Guards the buffers above
+        self.io_lock = threading.Lock()  # Guards the files, closed and log_file
+
+    def append(self, game, record):
+        with self.lock:
+            self.records.append(record)
+        records_written.inc()
+        self.since_snapshot += 1
+        if self.since_snapshot >= SNAPSHOT_INTERVAL:
+            self.take_snapshot(game)
+
+    def take_snapshot(self, game):
+        # Encode now, on the game's thread, so the snapshot is consistent
+        with self.lock:
+            self.generation += 1
+            self.snapshot = encode_snapshot(game, self.bots, self.generation)
+            self.records = []  # Anything buffered is already in the snapshot
+        self.since_snapshot = 0
+
+    def started(self, game):
+        self.take_snapshot(game)
+
+    def played(self, game, player_name, card):
+        self.append(game, encode_record(PLAY, bytes([game.players.index(player_name), card.id,
+                                                     encode_color(game.wild_color)])))
+
+    def drew(self, game, player_name, card):
+        self.append(game, encode_record(DRAW, bytes([game.players.index(player_name), card.id])))
+
+    def turned(self, game):
+        self.append(game, encode_record(TURN, bytes([game.current_index, game.direction == 1,
+                                                     game.pending_draw])))
+
+    def reshuffled(self, game):
+        self.append(game, encode_record(RESHUFFLE, game.deck.to_ids()))
+
+    def removed(self, game, player_name):
+        self.append(game, encode_record(REMOVE, player_name.encode('utf-8')))
+
+    def sync(self):
+        # Write out whatever is buffered. Returns the file to fsync, if any.
+        # Only swapping the buffers happens under self.lock, which the game
+        # thread takes on every append; the writes and the snapshot's fsync
+        # run under io_lock, which only close() shares.
+        with self.lock:
+            snapshot, self.snapshot = self.snapshot, None
+            records, self.records = self.records, []
+            generation = self.generation
+        with self.io_lock:
+            if self.closed:
+                return None
+            if snapshot is not None:
+                # New snapshot first; only then start the matching log over
+                snap_path = self.store.path(self.name, '.snap')
+                with open(snap_path + '.tmp', 'wb') as snap_file:
+                    snap_file.write(snapshot)
+                    snap_file.flush()
+                    os.fsync(snap_file.fileno())
+                os.replace(snap_path + '.tmp', snap_path)
+                if self.log_file is not None:
+                    self.log_file.close()
+                self.log_file = open(self.store.path(self.name, '.log'), 'wb')
+                self.log_file.write(generation.to_bytes(4, 'big'))
+            if self.log_file is None:
+                return None  # Nothing to write until the first snapshot
+            if records:
+                self.log_file.write(b''.join(records))
+            elif snapshot is None:
+                return None
+            self.log_file.flush()
+            return self.log_file
+
+    def close(self, delete=False):
+        with self.io_lock:
+            self.closed = True
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
+            if delete:
+                for suffix in ('.snap', '.log'):
+                    try:
+                        os.remove(self.store.path(self.name, suffix))
+                    except FileNotFoundError:
+                        pass
+
+
+class Store:
+    # All journals in one data directory, with one flusher thread for them
+    def __init__(self, directory, fsync_interval=FSYNC_INTERVAL):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.journals = {}  # Room name -> Journal
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.flusher = threading.Thread(target=self.run, daemon=True)
+        self.flusher.start()
+
+    def path(self, name, suffix):
+        # Room names are user input, so quote them into safe file names
+        return os.path.join(self.directory, urllib.parse.quote(name, safe='') + suffix)
+
+    def open(self, name, game, bots):
+        # Start journaling a game; any old files for this room are replaced
+        journal = Journal(self, name, bots)
+        with self.lock:
+            old = self.journals.pop(name, None)
+            self.journals[name] = journal
+        if old is not None:
+            old.close()
+        game.journal = journal
+        return journal
+
+    def discard(self, name, journal=None):
+        # The game is over or its room was closed: forget it. Given the
+        # game's journal, leave a newer game in a room of the same name alone.
+        with self.lock:
+            if journal is not None and self.journals.get(name) is not journal:
+                return
+            journal = self.journals.pop(name, None)
+        if journal is not None:
+            journal.close(delete=True)
+
+    def sync_all(self):
+        with self.lock:
+            journals = list(self.journals.values())
+        start = time.perf_counter()
+        files = [log_file for log_file in (journal.sync() for journal in journals) if log_file is not None]
+        for log_file in files:
+            try:
+                os.fsync(log_file.fileno())
+            except (OSError, ValueError):
+                pass  # Closed by discard() in the meantime
+        if files:
+            fsync_seconds.observe(time.perf_counter() - start)
+
+    def run(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            try:
+                self.sync_all()
+            except OSError as e:
+                log.error(f"Could not write game journal: {e}")
+
+    def recover(self):
+        # Rebuild every game found in the directory. Returns a list of
+        # (room name, Game, bots) with each game journaling again.
+        recovered = []
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith('.snap'):
+                continue
+            name = urllib.parse.unquote(file_name[:-len('.snap')])
+            try:
+                with open(self.path(name, '.snap'), 'rb') as snap_file:
+                    generation, game, bots = decode_snapshot(snap_file.read())
+                try:
+                    with open(self.path(name, '.log'), 'rb') as log_file:
+                        applied = replay_log(game, log_file.read(), generation)
+                except FileNotFoundError:
+                    applied = 0
+            except (OSError, ValueError, IndexError, KeyError) as e:
+                log.error(f"Could not recover room {name}: {e}")
+                continue
+            log.info(f"Recovered room {name}: {len(game.players)} players, {applied} events replayed")
+            journal = self.open(name, game, bots)
+            journal.take_snapshot(game)  # Compact the replayed log away
+            recovered.append((name, game, bots))
+        return recovered
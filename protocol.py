@@ -0,0 +1,65 @@
+# Wire framing shared by the server and the client.
+#
+# Every message in either direction is a 4-byte big-endian length followed by
+# that many bytes of payload. Server -> client payloads start with a type tag
+# such as b'TEXT:' or b'PICKLE:'; client -> server payloads are plain UTF-8
+# commands ("PLAY Red 4", "DRAW", the username, ...).
+
+HEADER_SIZE = 4
+RECV_SIZE = 65536  # Read as much as the kernel has buffered in one syscall
+MAX_FRAME_SIZE = 1 << 20  # Anything bigger is a broken or hostile peer
+
+
+def encode_frame(payload):
+    return len(payload).to_bytes(HEADER_SIZE, 'big') + payload
+
+
+def send_frame(sock, payload):
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    sock.sendall(encode_frame(payload))
+
+
+class FrameDecoder:
+    # Incremental decoder: feed it whatever recv() returned and it hands back
+    # every complete frame, keeping any partial frame buffered for next time.
+    # One recv can therefore carry many frames, and a frame can arrive split
+    # across any number of recvs.
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        frames = []
+        pos = 0
+        end = len(buffer)
+        with memoryview(buffer) as view:
+            while end - pos >= HEADER_SIZE:
+                length = int.from_bytes(view[pos:pos + HEADER_SIZE], 'big')
+                if length > self.max_frame_size:
+                    raise ValueError(f"Frame of {length} bytes exceeds the {self.max_frame_size} byte limit")
+                frame_end = pos + HEADER_SIZE + length
+                if frame_end > end:
+                    break  # Wait for the rest of this frame
+                frames.append(bytes(view[pos + HEADER_SIZE:frame_end]))
+                pos = frame_end
+        # Drop what was consumed; only a partial frame (if any) is left to move
+        if pos:
+            del buffer[:pos]
+        return frames
+
+    def pending(self):
+        return len(self.buffer)
+
+
+def iter_frames(sock, decoder=None):
+    # Yield frames from a blocking socket until the peer closes it
+    if decoder is None:
+        decoder = FrameDecoder()
+    while True:
+        data = sock.recv(RECV_SIZE)
+        if not data:
+            return
+        yield from decoder.feed(data)
@@ -0,0 +1,19 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import batch
+import simulate
+
+
+def test_batch_games_match_card_game():
+    # Every game the arrays play ends in the same state on card.Game
+    games = batch.BatchGames(list(range(200)), 3, rng=np.random.default_rng(1))
+    games.run([batch.random_policy, batch.greedy_policy, batch.random_policy])
+    for index in range(len(games)):
+        games.check(index)
+
+
+def test_greedy_games_match_the_simulator():
+    # With no random choices both engines play exactly the same games
+    assert batch.run_games(300, ['greedy', 'greedy'], seed=9) == simulate.run_batch(300, ['greedy', 'greedy'], 9)
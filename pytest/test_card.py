@@ -0,0 +1,110 @@
+import random
+import zlib
+from card import Card
+from card import Deck
+from card import Game
+from card import Hand
+from card import hand_checksum
+
+
+def make_game(hands, top_card):
+    # A game in progress with the given hands (name -> cards) and top card,
+    # the first player to move
+    game = Game(Deck(verbose=False))
+    for name in hands:
+        game.add_player(name)
+    game.start_game(seed=1)
+    game.player_hands = {name: Hand(cards) for name, cards in hands.items()}
+    game.discard_pile.append(top_card)
+    game.set_top_card(top_card)
+    return game
+
+
+def test_draw_two_stacks_and_penalty_draws_the_total():
+    game = make_game({'a': [Card('Red', 'Draw Two'), Card('Red', '1')],
+                      'b': [Card('Blue', 'Draw Two'), Card('Red', '5')],
+                      'c': [Card('Green', '3')]}, Card('Red', '7'))
+    assert game.play_card('a', Card('Red', 'Draw Two'))
+    assert game.pending_draw == 2
+    # Only another Draw Two may go on while the penalty is pending
+    assert not game.is_playable(Card('Red', '5'))
+    assert game.legal_moves('b') == [Card('Blue', 'Draw Two')]
+    assert game.play_card('b', Card('Blue', 'Draw Two'))
+    assert game.pending_draw == 4
+    assert not game.has_legal_move('c')
+    drawn = game.take_penalty('c')
+    assert len(drawn) == 4
+    assert len(game.player_hands['c']) == 5
+    assert game.pending_draw == 0
+    # The penalty costs c the turn
+    assert game.get_current_player() == 'a'
+    assert game.is_playable(Card('Blue', '9'))
+
+
+def test_wild_draw_four_only_stacks_on_itself():
+    game = make_game({'a': [Card('Black', 'Wild Draw Four'), Card('Red', '1')],
+                      'b': [Card('Green', 'Draw Two'), Card('Black', 'Wild Draw Four'), Card('Red', '2')]},
+                     Card('Red', '7'))
+    assert game.play_card('a', Card('Black', 'Wild Draw Four'), 'Green')
+    assert game.pending_draw == 4
+    assert game.legal_moves('b') == [Card('Black', 'Wild Draw Four')]
+
+
+def test_two_player_reverse_gives_the_turn_back():
+    game = make_game({'a': [Card('Red', 'Reverse'), Card('Red', '1')],
+                      'b': [Card('Blue', '2')]}, Card('Red', '7'))
+    assert game.play_card('a', Card('Red', 'Reverse'))
+    assert game.get_current_player() == 'a'
+    assert game.direction == 1
+
+
+def test_reverse_with_three_players_turns_around():
+    game = make_game({'a': [Card('Red', 'Reverse'), Card('Red', '1')],
+                      'b': [Card('Blue', '2')],
+                      'c': [Card('Green', '2')]}, Card('Red', '7'))
+    assert game.play_card('a', Card('Red', 'Reverse'))
+    assert game.direction == -1
+    assert game.get_current_player() == 'c'
+
+
+def test_wild_takes_the_chosen_color():
+    game = make_game({'a': [Card('Black', 'Wild'), Card('Red', '1')],
+                      'b': [Card('Blue', '2'), Card('Red', '3')]}, Card('Red', '7'))
+    assert game.play_card('a', Card('Black', 'Wild'), 'Blue')
+    assert game.wild_color == 'Blue'
+    assert game.legal_moves('b') == [Card('Blue', '2')]
+
+
+def test_wild_without_a_color_takes_the_most_held_one():
+    game = make_game({'a': [Card('Black', 'Wild'), Card('Green', '1'), Card('Green', '4'), Card('Red', '2')],
+                      'b': [Card('Blue', '2')]}, Card('Red', '7'))
+    assert game.play_card('a', Card('Black', 'Wild'))
+    assert game.wild_color == 'Green'
+
+
+def test_score_counts_the_other_hands():
+    game = make_game({'a': [Card('Red', '1')],
+                      'b': [Card('Blue', '7'), Card('Blue', 'Skip'), Card('Black', 'Wild')],
+                      'c': [Card('Green', '0'), Card('Yellow', 'Draw Two'), Card('Black', 'Wild Draw Four')]},
+                     Card('Red', '7'))
+    assert game.play_card('a', Card('Red', '1'))
+    assert game.winner == 'a'
+    assert game.score() == (7 + 20 + 50) + (0 + 20 + 50)
+
+
+def test_hand_checksum_ignores_order():
+    rng = random.Random(3)
+    cards = [Card('Red', '4'), Card('Red', '4'), Card('Black', 'Wild'), Card('Blue', 'Skip'), Card('Yellow', '0')]
+    shuffled = cards[:]
+    rng.shuffle(shuffled)
+    assert hand_checksum(cards) == hand_checksum(shuffled) == hand_checksum(Hand(shuffled))
+
+
+def test_hand_checksum_follows_adds_and_removes():
+    hand = Hand([Card('Red', '4'), Card('Green', '9')])
+    before = hand_checksum(hand)
+    hand.append(Card('Red', '4'))
+    assert hand_checksum(hand) != before
+    hand.remove(Card('Red', '4'))
+    assert hand_checksum(hand) == before
+    assert hand_checksum(hand) == zlib.crc32(hand.counts)
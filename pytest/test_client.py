@@ -0,0 +1,57 @@
+import client
+from card import Card
+from card import Hand
+from card import card_to_id
+from card import encode_hand
+from card import hand_checksum
+from protocol import FrameDecoder
+
+
+class FakeSocket:
+    # Collects what the client sends back (RESYNC requests)
+    def __init__(self):
+        self.decoder = FrameDecoder()
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent += self.decoder.feed(data)
+
+
+def seq(number):
+    return number.to_bytes(4, 'big')
+
+
+def change(tag, number, card):
+    return tag + b':' + seq(number) + bytes([card_to_id(card)])
+
+
+def checksum(number, hand):
+    return b'HSUM:' + seq(number) + hand_checksum(hand).to_bytes(4, 'big')
+
+
+def test_deltas_keep_the_mirror_in_step():
+    sock = FakeSocket()
+    server_hand = Hand([Card('Red', '1'), Card('Blue', 'Skip')])
+    client.apply_hand_update(sock, b'HSYNC:' + seq(1) + encode_hand(server_hand))
+    server_hand.append(Card('Black', 'Wild'))
+    client.apply_hand_update(sock, change(b'HADD', 2, Card('Black', 'Wild')))
+    server_hand.remove(Card('Red', '1'))
+    client.apply_hand_update(sock, change(b'HREM', 3, Card('Red', '1')))
+    client.apply_hand_update(sock, checksum(3, server_hand))
+    assert client.hand == server_hand
+    assert sock.sent == []
+
+
+def test_checksum_mismatch_asks_for_resync():
+    sock = FakeSocket()
+    client.apply_hand_update(sock, b'HSYNC:' + seq(1) + encode_hand([Card('Red', '1')]))
+    client.apply_hand_update(sock, checksum(1, Hand([Card('Red', '2')])))
+    assert sock.sent == [b'RESYNC']
+
+
+def test_sequence_gap_asks_for_resync():
+    sock = FakeSocket()
+    client.apply_hand_update(sock, b'HSYNC:' + seq(1) + encode_hand([Card('Red', '1')]))
+    client.apply_hand_update(sock, change(b'HADD', 3, Card('Green', '5')))
+    assert sock.sent == [b'RESYNC']
+    assert Card('Green', '5') not in client.hand
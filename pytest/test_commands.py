@@ -0,0 +1,45 @@
+import commands
+from card import CARDS
+from card import Card
+
+
+def test_play_accepts_any_case_and_spacing():
+    for message in ('PLAY Red 4', 'PLAY red 4', 'PLAY  RED   4'):
+        assert commands.parse(message)[:3] == (commands.PLAY, Card('Red', '4'), None)
+    assert commands.parse('PLAY red  draw two').card == Card('Red', 'Draw Two')
+
+
+def test_play_names_every_card():
+    for card in CARDS:
+        assert commands.parse(f"PLAY {card.color} {card.value}").card == card
+
+
+def test_wild_with_a_chosen_color():
+    command = commands.parse('PLAY Wild Draw Four Blue')
+    assert command.card == Card('Black', 'Wild Draw Four')
+    assert command.color == 'Blue'
+    command = commands.parse('PLAY black wild green')
+    assert (command.card, command.color) == (Card('Black', 'Wild'), 'Green')
+
+
+def test_play_of_something_that_is_not_a_card():
+    # Still a PLAY, so the server can say the card is invalid
+    for message in ('PLAY Red Wild', 'PLAY Purple 4', 'PLAY Red 4 Blue', 'PLAY'):
+        command = commands.parse(message)
+        assert command.op == commands.PLAY
+        assert command.card is None
+
+
+def test_other_verbs_take_the_rest_as_their_argument():
+    assert commands.parse('/join  table2 ') == (commands.JOIN, None, None, 'table2')
+    assert commands.parse('/rooms').op == commands.ROOMS
+    assert commands.parse('DRAW').op == commands.DRAW
+    assert commands.parse('RESYNC').op == commands.RESYNC
+    assert commands.parse('/queue').op == commands.QUEUE
+    assert commands.parse('CODECS delta hand') == (commands.CODECS, None, None, 'delta hand')
+
+
+def test_anything_else_is_chat():
+    # Verbs are matched exactly, so "play" in lower case is just talk
+    for message in ('hello all', 'play red 4', 'PLAYED well', '/nosuch thing'):
+        assert commands.parse(message) == (commands.CHAT, None, None, message)
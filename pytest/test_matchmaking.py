@@ -0,0 +1,64 @@
+from matchmaking import Matchmaker
+from matchmaking import update_ratings
+
+
+def test_table_forms_when_full():
+    matchmaker = Matchmaker(3)
+    assert matchmaker.join('a') is None
+    assert matchmaker.join('b') is None
+    assert matchmaker.join('c') == ['a', 'b', 'c']
+    assert len(matchmaker) == 0
+    assert matchmaker.queued_at('a') is None
+
+
+def test_players_who_left_are_skipped():
+    matchmaker = Matchmaker(2)
+    matchmaker.join('a')
+    assert matchmaker.leave('a')
+    assert not matchmaker.leave('a')
+    assert matchmaker.join('b') is None
+    assert matchmaker.join('c') == ['b', 'c']
+
+
+def test_joining_twice_keeps_one_place():
+    matchmaker = Matchmaker(2)
+    matchmaker.join('a')
+    queued_at = matchmaker.queued_at('a')
+    assert matchmaker.join('a') is None
+    assert matchmaker.queued_at('a') == queued_at
+    assert len(matchmaker) == 1
+
+
+def test_rating_bands_are_matched_separately():
+    matchmaker = Matchmaker(2, band_width=100)
+    assert matchmaker.join('low', 950) is None
+    assert matchmaker.join('high', 1250) is None
+    assert matchmaker.join('low2', 990) == ['low', 'low2']
+    assert matchmaker.queued_at('high') is not None
+
+
+def test_long_wait_takes_the_nearest_bands():
+    matchmaker = Matchmaker(3, band_width=100)
+    matchmaker.join('mid', 1050)
+    matchmaker.join('far', 1550)
+    matchmaker.join('near', 1150)
+    table = matchmaker.take_waiting('mid')
+    assert table == ['mid', 'near', 'far']
+    assert len(matchmaker) == 0
+
+
+def test_long_wait_alone_gets_a_table_of_one():
+    matchmaker = Matchmaker(4)
+    matchmaker.join('a')
+    assert matchmaker.take_waiting('a') == ['a']
+    assert matchmaker.take_waiting('a') is None
+
+
+def test_winner_gains_what_the_losers_lose():
+    ratings = {'a': 1000, 'b': 1000, 'c': 1200}
+    update_ratings(ratings, 'a', ['b', 'c'])
+    assert ratings['a'] > 1000
+    assert ratings['b'] < 1000 and ratings['c'] < 1200
+    assert abs(sum(ratings.values()) - 3200) < 1e-9
+    # Beating a stronger player is worth more
+    assert 1200 - ratings['c'] > 1000 - ratings['b']
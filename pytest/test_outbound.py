@@ -0,0 +1,52 @@
+import socket
+from outbound import OutboundQueue
+from outbound import coalesce
+
+
+def read_until_eof(sock):
+    sock.settimeout(5)
+    data = b''
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return data
+        data += chunk
+
+
+def test_coalesced_frames_arrive_in_order():
+    ours, theirs = socket.socketpair()
+    queue = OutboundQueue(ours)
+    with coalesce():
+        for number in range(100):
+            queue.sendall(b'%d,' % number)
+    queue.shutdown()
+    assert read_until_eof(theirs) == b''.join(b'%d,' % number for number in range(100))
+    queue.close()
+
+
+def test_client_that_falls_behind_is_evicted():
+    ours, theirs = socket.socketpair()
+    queue = OutboundQueue(ours, max_pending=1000)
+    # Inside a coalesce() block nothing is written yet, so it all queues up
+    with coalesce():
+        for _ in range(20):
+            queue.sendall(b'x' * 100)
+        assert queue.closed
+        assert not queue.frames
+    # Hung up without sending any of it
+    assert read_until_eof(theirs) == b''
+    queue.sendall(b'too late')
+    assert not queue.frames
+    queue.close()
+
+
+def test_queue_under_the_limit_is_kept():
+    ours, theirs = socket.socketpair()
+    queue = OutboundQueue(ours, max_pending=1000)
+    with coalesce():
+        for _ in range(10):
+            queue.sendall(b'x' * 100)
+    assert not queue.closed
+    queue.shutdown()
+    assert read_until_eof(theirs) == b'x' * 1000
+    queue.close()
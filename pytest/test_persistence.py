@@ -0,0 +1,52 @@
+import random
+import simulate
+from card import Deck
+from card import Game
+from persistence import Store
+from replay import state_digest
+
+
+def start_game(store, name, num_players, rng):
+    game = Game(Deck(verbose=False))
+    for seat in range(num_players):
+        game.add_player(f"{name}-p{seat}")
+    store.open(name, game, {})
+    game.start_game(rng.getrandbits(64))
+    return game
+
+
+def test_journal_round_trip(tmp_path):
+    # Play games part way (long enough for reshuffles and fresh snapshots),
+    # write the journals out and rebuild every game from disk
+    rng = random.Random(2)
+    store = Store(str(tmp_path), fsync_interval=3600)
+    games = {}
+    for number in range(20):
+        name = f"room {number}/x"
+        game = start_game(store, name, 2 + number % 3, rng)
+        for _ in range(rng.randrange(1, 400)):
+            if game.winner is not None:
+                break
+            simulate.play_turn(game, game.get_current_player(), simulate.random_policy, rng)
+        if number % 5 == 0:
+            game.remove_player(game.players[0])
+        games[name] = game
+    store.sync_all()
+
+    recovered = Store(str(tmp_path), fsync_interval=3600).recover()
+    assert sorted(name for name, _, _ in recovered) == sorted(games)
+    for name, game, bots in recovered:
+        assert game.players == games[name].players
+        assert state_digest(game) == state_digest(games[name])
+        assert bots == {}
+
+
+def test_discarded_game_is_not_recovered(tmp_path):
+    rng = random.Random(4)
+    store = Store(str(tmp_path), fsync_interval=3600)
+    start_game(store, 'kept', 2, rng)
+    start_game(store, 'over', 2, rng)
+    store.sync_all()
+    store.discard('over')
+    recovered = Store(str(tmp_path), fsync_interval=3600).recover()
+    assert [name for name, _, _ in recovered] == ['kept']
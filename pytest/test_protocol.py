@@ -0,0 +1,37 @@
+import pytest
+from protocol import FrameDecoder
+from protocol import encode_frame
+
+
+def test_frame_split_across_feeds():
+    decoder = FrameDecoder()
+    data = encode_frame(b'TEXT:hello')
+    assert decoder.feed(data[:2]) == []
+    assert decoder.feed(data[2:7]) == []
+    assert decoder.pending() == 7
+    assert decoder.feed(data[7:]) == [b'TEXT:hello']
+    assert decoder.pending() == 0
+
+
+def test_many_frames_in_one_feed():
+    decoder = FrameDecoder()
+    payloads = [b'TEXT:one', b'', b'HADD:\x00\x00\x00\x01\x05', b'TURN:bob']
+    data = b''.join(encode_frame(payload) for payload in payloads)
+    # The last frame's tail arrives later
+    assert decoder.feed(data[:-3]) == payloads[:-1]
+    assert decoder.feed(data[-3:]) == payloads[-1:]
+
+
+def test_one_byte_at_a_time():
+    decoder = FrameDecoder()
+    payloads = [b'A' * 300, b'B', b'C' * 70000]
+    frames = []
+    for byte in b''.join(encode_frame(payload) for payload in payloads):
+        frames += decoder.feed(bytes([byte]))
+    assert frames == payloads
+
+
+def test_oversize_frame_is_refused():
+    decoder = FrameDecoder(max_frame_size=16)
+    with pytest.raises(ValueError):
+        decoder.feed(encode_frame(b'x' * 17))
@@ -0,0 +1,49 @@
+import random
+import simulate
+from card import Deck
+from card import Game
+from replay import decode_record
+from replay import encode_record
+from replay import replay
+from replay import state_digest
+
+
+def test_record_round_trip():
+    rng = random.Random(7)
+    game = Game(Deck(verbose=False))
+    simulate.play_game([simulate.random_policy] * 3, rng, game=game)
+    seed, names, moves, digest = decode_record(encode_record(game))
+    assert seed == game.seed
+    assert names == game.players
+    assert moves == bytes(game.moves)
+    assert digest == state_digest(game)
+
+
+def test_replay_ends_in_the_same_state():
+    rng = random.Random(11)
+    game = Game(Deck(verbose=False))
+    replayed = Game(Deck(verbose=False))
+    for number in range(50):
+        policy = [simulate.random_policy, simulate.greedy_policy][number % 2]
+        simulate.play_game([policy] * (2 + number % 3), rng, game=game)
+        seed, names, moves, digest = decode_record(encode_record(game))
+        replay(seed, names, moves, replayed)
+        assert state_digest(replayed) == digest
+        assert replayed.winner == game.winner
+
+
+def test_replay_includes_players_who_left():
+    rng = random.Random(5)
+    game = Game(Deck(verbose=False))
+    for name in ('a', 'b', 'c'):
+        game.add_player(name)
+    game.start_game(rng.getrandbits(64))
+    for _ in range(10):
+        simulate.play_turn(game, game.get_current_player(), simulate.random_policy, rng)
+    game.remove_player('b')
+    for _ in range(10):
+        if game.winner is None:
+            simulate.play_turn(game, game.get_current_player(), simulate.random_policy, rng)
+    seed, names, moves, digest = decode_record(encode_record(game))
+    assert names == ['a', 'b', 'c']
+    assert state_digest(replay(seed, names, moves)) == digest
@@ -0,0 +1,57 @@
+import pytest
+from rooms import RoomManager
+
+
+def test_join_creates_the_room_once():
+    manager = RoomManager()
+    room = manager.join('table1', 'a')
+    assert manager.join('table1', 'b') is room
+    assert manager.get('table1') is room
+    assert room.members == ['a', 'b']
+    assert room.game.players == ['a', 'b']
+    assert len(manager) == 1
+
+
+def test_rooms_are_independent():
+    manager = RoomManager()
+    first = manager.join('table1', 'a')
+    second = manager.join('table2', 'b')
+    assert first.game is not second.game
+    assert second.members == ['b']
+    assert sorted(room.name for room in manager.list()) == ['table1', 'table2']
+
+
+def test_started_room_refuses_newcomers():
+    manager = RoomManager()
+    room = manager.join('table1', 'a')
+    room.started = True
+    with pytest.raises(ValueError):
+        manager.join('table1', 'b')
+    assert room.members == ['a']
+
+
+def test_last_leaver_drops_the_room():
+    closed = []
+    manager = RoomManager()
+    manager.on_close = closed.append
+    room = manager.join('table1', 'a')
+    manager.join('table1', 'b')
+    manager.leave(room, 'a')
+    assert manager.get('table1') is room
+    manager.leave(room, 'b')
+    assert manager.get('table1') is None
+    assert closed == [room]
+    # A new room of the same name starts afresh
+    assert manager.join('table1', 'c') is not room
+
+
+def test_close_returns_everyone_still_seated():
+    closed = []
+    manager = RoomManager()
+    manager.on_close = closed.append
+    room = manager.join('table1', 'a')
+    manager.join('table1', 'b')
+    assert manager.close('table1') == ['a', 'b']
+    assert manager.get('table1') is None
+    assert closed == [room]
+    assert manager.close('table1') == []
@@ -0,0 +1,97 @@
+import pytest
+import server
+from protocol import FrameDecoder
+
+
+class FakeConnection:
+    # Collects the frames the server sends to one client
+    def __init__(self):
+        self.decoder = FrameDecoder()
+        self.frames = []
+
+    def sendall(self, data):
+        self.frames += self.decoder.feed(data)
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def texts(self):
+        return [frame[5:].decode('utf-8') for frame in self.frames if frame.startswith(b'TEXT:')]
+
+    def token(self):
+        tokens = [frame[8:].decode('ascii') for frame in self.frames if frame.startswith(b'SESSION:')]
+        return tokens[-1]
+
+    def getpeername(self):
+        return ('test', 0)
+
+    def shutdown(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def game():
+    # alice and bob in a running game in the default room
+    connections = {name: FakeConnection() for name in ('alice', 'bob')}
+    for name, connection in connections.items():
+        assert server.register_username(connection, name)
+    room = server.client_rooms['alice']
+    server.start_game(room)
+    yield room, connections
+    for open_room in server.rooms.list():
+        server.close_room(open_room.name)
+    # What their readers would do on the hang-up
+    server.clients.clear()
+    server.sessions.clear()
+
+
+def test_dropped_player_takes_their_seat_back(game):
+    room, connections = game
+    hand = list(room.game.player_hands['alice'])
+    server.handle_disconnect('alice')
+    assert server.away['alice'] is room
+    assert 'alice' not in server.clients
+    assert any('lost connection' in text for text in connections['bob'].texts())
+
+    again = FakeConnection()
+    token = connections['alice'].token()
+    assert server.resume_session(again, f"RESUME {token} 0 0 alice") == 'alice'
+    assert server.clients['alice'] is again
+    assert server.client_rooms['alice'] is room
+    assert 'alice' not in server.away
+    assert list(room.game.player_hands['alice']) == hand
+    assert any(text.startswith('Welcome back, alice!') for text in again.texts())
+    assert 'alice is back.' in connections['bob'].texts()
+
+
+def test_wrong_token_is_refused(game):
+    room, connections = game
+    server.handle_disconnect('alice')
+    again = FakeConnection()
+    assert server.resume_session(again, "RESUME 0123 0 0 alice") is None
+    assert server.away['alice'] is room
+    assert 'Your session has expired; please log in again.' in again.texts()
+
+
+def test_held_seat_counts_as_taken(game):
+    room, connections = game
+    server.handle_disconnect('alice')
+    impostor = FakeConnection()
+    assert not server.register_username(impostor, 'alice')
+    assert 'Username has been taken, please choose another' in impostor.texts()
+
+
+def test_seat_is_released_after_the_grace_period(game):
+    room, connections = game
+    token = connections['alice'].token()
+    server.handle_disconnect('alice')
+    timer = server.away_timers['alice']
+    server.release_seat('alice', room, timer)  # What the timer does when it fires
+    assert 'alice' not in server.away
+    assert 'alice' not in server.sessions
+    assert 'alice' not in room.members
+    assert server.resume_session(FakeConnection(), f"RESUME {token} 0 0 alice") is None
@@ -0,0 +1,51 @@
+from spectators import Feed
+
+
+class Watcher:
+    def __init__(self):
+        self.received = b''
+
+    def sendall(self, data):
+        self.received += data
+
+
+def test_every_watcher_gets_each_event():
+    feed = Feed()
+    watchers = [Watcher() for _ in range(3)]
+    for watcher in watchers:
+        feed.subscribe(watcher)
+    feed.publish(b'one')
+    feed.publish(b'two')
+    assert [watcher.received for watcher in watchers] == [b'onetwo'] * 3
+    feed.unsubscribe(watchers[0])
+    feed.publish(b'three')
+    assert watchers[0].received == b'onetwo'
+    assert watchers[1].received == b'onetwothree'
+    assert len(feed) == 2
+
+
+def test_new_watcher_starts_at_the_last_keyframe():
+    feed = Feed()
+    feed.publish(b'old')
+    feed.publish(b'[state 1]', keyframe=True)
+    feed.publish(b'play')
+    feed.publish(b'[state 2]', keyframe=True)
+    feed.publish(b'draw')
+    late = Watcher()
+    feed.subscribe(late)
+    assert late.received == b'[state 2]draw'
+
+
+def test_delayed_events_wait_until_due():
+    feed = Feed()
+    watcher = Watcher()
+    feed.subscribe(watcher)
+    feed.publish(b'a', delay=10)
+    feed.publish(b'b', delay=10)
+    assert watcher.received == b''
+    due = feed.pending[-1][0]
+    feed.release_due(due - 5)
+    assert watcher.received == b''
+    feed.release_due(due)
+    assert watcher.received == b'ab'
+    assert not feed.pending
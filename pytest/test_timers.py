@@ -0,0 +1,65 @@
+import threading
+import time
+from timers import TimerHeap
+
+
+def collect(count):
+    # A list to append fired names to and an event set once `count` fired
+    fired = []
+    done = threading.Event()
+
+    def fire(name):
+        fired.append(name)
+        if len(fired) == count:
+            done.set()
+    return fired, done, fire
+
+
+def test_timers_fire_in_deadline_order():
+    fired, done, fire = collect(4)
+    heap = TimerHeap()
+    for delay, name in [(0.08, 'c'), (0.02, 'a'), (0.12, 'd'), (0.05, 'b')]:
+        heap.schedule(delay, lambda name=name: fire(name))
+    assert done.wait(5)
+    assert fired == ['a', 'b', 'c', 'd']
+
+
+def test_sooner_timer_wakes_the_sleeping_thread():
+    fired, done, fire = collect(1)
+    heap = TimerHeap()
+    heap.schedule(60, lambda: fire('late'))
+    time.sleep(0.05)  # The thread is now asleep until the 60s deadline
+    started = time.monotonic()
+    heap.schedule(0.01, lambda: fire('soon'))
+    assert done.wait(5)
+    assert fired == ['soon']
+    assert time.monotonic() - started < 1
+
+
+def test_cancelled_timer_never_fires():
+    fired, done, fire = collect(1)
+    heap = TimerHeap()
+    heap.schedule(0.02, lambda: fire('cancelled')).cancel()
+    heap.schedule(0.05, lambda: fire('kept'))
+    assert done.wait(5)
+    time.sleep(0.05)
+    assert fired == ['kept']
+    assert len(heap) == 0
+
+
+def test_failing_callback_does_not_stop_the_heap():
+    fired, done, fire = collect(1)
+    heap = TimerHeap()
+    heap.schedule(0.01, lambda: 1 / 0)
+    heap.schedule(0.03, lambda: fire('after'))
+    assert done.wait(5)
+
+
+def test_callbacks_go_through_dispatch():
+    dispatched = []
+    fired, done, fire = collect(1)
+    heap = TimerHeap(lambda callback: (dispatched.append(callback), callback()))
+    callback = lambda: fire('x')
+    heap.schedule(0.01, callback)
+    assert done.wait(5)
+    assert dispatched == [callback]
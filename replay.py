@@ -0,0 +1,140 @@
+# Game records and replay.
+#
+# A record holds the seed a game's deck was shuffled with, who was dealt in,
+# the game's move stream (Game.moves, two bytes a move) and a digest of the
+# state the game ended in. replay() runs the moves through a fresh card.Game
+# with no sockets, bots or printing, so a game from the server (--record-dir)
+# or the simulator can be played again bit for bit: as a bug report, as a
+# benchmark, or to check that a rule change still ends every recorded game
+# in exactly the same state.
+#
+#   python replay.py records/*.unor
+#   python replay.py records/main-20261018-101500.unor --repeat 1000
+
+import argparse
+import sys
+import time
+import zlib
+from card import CARDS
+from card import COLORS
+from card import MOVE_DRAW
+from card import MOVE_LEAVE
+from card import MOVE_PASS
+from card import MOVE_PENALTY
+from card import MOVE_PLAY
+from card import Deck
+from card import Game
+from card import encode_hand
+
+MAGIC = b'UNOR'
+VERSION = 2  # Version 1 records gave names a one-byte length; they still load
+
+
+def state_digest(game):
+    # CRC32 over everything that decides how the game goes on from here
+    parts = [bytes(game.deck.ids[:game.deck.size]), b'|', bytes(game.discard_pile.ids[:game.discard_pile.size]), b'|']
+    for name in game.players:
+        parts += [name.encode('utf-8'), b':', encode_hand(game.player_hands[name]), b'|']
+    wild = COLORS.index(game.wild_color) if game.wild_color is not None else 255
+    parts.append(bytes((game.current_index, game.direction & 0xff, wild, game.pending_draw)))
+    parts.append((game.winner or '').encode('utf-8'))
+    return zlib.crc32(b''.join(parts))
+
+
+def encode_record(game):
+    # The hands dict is filled in deal order when the game starts and keeps
+    # players who later left, so it lists everyone who was dealt in
+    names = list(game.player_hands)
+    parts = [MAGIC, bytes([VERSION]), game.seed.to_bytes(8, 'big'),
+             state_digest(game).to_bytes(4, 'big'), bytes([len(names)])]
+    for name in names:
+        encoded = name.encode('utf-8')
+        parts += [len(encoded).to_bytes(2, 'big'), encoded]
+    parts += [len(game.moves).to_bytes(4, 'big'), bytes(game.moves)]
+    return b''.join(parts)
+
+
+def decode_record(data):
+    # Returns (seed, player names, moves, digest)
+    if data[:4] != MAGIC or data[4] not in (1, VERSION):
+        raise ValueError("Not a game record")
+    length_size = 1 if data[4] == 1 else 2
+    seed = int.from_bytes(data[5:13], 'big')
+    digest = int.from_bytes(data[13:17], 'big')
+    pos = 18
+    names = []
+    for _ in range(data[17]):
+        length = int.from_bytes(data[pos:pos + length_size], 'big')
+        names.append(data[pos + length_size:pos + length_size + length].decode('utf-8'))
+        pos += length_size + length
+    size = int.from_bytes(data[pos:pos + 4], 'big')
+    moves = data[pos + 4:pos + 4 + size]
+    if len(moves) != size:
+        raise ValueError("Game record is truncated")
+    return seed, names, moves, digest
+
+
+def replay(seed, names, moves, game=None):
+    # Play a recorded game again and return the Game in its final state.
+    # Raises ValueError at the first move that isn't legal any more. Pass a
+    # Game to reuse its deck and discard storage.
+    if game is None:
+        game = Game(Deck(verbose=False))
+    game.players = []
+    for name in names:
+        game.add_player(name)
+    game.start_game(seed)
+    for number in range(0, len(moves), 2):
+        op, arg = moves[number], moves[number + 1]
+        player_name = game.get_current_player()
+        if op == MOVE_PLAY:
+            card = CARDS[arg & 63]
+            color = COLORS[arg >> 6] if card.color == 'Black' else None
+            if not game.play_card(player_name, card, color):
+                raise ValueError(f"Move {number // 2}: {player_name} can't play {card}")
+        elif op == MOVE_DRAW:
+            game.draw_card(player_name)
+        elif op == MOVE_PENALTY:
+            game.take_penalty(player_name)
+        elif op == MOVE_PASS:
+            game.advance_to_next_player()
+        elif op == MOVE_LEAVE:
+            game.remove_player(game.players[arg])
+        else:
+            raise ValueError(f"Move {number // 2}: unknown op {op}")
+    return game
+
+
+def save_record(path, game):
+    record = encode_record(game)  # Before opening, so a failure leaves no partial file
+    with open(path, 'wb') as record_file:
+        record_file.write(record)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded UNO games and check they end the same way")
+    parser.add_argument('records', nargs='+', help="game record files (.unor)")
+    parser.add_argument('--repeat', type=int, default=1, help="replay each game this many times and report the speed")
+    args = parser.parse_args()
+
+    mismatches = 0
+    game = Game(Deck(verbose=False))
+    for path in args.records:
+        with open(path, 'rb') as record_file:
+            seed, names, moves, digest = decode_record(record_file.read())
+        start = time.perf_counter()
+        try:
+            for _ in range(args.repeat):
+                replay(seed, names, moves, game)
+        except ValueError as e:
+            print(f"{path}: DIVERGED at {e}")
+            mismatches += 1
+            continue
+        elapsed = time.perf_counter() - start
+        same = state_digest(game) == digest
+        mismatches += not same
+        print(f"{path}: {len(moves) // 2} moves, seed {seed}, players {', '.join(names)}, "
+              f"winner {game.winner or 'none'}: {'OK' if same else 'MISMATCH'}")
+        if args.repeat > 1:
+            print(f"  {args.repeat} replays in {elapsed:.3f}s ({args.repeat * len(moves) / 2 / elapsed:,.0f} moves/sec)")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,105 @@
+import threading
+from card import Deck
+from card import Game
+from spectators import Feed
+
+DEFAULT_ROOM = 'main'
+
+
+class Room:
+    # One table: its own deck, game and list of seated usernames
+    def __init__(self, name):
+        self.name = name
+        self.deck = Deck()
+        self.game = Game(self.deck)
+        self.members = []  # Usernames in the order they joined
+        self.bots = {}  # Bot usernames seated here -> strategy name
+        self.started = False
+        self.turn_serial = 0  # Bumped on every turn announcement
+        self.turn_timer = None  # Deadline for the current player's move
+        self.feed = Feed()  # Public event stream for spectators
+        # Held while a command for this room is handled, so that in threaded
+        # mode two players can't mutate the same game at once. It is an RLock
+        # because a handler may end up calling back into the room.
+        self.lock = threading.RLock()
+
+    def __repr__(self):
+        state = "playing" if self.started else "waiting"
+        watching = f", {len(self.feed)} watching" if self.feed else ""
+        return f"Room {self.name} ({len(self.members)} players{watching}, {state})"
+
+
+class RoomManager:
+    def __init__(self):
+        self.rooms = {}  # Room name -> Room
+        self.lock = threading.Lock()  # Guards the rooms dictionary only
+        self.on_close = None  # Called with each Room that is dropped
+
+    def closed(self, room):
+        if self.on_close is not None:
+            self.on_close(room)
+
+    def create(self, name):
+        with self.lock:
+            if name in self.rooms:
+                raise ValueError(f"Room {name} already exists")
+            room = Room(name)
+            self.rooms[name] = room
+            return room
+
+    def restore(self, name, game, bots=None):
+        # Put back a game that was running before a restart. Everyone seated
+        # is a member again; they take their seats back as they reconnect.
+        with self.lock:
+            room = Room(name)
+            room.deck, room.game = game.deck, game
+            room.members = list(game.players)
+            room.bots = bots if bots is not None else {}
+            room.started = True
+            self.rooms[name] = room
+            return room
+
+    def get(self, name):
+        return self.rooms.get(name)
+
+    def list(self):
+        with self.lock:
+            return list(self.rooms.values())
+
+    def join(self, name, username):
+        # Seat a player in the named room, creating it on first use
+        with self.lock:
+            room = self.rooms.get(name)
+            if room is None:
+                room = Room(name)
+                self.rooms[name] = room
+            elif room.started:
+                raise ValueError(f"Room {name} has already started its game")
+            room.members.append(username)
+            room.game.add_player(username)
+            return room
+
+    def leave(self, room, username):
+        # Remove a player from their room; empty rooms are dropped so a long
+        # running server doesn't keep old decks and games around.
+        with self.lock:
+            if username in room.members:
+                room.members.remove(username)
+            room.bots.pop(username, None)
+            room.game.remove_player(username)
+            if not room.members and self.rooms.get(room.name) is room:
+                del self.rooms[room.name]
+                self.closed(room)
+
+    def close(self, name):
+        # Tear a room down regardless of who is still in it. Returns the
+        # members that were removed so the caller can tell them.
+        with self.lock:
+            room = self.rooms.pop(name, None)
+        if room is None:
+            return []
+        self.closed(room)
+        return list(room.members)
+
+    def __len__(self):
+        return len(self.rooms)
@@ -0,0 +1,254 @@
+# Front door for the multi-process server (server.py --workers N).
+#
+# The router owns the public port and nothing else. It reads each new
+# connection's handshake frames (CODECS, then a username, RESUME or WATCH)
+# just far enough to know which worker should have it, then passes the
+# socket itself to that worker over a Unix socket (SCM_RIGHTS), together
+# with the bytes it already read. From then on client and worker talk
+# directly; the router never touches game traffic.
+#
+# Workers are ordinary server processes. Every room lives on exactly one of
+# them, the one its name hashes to (shard_of), so everyone who wants a room
+# ends up at the same table. Routing:
+#   username      - to the worker of the room named by a "/join <room>"
+#                   frame sent before it, else of the default room. A name
+#                   that is in use goes to the worker using it, which turns
+#                   it down as usual.
+#   RESUME        - the worker named in the session token ("<worker>.<hex>")
+#   WATCH <room>  - the worker of that room
+# With matchmaking the default room is only a lobby, so each worker keeps
+# its own and forms tables from it; players without a room then go to the
+# worker their username hashes to.
+#
+# A player who /joins (or a spectator who watches) a room on another worker
+# is handed back: the worker sends the socket here with a handshake that
+# names the room, and it is routed again as if it had just connected.
+# Workers report the usernames they take and free, so a name is in use on
+# at most one worker. Console commands typed at the router go to every
+# worker.
+
+import logging
+import selectors
+import socket
+import subprocess
+import threading
+import time
+import zlib
+from protocol import FrameDecoder
+from protocol import RECV_SIZE
+from rooms import DEFAULT_ROOM
+
+# First byte of each control message. Router -> worker:
+CONNECTION = b'C'  # + bytes already read from the client; the socket rides along
+CONSOLE = b'!'  # + a console command such as "/s"
+# Worker -> router:
+HANDOFF = b'R'  # + a handshake to route the connection by; the socket rides along
+NAME_TAKEN = b'+'  # + a username now in use on that worker
+NAME_FREED = b'-'  # + a username it no longer uses
+
+MAX_HANDSHAKE_BYTES = 16384  # A client that sends more before being routed is dropped
+MAX_CONTROL_MESSAGE = 65536
+SWEEP_INTERVAL = 1  # Seconds between looks for handshakes that went quiet
+
+log = logging.getLogger('router')
+
+
+def shard_of(key, count):
+    return zlib.crc32(key.encode('utf-8')) % count
+
+
+class PendingClient:
+    # A connection whose handshake is still being read
+    __slots__ = ('decoder', 'received', 'room', 'seen', 'spoke')
+
+    def __init__(self):
+        self.decoder = FrameDecoder(MAX_HANDSHAKE_BYTES)
+        self.received = bytearray()  # Everything read so far, passed on to the worker
+        self.room = None  # From a "/join <room>" frame before the username
+        self.seen = time.monotonic()  # When it last sent anything
+        self.spoke = False  # Sent CODECS, so it is a real client
+
+
+class Router:
+    def __init__(self, controls, shared_lobby=False, login_timeout=30, idle_timeout=0):
+        self.controls = controls  # Worker index -> its end of the control socket
+        self.shared_lobby = shared_lobby  # Matchmaking: every worker has its own lobby
+        self.login_timeout = login_timeout
+        self.idle_timeout = idle_timeout
+        self.names = {}  # Username -> worker index using it
+        self.pending = {}  # Client socket -> PendingClient
+        self.selector = selectors.DefaultSelector()
+
+    def serve(self, listener):
+        listener.setblocking(False)
+        self.selector.register(listener, selectors.EVENT_READ, self.accept)
+        for index, control in self.controls.items():
+            self.selector.register(control, selectors.EVENT_READ, lambda sock, index=index: self.read_control(index))
+        next_sweep = time.monotonic() + SWEEP_INTERVAL
+        while True:
+            for key, _ in self.selector.select(SWEEP_INTERVAL):
+                key.data(key.fileobj)
+            if time.monotonic() >= next_sweep:
+                self.drop_stale()
+                next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    def accept(self, listener):
+        try:
+            client, address = listener.accept()
+        except OSError:
+            return
+        self.add_pending(client)
+
+    def add_pending(self, client, handshake=b''):
+        client.setblocking(False)
+        self.pending[client] = PendingClient()
+        self.selector.register(client, selectors.EVENT_READ, self.read_handshake)
+        if handshake:
+            self.received(client, handshake)
+
+    def drop(self, client):
+        self.selector.unregister(client)
+        del self.pending[client]
+        client.close()
+
+    def drop_stale(self):
+        # The same limits as the workers' idle check: login_timeout for a
+        # connection that never spoke the protocol, idle_timeout once it has
+        # sent CODECS (someone may be typing a name). A handshake is never
+        # waited on forever, even with idle_timeout 0.
+        now = time.monotonic()
+        for client, pending in list(self.pending.items()):
+            limit = self.idle_timeout if pending.spoke and self.idle_timeout > 0 else self.login_timeout
+            if now - pending.seen >= limit:
+                log.info(f"Dropping a connection that didn't finish its handshake in {limit:g}s")
+                self.drop(client)
+
+    def read_handshake(self, client):
+        try:
+            data = client.recv(RECV_SIZE)
+        except OSError:
+            data = b''
+        if not data:
+            self.drop(client)
+            return
+        self.received(client, data)
+
+    def received(self, client, data):
+        pending = self.pending[client]
+        pending.seen = time.monotonic()
+        pending.received += data
+        try:
+            frames = pending.decoder.feed(data)
+        except ValueError:
+            frames = None
+        if frames is None or len(pending.received) > MAX_HANDSHAKE_BYTES:
+            self.drop(client)
+            return
+        worker = self.route(pending, frames)
+        if worker is None:
+            return
+        try:
+            socket.send_fds(self.controls[worker], [CONNECTION + bytes(pending.received)], [client.fileno()])
+        except OSError as e:
+            log.warning(f"Could not hand a connection to worker {worker}: {e}")
+        self.drop(client)  # The worker has its own copy of the socket now
+
+    def route(self, pending, frames):
+        # Look at the handshake frames read so far. Returns the worker index,
+        # or None if no frame has decided it yet.
+        count = len(self.controls)
+        for frame in frames:
+            message = frame.decode('utf-8', 'replace').strip()
+            if message.startswith('CODECS'):
+                pending.spoke = True
+                continue
+            if message.startswith('/join '):
+                pending.room = message[6:].strip()
+                continue
+            if message.startswith('RESUME '):
+                parts = message.split()
+                worker, _, _ = (parts[1] if len(parts) > 1 else '').partition('.')
+                if worker.isdigit() and int(worker) < count:
+                    return int(worker)
+                return 0  # Malformed; any worker will say so
+            if message.startswith('WATCH '):
+                return shard_of(message[6:].strip(), count)
+            # A username
+            worker = self.names.get(message)
+            if worker is None:
+                if self.shared_lobby and pending.room in (None, DEFAULT_ROOM):
+                    worker = shard_of(message, count)
+                else:
+                    worker = shard_of(pending.room or DEFAULT_ROOM, count)
+                if message:
+                    self.names[message] = worker  # Taken from now on, until the worker frees it
+            return worker
+        return None
+
+    def read_control(self, index):
+        control = self.controls[index]
+        message, fds, _, _ = socket.recv_fds(control, MAX_CONTROL_MESSAGE, 1)
+        if not message:
+            log.error(f"Worker {index} exited")
+            self.selector.unregister(control)
+            for fd in fds:
+                socket.close(fd)
+            return
+        kind, body = message[:1], message[1:]
+        if kind == HANDOFF and fds:
+            self.add_pending(socket.socket(fileno=fds[0]), body)
+            return
+        for fd in fds:
+            socket.close(fd)
+        name = body.decode('utf-8')
+        if kind == NAME_TAKEN:
+            self.names[name] = index
+        elif kind == NAME_FREED and self.names.get(name) == index:
+            del self.names[name]
+
+    def console(self, command):
+        for control in self.controls.values():
+            control.send(CONSOLE + command.encode('utf-8'))
+
+
+def start_workers(count, worker_command):
+    # One server process per worker, each handed its end of a SOCK_SEQPACKET
+    # pair (message boundaries are kept, fds can ride along). The router
+    # keeps the console, so workers get no stdin.
+    controls = {}
+    processes = []
+    for index in range(count):
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        command = [*worker_command, '--control-fd', str(theirs.fileno()), '--worker-index', str(index),
+                   '--worker-count', str(count)]
+        processes.append(subprocess.Popen(command, pass_fds=[theirs.fileno()], stdin=subprocess.DEVNULL))
+        theirs.close()
+        controls[index] = ours
+    return controls, processes
+
+
+def run_router(host, port, count, worker_command, shared_lobby=False, login_timeout=30, idle_timeout=0):
+    controls, processes = start_workers(count, worker_command)
+    router = Router(controls, shared_lobby, login_timeout, idle_timeout)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    print(f"Router listening on {host}:{port}, {count} workers")
+    serve_thread = threading.Thread(target=router.serve, args=(listener,), daemon=True)
+    serve_thread.start()
+    try:
+        while True:
+            try:
+                command = input("Enter '/s' to begin: ").strip()
+            except EOFError:
+                serve_thread.join()  # No console; just keep routing
+                break
+            if command:
+                router.console(command)
+    except KeyboardInterrupt:
+        print("Shutting down the router.")
+    finally:
+        listener.close()
+        for process in processes:
+            process.terminate()
@@ -1,30 +1,213 @@
+import asyncio
+import argparse
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import os
+import random
+import secrets
 import socket
+import sys
 import threading
+import time
 import pickle
-from card import Deck
-from card import Game
-from card import Card
+import urllib.parse
+from concurrent.futures.process import BrokenProcessPool
+import bots
+import commands
+import discovery
+import matchmaking
+import metrics
+import persistence
+import replay
+import router
+import timers
+from card import card_from_id
+from card import card_to_id
+from card import encode_hand
+from card import hand_checksum
+from outbound import OutboundQueue
+from outbound import StreamConnection
+from outbound import coalesce
+from protocol import FrameDecoder
+from protocol import RECV_SIZE
+from protocol import encode_frame
+from rooms import DEFAULT_ROOM
+from rooms import RoomManager
 
 # Dictionary to hold client info
 clients = {}
 
-# Initialize deck
-deck = Deck()
-game = Game(deck)
+# Every table lives in its own room; client_rooms maps username -> Room
+rooms = RoomManager()
+client_rooms = {}
 
+# With --data-dir every running game is journaled there (see persistence.py).
+# After a restart, players of recovered games are listed in `away` until they
+# reconnect under the same username and take their seat back.
+store = None
+away = {}  # Username -> Room holding their seat
 
+# Every accepted player gets a session token in a SESSION:<token> frame. If
+# their connection drops mid-game the seat, hand and turn position are held
+# for SESSION_GRACE seconds, and a client that reconnects with
+# "RESUME <token> <hand seq> <hand checksum> <username>" before its username
+# takes the seat back. Seats restored after a restart have no token (the old
+# ones died with the process), so those are resumed by username alone.
+SESSION_GRACE = 60
+sessions = {}  # Username -> session token
+away_timers = {}  # Username -> Timer that gives up their held seat
+
+# Every timeout runs off one TimerHeap (see timers.py), its callbacks going
+# through call_on_server like any other game event.
+#   TURN_TIMEOUT  - a player who hasn't moved by then draws (or takes the
+#                   penalty) and passes; 0 turns it off
+#   IDLE_TIMEOUT  - a logged-in player who sends nothing for this long is
+#                   disconnected; 0 turns it off. Spectators are never reaped,
+#                   nor are players waiting for their room's game to start.
+#   LOGIN_TIMEOUT - a connection that hasn't sent CODECS, logged in or
+#                   started watching by then is dropped
+TURN_TIMEOUT = 60
+IDLE_TIMEOUT = 900
+LOGIN_TIMEOUT = 30
+timer_heap = None  # Created below, once call_on_server exists
+last_seen = {}  # Connection -> (time of its last frames, username or None)
+
+# A connection that sends "WATCH <room>" instead of a username becomes a
+# spectator of that room: it gets the room's public event stream (see
+# spectators.py) and everything else it sends is ignored, except another
+# WATCH to switch rooms. With --watch-delay the stream runs that many
+# seconds behind the table.
+SPECTATOR_DELAY = 0
+SPECTATOR_TICK = 0.1  # How often delayed events are checked
+watching = {}  # Spectator connection -> Room it is watching
+
+# Every game is dealt from its own seed, drawn from game_seeds; start the
+# server with --seed to get the same sequence of deals every run. With
+# --record-dir each finished game is saved there as a replay.py record.
+game_seeds = random.Random()
+record_dir = None
+
+# With --match-size the server runs a matchmaking queue instead of waiting
+# for the host's /s: everyone logging in waits in the default room (the
+# lobby) while the Matchmaker groups them into tables of MATCH_SIZE, each
+# started in a fresh room as soon as it is full. Whoever has waited
+# MATCH_WAIT seconds gets a table anyway, with bots in the empty seats.
+# With --match-rating-band players are grouped by rating bands that wide;
+# ratings are Elo, kept in memory and updated after every game. When a
+# matched game ends its players go back to the lobby and into the queue.
+MATCH_SIZE = 0  # 0 leaves games to /s
+MATCH_WAIT = 30
+MATCH_RATING_BAND = 0
+matchmaker = None
+ratings = {}  # Username -> rating
+matched_rooms = set()  # Rooms the matchmaker started
+match_numbers = itertools.count(1)
+
+# With --workers N this process only runs the router (see router.py) and
+# starts N worker processes, each a full server for its own shard of rooms.
+# A worker gets its connections from the router over control_socket instead
+# of listening itself; WORKER_INDEX and WORKER_COUNT are set only in workers.
+# A player who asks for a room another worker owns is handed back to the
+# router, which passes them on there.
+WORKER_INDEX = None
+WORKER_COUNT = None
+control_socket = None
+handoffs = {}  # Connection leaving for another worker -> handshake to route it by
+joining = {}  # Connection not logged in yet -> room named by "/join <room>"
+
+# Client commands are short; refuse frames that could only be abuse
+MAX_COMMAND_SIZE = 4096
+
+log = logging.getLogger('server')
+
+active_connections = metrics.gauge('uno_active_connections', "Connected clients, bots excluded")
+metrics.gauge('uno_active_rooms', "Rooms currently open", read=lambda: len(rooms))
+bytes_in = metrics.counter('uno_bytes_in_total', "Bytes received from clients")
+commands_in = metrics.counter('uno_commands_total', "Frames received from clients")
+metrics.gauge('uno_spectators', "Connections watching a room", read=lambda: len(watching))
+metrics.gauge('uno_pending_timers', "Timers waiting in the timer heap", read=lambda: len(timer_heap))
+turn_timeouts = metrics.counter('uno_turn_timeouts_total', "Turns played automatically after the deadline")
+metrics.gauge('uno_match_queue', "Players waiting for a table", read=lambda: len(matchmaker or ()))
+tables_formed = metrics.counter('uno_tables_formed_total', "Tables started by the matchmaker")
+idle_reaped = metrics.counter('uno_idle_disconnects_total', "Connections dropped for being idle")
+
+# In asyncio mode this is the running loop; everything that touches game
+# state from another thread goes through call_on_server.
+server_loop = None
+
+# Bots think in worker processes; each move gets this many seconds
+bot_pool = None
+bot_workers = os.cpu_count() or 1
+BOT_MOVE_BUDGET = 0.5
+
+# Hand encodings this server can send, best first. A client lists the ones it
+# understands in a "CODECS ..." frame before its username; clients that never
+# send one get pickle, which is what older clients expect.
+#   delta  - HSYNC once, then one HADD/HREM per card change (see send_hand_change)
+#   hand   - the whole hand as one byte per card on every change
+#   pickle - the whole hand as a pickled list of Card objects
+HAND_CODECS = ['delta', 'hand', 'pickle']
+client_codecs = {}  # client socket -> negotiated hand codec
+hand_seqs = {}  # client socket -> sequence number of the last hand update sent
+
+# Delta clients get an HSUM checksum after this many HADD/HREM updates
+HAND_CHECKSUM_INTERVAL = 8
+
+
+def next_hand_seq(client_socket):
+    seq = hand_seqs.get(client_socket, 0) + 1
+    hand_seqs[client_socket] = seq
+    return seq.to_bytes(4, 'big')
+
+@metrics.timed('uno_send_hand_seconds')
 def send_hand(client_socket, hand):
-    pickled_hand = pickle.dumps(hand)
-    hand_message = b'PICKLE:' + pickled_hand
-    # Prefix each message with a 4-byte length header
-    prefixed_message = len(hand_message).to_bytes(4, byteorder='big') + hand_message
-    client_socket.send(prefixed_message)
+    if isinstance(client_socket, BotConnection):
+        return  # Bots read their hand straight from the game
+    codec = client_codecs.get(client_socket)
+    if codec == 'delta':
+        # Full resync: HSYNC:<seq><card ids>
+        hand_message = b'HSYNC:' + next_hand_seq(client_socket) + encode_hand(hand)
+    elif codec == 'hand':
+        # One byte per card, see card.encode_hand
+        hand_message = b'HAND:' + encode_hand(hand)
+    else:
+        pickled_hand = pickle.dumps(list(hand))
+        hand_message = b'PICKLE:' + pickled_hand
+    client_socket.sendall(encode_frame(hand_message))
+
+@metrics.timed('uno_send_hand_change_seconds')
+def send_hand_change(client_socket, hand, op, card):
+    # Tell a player one card left or joined their hand. Delta clients get a
+    # constant-size HADD/HREM frame (plus an occasional HSUM checksum so they
+    # can spot drift); everyone else gets the whole hand as before.
+    if client_codecs.get(client_socket) != 'delta':
+        send_hand(client_socket, hand)
+        return
+    tag = b'HADD:' if op == 'add' else b'HREM:'
+    seq_bytes = next_hand_seq(client_socket)
+    message = encode_frame(tag + seq_bytes + bytes([card_to_id(card)]))
+    if hand_seqs[client_socket] % HAND_CHECKSUM_INTERVAL == 0:
+        message += encode_frame(b'HSUM:' + seq_bytes + hand_checksum(hand).to_bytes(4, 'big'))
+    client_socket.sendall(message)
+
+def negotiate_codec(client_socket, message):
+    # "CODECS hand pickle" -> pick the first one we also support
+    offered = message.split()[1:]
+    codec = next((name for name in offered if name in HAND_CODECS), 'pickle')
+    client_codecs[client_socket] = codec
+    client_socket.sendall(encode_frame(b'CODEC:' + codec.encode('utf-8')))
 
 def send_turn_notification(client_socket, player_name):
-    turn_message = f"It's {player_name}'s turn."
-    encoded_message = b'TEXT:' + turn_message.encode('utf-8')
-    prefixed_message = len(encoded_message).to_bytes(4, byteorder='big') + encoded_message
-    client_socket.send(prefixed_message)
+    # Structured turn signal: TURN:<username whose turn it is>. Clients act
+    # on this rather than on the wording of the text messages.
+    client_socket.sendall(encode_frame(b'TURN:' + player_name.encode('utf-8')))
+
+def prompt_again(room, player_name):
+    # After a rejected move the turn stays with the player; say so explicitly
+    if room.game.get_current_player() == player_name:
+        send_turn_notification(clients[player_name], player_name)
 
 # Function to broadcast messages to one client
 # Function to send a message to the client with message type prefixed
@@ -40,94 +223,248 @@ def send_to_client(client_socket, message, message_type):
         raise ValueError(f"Unknown message type: {message_type}")
 
     # Prepend header and length of message
-    full_message = header + message
-    message_with_length = len(full_message).to_bytes(4, 'big') + full_message
+    message_with_length = encode_frame(header + message)
 
     try:
         client_socket.sendall(message_with_length)
-        print(f"Sent to {client_socket.getpeername()}: {message.decode('utf-8')}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f"Sent to {client_socket.getpeername()}: {message.decode('utf-8')}")
     except Exception as e:
-        print(f"Error sending message: {e}")
+        log.warning(f"Error sending message: {e}")
 
-# Function to handle '/s' command from clients
-def start_game():
-    global clients, deck, game
-    if len(clients) < 2:
-        broadcast("At least two players are needed to start the game.",'text')
+# Function to handle '/s' command from the console
+def start_game(room):
+    deck, game = room.deck, room.game
+    if len(room.members) < 2:
+        broadcast(room, "At least two players are needed to start the game.",'text')
         return  # Exit the function if not enough players
-    print(f"Number of cards in the deck before shuffling and dealing: {len(deck.cards)}")  # Debug print
+    log.debug(f"Number of cards in the deck before shuffling and dealing: {len(deck)}")
 
-    deck.shuffle()
-    game.players = list(clients.keys())  # Set player order to the order of connections    
-    print("Shuffling deck and starting the game with players: " + ", ".join(clients.keys()))
+    game.players = list(room.members)  # Set player order to the order of connections
+    if matchmaker is not None:
+        for username in room.members:
+            matchmaker.leave(username)  # Started from the lobby by the host
+    room.started = True
+    if store is not None:
+        store.open(room.name, game, room.bots)
+    log.info(f"Shuffling deck and starting the game in room {room.name} with players: " + ", ".join(room.members))
 
     # Dealing cards
-    player_hands = game.start_game()
+    player_hands = game.start_game(game_seeds.getrandbits(64))
+    publish(room, f"A new game has started with {', '.join(game.players)}.")
     for username, hand in player_hands.items():
-        client_socket = clients[username]
+        client_socket = clients.get(username)
+        if client_socket is None:
+            continue  # Away; they get their hand when they come back
         send_hand(client_socket, hand)  # Use the send_hand method to send the pickled hand 
 
-        print(f"Dealt hand to {username}.")
-    print(f"Number of cards remaining in the deck after dealing: {len(deck.cards)}")  # Debug print
+        log.debug(f"Dealt hand to {username}.")
+    log.debug(f"Number of cards remaining in the deck after dealing: {len(deck)}")
 
-    announce_turn()
-    
-    # This is where we're adding the print statement for debugging
-    print(f"Number of cards remaining in the deck after dealing: {len(deck.cards)}")
-    print(f"ID of global deck object: {id(deck)}")  # Debug print
-    print(f"ID of game's deck object: {id(game.deck)}")  # Debug print
+    announce_turn(room)
 
-    if id(deck) != id(game.deck):
-        print("Different deck instances are being used!")  # Debug notice
-        return  # Exit the function
-def announce_turn():
-    current_player = game.get_current_player()
+def announce_turn(room):
+    current_player = room.game.get_current_player()
+    room.turn_serial += 1
 
-    # Send text messages to each client announcing the current player's turn
-    for client_name, client_socket in clients.items():
+    # Send text messages to each client announcing the current player's turn,
+    # followed by the same TURN frame for everyone
+    turn_frame = encode_frame(b'TURN:' + current_player.encode('utf-8'))
+    for client_name in room.members:
+        client_socket = clients.get(client_name)
+        if client_socket is None:
+            continue  # Seat kept for a player who hasn't reconnected yet
         if client_name == current_player:
             send_to_client(client_socket, f"It's your turn to play.", 'text')
+            if room.game.pending_draw:
+                send_to_client(client_socket, f"Stack a {room.game.top_card.value} or type 'pass' to draw {room.game.pending_draw} cards.", 'text')
         else:
             send_to_client(client_socket, f"It's {current_player}'s turn.", 'text')
+        client_socket.sendall(turn_frame)
+    publish_state(room, turn_frame)
+
+    if room.turn_timer is not None:
+        room.turn_timer.cancel()
+        room.turn_timer = None
+    if current_player in room.bots:
+        schedule_bot_move(room, current_player)
+    elif TURN_TIMEOUT > 0:
+        serial = room.turn_serial
+        room.turn_timer = timer_heap.schedule(TURN_TIMEOUT, lambda: expire_turn(room, serial))
+
+def expire_turn(room, serial):
+    # The current player let TURN_TIMEOUT go by. Draw for them (or take the
+    # pending penalty) and pass; on the first turn, where passing isn't
+    # allowed, play a card for them instead. Works for held seats too.
+    with room.lock:
+        if room.turn_serial != serial or not room.started or len(room.game.players) < 2:
+            return  # They moved in time
+        game = room.game
+        player_name = game.get_current_player()
+        turn_timeouts.inc()
+        log.info(f"Turn timed out for {player_name} in room {room.name}")
+        if player_name in clients:
+            send_to_client(clients[player_name], "Time's up! Playing your turn for you.", 'text')
+        broadcast(room, f"{player_name} ran out of time.", 'text', player_name)
+        if game.top_card is None:
+            moves = game.legal_moves(player_name)
+            colored = [card for card in moves if card.color != 'Black']
+            handle_play_card(room, player_name, (colored or moves)[0])
+        else:
+            # Their time is up even if the card drawn could be played
+            handle_draw_card(room, player_name, reprompt=False)
+
+def call_on_server(fn):
+    # Run fn on the thread that owns game state: the event loop in asyncio
+    # mode, or right here (callers take the room lock) in threaded mode.
+    # Whatever fn sends goes out as one write per client.
+    def run():
+        with coalesce():
+            fn()
+    if server_loop is not None:
+        server_loop.call_soon_threadsafe(run)
+    else:
+        run()
 
-def handle_play_card(player_name, card):
+timer_heap = timers.TimerHeap(call_on_server)
+
+def get_bot_pool():
+    global bot_pool
+    if bot_pool is None:
+        # 'spawn' so the workers don't inherit the server's threads and sockets
+        context = multiprocessing.get_context('spawn')
+        bot_pool = concurrent.futures.ProcessPoolExecutor(bot_workers, mp_context=context)
+    return bot_pool
+
+def drop_bot_pool(pool):
+    # A worker process died (out of memory, killed) and the pool is broken
+    # for good; the next bot move starts a fresh one
+    global bot_pool
+    if bot_pool is pool:
+        bot_pool = None
+        log.warning("A bot worker died; starting a new pool")
+        pool.shutdown(wait=False)
+
+def schedule_bot_move(room, bot_name):
+    # Ask a worker for the bot's move and return immediately; the answer is
+    # applied by apply_bot_move once it arrives.
+    view = bots.GameView.from_game(room.game, bot_name)
+    serial = room.turn_serial
+    pool = get_bot_pool()
+    try:
+        future = pool.submit(bots.choose_move, room.bots[bot_name], view, BOT_MOVE_BUDGET)
+    except BrokenProcessPool as e:
+        # This move falls back to the heuristic like any failed search
+        drop_bot_pool(pool)
+        future = concurrent.futures.Future()
+        future.set_exception(e)
+    future.add_done_callback(lambda future: call_on_server(lambda: apply_bot_move(room, bot_name, serial, future, pool)))
+
+def apply_bot_move(room, bot_name, serial, future, pool):
+    with room.lock:
+        # Ignore answers for a turn that is already over (or a closed room)
+        if room.turn_serial != serial or not room.started or bot_name not in room.bots:
+            return
+        game = room.game
+        try:
+            card_id = future.result()
+        except Exception as e:
+            # A crashed search shouldn't stall the table: fall back to the heuristic
+            log.warning(f"Bot {bot_name} failed to choose a move: {e}")
+            if isinstance(e, BrokenProcessPool):
+                drop_bot_pool(pool)
+            view = bots.GameView.from_game(game, bot_name)
+            card = bots.HeuristicStrategy().choose(view, 0)
+            card_id = None if card is None else card.id
+
+        if card_id is not None:
+            handle_play_card(room, bot_name, card_from_id(card_id))
+        else:
+            handle_draw_card(room, bot_name)
+        # After a draw that made a move possible it is still the bot's turn
+        # but nothing was announced, so think again
+        if room.turn_serial == serial and game.get_current_player() == bot_name:
+            schedule_bot_move(room, bot_name)
+
+@metrics.timed('uno_handle_play_card_seconds')
+def handle_play_card(room, player_name, card, color=None):
+    game = room.game
+    client_socket = clients.get(player_name, AWAY)
     if game.get_current_player() != player_name:
         # It's not the player's turn
-        send_to_client(clients[player_name], "It's not your turn.", 'text')
-    elif game.top_card is None:
-        # If it's the first turn of the game, any card can be played if it's in the player's hand
-        if card in game.player_hands[player_name]:
-            game.play_card(player_name, card)  # Play the card
-            broadcast(f"Player {player_name} played: {card}", 'text')
-
-            # Send the updated hand back to the player after playing
-            send_hand(clients[player_name], game.player_hands[player_name])
-
-            game.advance_to_next_player()
-            announce_turn()
+        send_to_client(client_socket, "It's not your turn.", 'text')
+    elif card not in game.player_hands[player_name]:
+        # The card is not in the player's hand, don't advance the turn
+        send_to_client(client_socket, "You don't have that card. Try again.", 'text')
+        prompt_again(room, player_name)
+    elif not game.play_card(player_name, card, color):
+        # The card isn't valid to be played according to the game rules
+        if game.pending_draw:
+            send_to_client(client_socket, f"You can only stack a {game.top_card.value} or type 'pass' to draw {game.pending_draw} cards. Try again.", 'text')
         else:
-            # The card is not in the player's hand, don't advance the turn
-            send_to_client(clients[player_name], "You don't have that card. Try again.", 'text')
-    elif game.can_play_card(player_name, card):
-        # If the played card is valid and it's in the player's hand
-        if card in game.player_hands[player_name]:
-            game.play_card(player_name, card)  # Play the card
-            broadcast(f"Player {player_name} played: {card}", 'text')
-
-            # Send the updated hand back to the player after playing
-            send_hand(clients[player_name], game.player_hands[player_name])
-
-            game.advance_to_next_player()
-            announce_turn()
-        else:
-            # It's a valid play in terms of game rules, but the card isn't in the player's hand
-            send_to_client(clients[player_name], "Invalid card played. Try again.", 'text')
+            send_to_client(client_socket, "Invalid card played. Try again.", 'text')
+        prompt_again(room, player_name)
     else:
-        # It's not the first play, and the card isn't valid to be played according to the game rules
-        send_to_client(clients[player_name], "Invalid card played. Try again.", 'text')
+        broadcast(room, f"Player {player_name} played: {card}", 'text')
+        if game.wild_color is not None:
+            broadcast(room, f"The color is now {game.wild_color}.", 'text')
+            publish(room, f"{player_name} played: {card}. The color is now {game.wild_color}.")
+        else:
+            publish(room, f"{player_name} played: {card}")
+
+        # Send the updated hand back to the player after playing
+        send_hand_change(client_socket, game.player_hands[player_name], 'remove', card)
 
-# Function to broadcast messages to all connected clients
-def broadcast(message, message_type='text', exclude_user=None):
+        if game.winner is not None:
+            finish_game(room)
+        else:
+            announce_turn(room)
+
+def save_game_record(room):
+    game = room.game
+    # Room names are whatever players typed, so quote them into a safe file name
+    name = urllib.parse.quote(room.name, safe='')
+    path = os.path.join(record_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{game.seed:016x}.unor")
+    try:
+        replay.save_record(path, game)
+    except OSError as e:
+        log.warning(f"Could not save the record of room {room.name}: {e}")
+
+def finish_game(room):
+    # Someone went out: score the game and let the room start a new one
+    game = room.game
+    end_game(room)
+    broadcast(room, f"{game.winner} wins the game with {game.score()} points!", 'text')
+    publish(room, f"{game.winner} wins the game with {game.score()} points!")
+    log.info(f"Game in room {room.name} won by {game.winner}")
+    if record_dir is not None and game.seed is not None:
+        save_game_record(room)
+    if matchmaker is not None:
+        humans = [name for name in game.players if name not in room.bots]
+        if game.winner in humans:
+            matchmaking.update_ratings(ratings, game.winner, [name for name in humans if name != game.winner])
+        if room in matched_rooms:
+            return_to_lobby(room)  # Straight back into the queue; there is no host
+            return
+    broadcast(room, "The host can start a new game with /s.", 'text')
+
+def end_game(room):
+    # Stop the room's game, however it ended: its turn timer, any bot move
+    # still being thought about and every later timeout find it over, and
+    # its journal is dropped
+    if room.turn_timer is not None:
+        room.turn_timer.cancel()
+        room.turn_timer = None
+    room.started = False
+    room.turn_serial += 1
+    journal = room.game.journal
+    if journal is not None:
+        room.game.journal = None
+        store.discard(room.name, journal)
+
+# Function to broadcast messages to everyone in a room
+@metrics.timed('uno_broadcast_seconds')
+def broadcast(room, message, message_type='text', exclude_user=None):
     global clients
 
     # Prepare the message based on type
@@ -135,136 +472,690 @@ def broadcast(message, message_type='text', exclude_user=None):
         message = 'TEXT:' + message
         message = message.encode('utf-8')  # Encode the text message as bytes
     elif message_type == 'pickle':
-        message = 'PICKLE:' + message  # Pickle message should already be in bytes
+        message = b'PICKLE:' + message  # Pickle message should already be in bytes
 
-    # Include message size prefix
-    message_size = len(message).to_bytes(4, 'big')
-    full_message = message_size + message
+    # Include message size prefix; the frame is built once for every recipient
+    full_message = encode_frame(message)
+
+    # Queue the same bytes for each client. Sending never blocks here: a
+    # client that can't keep up is evicted by its own connection, and its
+    # reader then runs the normal disconnect path.
+    for username in room.members:
+        if username != exclude_user and username in clients:
+            clients[username].sendall(full_message)
+
+def publish(room, text, extra=b'', keyframe=False):
+    # Put a public event on the room's spectator stream. It is encoded here
+    # once, whether one spectator or hundreds receive it.
+    frames = encode_frame(b'TEXT:' + text.encode('utf-8')) + extra
+    room.feed.publish(frames, keyframe, SPECTATOR_DELAY)
+
+def publish_state(room, turn_frame):
+    # Keyframe for spectators at every turn: the whole public state, so a
+    # new watcher can start from here
+    game = room.game
+    counts = ', '.join(f"{name} {len(game.player_hands[name])}" for name in game.players)
+    lines = []
+    if game.top_card is not None:
+        top = f"Top card: {game.top_card}"
+        if game.wild_color is not None:
+            top += f" ({game.wild_color})"
+        lines.append(top)
+    lines.append(f"Cards in hand: {counts}")
+    if game.pending_draw:
+        lines.append(f"{game.pending_draw} cards to draw unless a {game.top_card.value} is stacked")
+    lines.append(f"It's {game.get_current_player()}'s turn.")
+    publish(room, '\n'.join(lines), turn_frame, keyframe=True)
 
-    # Send the full_message to each client
-    to_remove = []  # Keep track of clients to remove after iteration
-    for username, client_socket in clients.items():
-        if username == exclude_user:
-            continue
-        try:
-            client_socket.sendall(full_message)  # Send the encoded message with the header
-        except Exception as e:
-            print(f"Error broadcasting message to {username}: {e}",'text')
-            to_remove.append(username)
 
-    # Remove clients that could not receive the message
-    for username in to_remove:
+def join_room(username, room_name):
+    # Move a player into a room, leaving their current one first
+    client_socket = clients[username]
+    current = client_rooms.get(username)
+    if current is not None and current.name == room_name:
+        send_to_client(client_socket, f"You are already in room {room_name}.", 'text')
+        return False
+    if current is not None and current.started:
+        send_to_client(client_socket, "You can't leave a room while its game is running.", 'text')
+        return False
+    if not owns(room_name):
+        move_player(username, room_name)
+        return True
+    try:
+        room = rooms.join(room_name, username)
+    except ValueError as e:
+        send_to_client(client_socket, f"{e}.", 'text')
+        return False
+
+    if current is not None:
+        leave_room(username, current)
+    client_rooms[username] = room
+    if not is_lobby(room):
+        broadcast(room, f"{username} has joined the game.", 'text')
+    return True
+
+def owns(room_name):
+    # Whether this process hosts the room. Each worker of a sharded server
+    # owns the rooms whose names hash to it; with matchmaking, every worker
+    # has its own lobby.
+    if WORKER_COUNT is None or (matchmaker is not None and room_name == DEFAULT_ROOM):
+        return True
+    return router.shard_of(room_name, WORKER_COUNT) == WORKER_INDEX
+
+def move_player(username, room_name):
+    # The room lives on another worker. The player leaves everything here and
+    # their connection goes back to the router, with a handshake that logs
+    # them in again over there straight into that room.
+    client_socket = clients.pop(username)
+    sessions.pop(username, None)
+    current = client_rooms.pop(username, None)
+    if current is not None:
+        with current.lock:
+            leave_room(username, current)
+    release_name(username)
+    handoffs[client_socket] = (handshake_of(client_socket) + encode_frame(f"/join {room_name}".encode('utf-8'))
+                               + encode_frame(username.encode('utf-8')))
+
+def handshake_of(client_socket):
+    # The frames that set a connection up the same way on another worker
+    codec = client_codecs.get(client_socket)
+    return encode_frame(f"CODECS {codec}".encode('utf-8')) if codec else b''
+
+def hand_off(sock, handshake):
+    # Pass a connection back to the router, to be routed by `handshake` as if
+    # the client had just sent it
+    if len(handshake) > router.MAX_HANDSHAKE_BYTES:
+        log.info("Not handing off a connection with too much unread input")
+        return
+    try:
+        socket.send_fds(control_socket, [router.HANDOFF + handshake], [sock.fileno()])
+    except OSError as e:
+        log.warning(f"Could not hand a connection back to the router: {e}")
+
+def report_name(kind, username):
+    # The router keeps each username on one worker by these reports
+    if control_socket is not None:
+        control_socket.send(kind + username.encode('utf-8'))
+
+def release_name(username):
+    # Free a username for every worker once nothing here holds it
+    if username not in clients and username not in sessions and username not in away:
+        report_name(router.NAME_FREED, username)
+
+def leave_room(username, room):
+    had_turn = room.started and username in room.game.players and room.game.get_current_player() == username
+    rooms.leave(room, username)
+    if is_lobby(room):
+        matchmaker.leave(username)
+    else:
+        broadcast(room, f"{username} has left the game.", 'text')
+    # Don't leave bots playing each other in a room nobody is watching
+    if room.members and all(member in room.bots for member in room.members):
+        close_room(room.name)
+    elif room.started and room.members and len(room.game.players) < 2:
+        end_abandoned_game(room)
+    elif had_turn and room.members and len(room.game.players) > 1:
+        announce_turn(room)  # The turn passed on with them
+
+def end_abandoned_game(room):
+    # Everyone else left mid-game. Nobody can win a game of one, so it just
+    # ends and the room waits for players again.
+    end_game(room)
+    log.info(f"Game in room {room.name} ended: not enough players left")
+    broadcast(room, "Everyone else has left, so the game is over.", 'text')
+    publish(room, "The game is over: everyone else left.")
+    if matchmaker is not None and room in matched_rooms:
+        return_to_lobby(room)
+    else:
+        broadcast(room, "The host can start a new game with /s.", 'text')
+
+def add_bot(room_name, strategy_name):
+    room = rooms.get(room_name)
+    if room is None:
+        print(f"No room named {room_name}.")
+        return
+    if room.started:
+        print(f"Room {room_name} is already playing.")
+        return
+    bot_name = seat_bot(room, strategy_name)
+    print(f"Added {strategy_name} bot {bot_name} to room {room_name}.")
+
+def seat_bot(room, strategy_name):
+    number = 1
+    while f"Bot{number}" in clients:
+        number += 1
+    bot_name = f"Bot{number}"
+    clients[bot_name] = BotConnection(bot_name)
+    with room.lock:
+        room.bots[bot_name] = strategy_name
+        join_room(bot_name, room.name)
+    return bot_name
+
+def is_lobby(room):
+    # With matchmaking on, the default room is where the queue waits. Nobody
+    # is told about joins and leaves there; with thousands queued that would
+    # be a broadcast to all of them per arrival.
+    return matchmaker is not None and room.name == DEFAULT_ROOM
+
+def queue_player(username):
+    # Put a player in the lobby queue; start their table if that filled it
+    table = matchmaker.join(username, ratings.get(username, matchmaking.DEFAULT_RATING))
+    if table is not None:
+        form_table(table)
+        return
+    send_to_client(clients[username], f"You are in the queue for a {MATCH_SIZE}-player table.", 'text')
+    queued_at = matchmaker.queued_at(username)
+    timer_heap.schedule(MATCH_WAIT, lambda: match_timeout(username, queued_at))
+
+def match_timeout(username, queued_at):
+    # Waited MATCH_WAIT: take whoever is around and fill the rest with bots
+    if matchmaker.queued_at(username) != queued_at:
+        return  # Seated, gone, or queued again since
+    table = matchmaker.take_waiting(username)
+    if table:
+        form_table(table)
+
+def form_table(usernames):
+    # Seat a group from the queue in a new room and start their game
+    name = f"match{next(match_numbers)}"
+    while rooms.get(name) is not None or not owns(name):
+        name = f"match{next(match_numbers)}"
+    for username in usernames:
+        join_room(username, name)
+    room = rooms.get(name)
+    matched_rooms.add(room)
+    tables_formed.inc()
+    for _ in range(MATCH_SIZE - len(usernames)):
+        seat_bot(room, 'heuristic')
+    log.info(f"Matched {', '.join(room.members)} into room {name}")
+    with room.lock:
+        start_game(room)
+
+def return_to_lobby(room):
+    # A matched game is over: its players queue for the next one, and the
+    # room goes away with its bots
+    for username in list(room.members):
+        if username in room.bots:
+            continue
         if username in clients:
-            # Close the connection gracefully
-            clients[username].close()
-            del clients[username]
-            # Inform other clients that this user has left
-            broadcast(f"{username} has left the game.", 'text')  # Make sure to specify the message type here
+            if join_room(username, DEFAULT_ROOM):
+                queue_player(username)
+        else:
+            # Still away when the game ended; their seat is gone with it
+            away.pop(username, None)
+            sessions.pop(username, None)
+            timer = away_timers.pop(username, None)
+            if timer is not None:
+                timer.cancel()
+            leave_room(username, room)
+            release_name(username)
+    if rooms.get(room.name) is room:
+        close_room(room.name)
+
+def list_rooms(client_socket):
+    lines = [repr(room) for room in rooms.list()] or ["No rooms yet."]
+    send_to_client(client_socket, "Rooms:\n" + "\n".join(lines), 'text')
 
-def is_valid_play(message):
-    # Assuming a valid play message is "PLAY <Color> <Value>"
-    parts = message.split()
-    if len(parts) != 3:
+def register_username(client_socket, username, room_name=None):
+    # Try to seat a new player under the given username, in room_name if the
+    # client asked for one before logging in. Returns True when the username
+    # was accepted, otherwise tells the client why and returns False.
+    if username in clients or username in sessions:
+        # A held seat counts as taken: only its session token gets it back
+        send_to_client(client_socket, "Username has been taken, please choose another", 'text')
+        return False
+    if not username:
+        send_to_client(client_socket, "Invalid username; username cannot be blank.", 'text')
         return False
-    color, value = parts[1], parts[2]
-    # Define the valid colors and values based on your game rules
-    valid_colors = ['Red', 'Yellow', 'Green', 'Blue', 'Black']
-    valid_values = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'Skip', 'Reverse', 'Draw Two', 'Wild', 'Wild Draw Four']
-    return color in valid_colors and value in valid_values
 
+    if username in away:
+        resume_seat(client_socket, username)
+        return True
+
+    clients[username] = client_socket
+    report_name(router.NAME_TAKEN, username)
+    room = seat_new_player(username, room_name)
+    if room is None:
+        return True  # Handed on to the worker that owns the room
+    if is_lobby(room):
+        send_to_client(client_socket, "Welcome to the game! Your game starts as soon as a table is ready.", 'text')
+        issue_session(client_socket, username)
+        queue_player(username)
+        return True
+    send_to_client(client_socket, "Welcome to the game! When all players have joined, the host will start the game.", 'text')
+    if room.name != (room_name or DEFAULT_ROOM):
+        send_to_client(client_socket, f"Room {room_name or DEFAULT_ROOM} is already playing, so you are waiting in room {room.name}.", 'text')
+    issue_session(client_socket, username)
+    return True
+
+def seat_new_player(username, room_name=None):
+    # Everyone lands in the room they asked for, or else the default room, so
+    # the plain client just works. While its game is running, newcomers wait
+    # in the next room that isn't (main2, main3, ...) instead of being left
+    # in no room at all. Returns None if the player was handed to another
+    # worker.
+    if room_name and room_name != DEFAULT_ROOM:
+        room = rooms.get(room_name)
+        if (room is None or not room.started) and join_room(username, room_name):
+            return client_rooms.get(username)
+    for number in itertools.count(1):
+        name = DEFAULT_ROOM if number == 1 else f"{DEFAULT_ROOM}{number}"
+        room = rooms.get(name)
+        if (room is not None and room.started) or (number > 1 and not owns(name)):
+            continue
+        if join_room(username, name):
+            return client_rooms.get(username)
+
+def issue_session(client_socket, username):
+    token = sessions.get(username) or secrets.token_hex(16)
+    if WORKER_INDEX is not None and username not in sessions:
+        token = f"{WORKER_INDEX}.{token}"  # The router sends a RESUME back here
+    sessions[username] = token
+    client_socket.sendall(encode_frame(b'SESSION:' + token.encode('ascii')))
+
+def resume_session(client_socket, message):
+    # "RESUME <token> <hand seq> <hand checksum> <username>" (the username
+    # goes last as it may contain spaces). Returns the username if the seat
+    # was taken back, otherwise None.
+    parts = message.split(maxsplit=4)
+    if len(parts) != 5 or not parts[2].isdigit() or not parts[3].isdigit():
+        send_to_client(client_socket, "Malformed RESUME.", 'text')
+        return None
+    token, username = parts[1], parts[4]
+    expected = sessions.get(username)
+    if expected is None or username not in away or not secrets.compare_digest(expected, token):
+        send_to_client(client_socket, "Your session has expired; please log in again.", 'text')
+        return None
+    resume_seat(client_socket, username, int(parts[2]), int(parts[3]))
+    return username
+
+def hold_seat(username, room):
+    # The player's connection dropped mid-game: keep everything as it is and
+    # give them SESSION_GRACE seconds to come back
+    away[username] = room
+    timer = timer_heap.schedule(SESSION_GRACE, lambda: release_seat(username, room, timer))
+    away_timers[username] = timer
+    broadcast(room, f"{username} lost connection; holding their seat for {SESSION_GRACE:g} seconds.", 'text')
+
+def release_seat(username, room, timer):
+    # Grace window over without a resume: the player leaves for good
+    if away_timers.get(username) is not timer:
+        return  # They came back (and maybe dropped again) in the meantime
+    del away_timers[username]
+    away.pop(username, None)
+    sessions.pop(username, None)
+    release_name(username)
+    with room.lock:
+        leave_room(username, room)
+
+def resume_seat(client_socket, username, hand_seq=None, checksum=None):
+    # Give a player their held or recovered seat back. A client resuming a
+    # session says how far its delta hand mirror got; if that still matches
+    # the hand, numbering just carries on and no HSYNC is sent.
+    room = away.pop(username)
+    timer = away_timers.pop(username, None)
+    if timer is not None:
+        timer.cancel()
+    clients[username] = client_socket
+    client_rooms[username] = room
+    with room.lock:
+        game = room.game
+        hand = game.player_hands[username]
+        send_to_client(client_socket, f"Welcome back, {username}! Your seat in room {room.name} is as you left it.", 'text')
+        issue_session(client_socket, username)
+        if (client_codecs.get(client_socket) == 'delta' and checksum is not None
+                and checksum == hand_checksum(hand)):
+            hand_seqs[client_socket] = hand_seq
+        else:
+            send_hand(client_socket, hand)
+        if game.top_card is not None:
+            send_to_client(client_socket, f"Top card: {game.top_card}", 'text')
+        if game.wild_color is not None:
+            send_to_client(client_socket, f"The color is now {game.wild_color}.", 'text')
+        if room.started:
+            current_player = game.get_current_player()
+            if current_player == username:
+                send_to_client(client_socket, f"It's your turn to play.", 'text')
+            else:
+                send_to_client(client_socket, f"It's {current_player}'s turn.", 'text')
+            send_turn_notification(client_socket, current_player)
+        broadcast(room, f"{username} is back.", 'text', username)
+
+def watch_room(client_socket, room_name):
+    # Subscribe a spectator to a room's public stream, leaving the one it
+    # was watching before
+    if not owns(room_name):
+        stop_watching(client_socket)
+        handoffs[client_socket] = handshake_of(client_socket) + encode_frame(f"WATCH {room_name}".encode('utf-8'))
+        return
+    room = rooms.get(room_name)
+    if room is None:
+        send_to_client(client_socket, f"No room named {room_name}.", 'text')
+        return
+    stop_watching(client_socket)
+    with room.lock:
+        watching[client_socket] = room
+        send_to_client(client_socket, f"You are now watching room {room.name}.", 'text')
+        room.feed.subscribe(client_socket)
+
+def stop_watching(client_socket):
+    room = watching.pop(client_socket, None)
+    if room is not None:
+        with room.lock:
+            room.feed.unsubscribe(client_socket)
+
+def release_spectator_events():
+    # With a spectator delay this runs on a short tick of the timer heap
+    now = time.monotonic()
+    for room in rooms.list():
+        if room.feed.pending:
+            with room.lock:
+                room.feed.release_due(now)
+    timer_heap.schedule(SPECTATOR_TICK, release_spectator_events)
+
+def start_spectator_pump():
+    if SPECTATOR_DELAY > 0:
+        timer_heap.schedule(SPECTATOR_TICK, release_spectator_events)
 
-def handle_client(client_socket, client_address):
+def watch_idle(client_socket):
+    # Start the idle check for a new connection. It reschedules itself from
+    # the time of the connection's last frames rather than being pushed back
+    # on every read, so a busy client costs one dict write per read.
+    last_seen[client_socket] = (time.monotonic(), None)
+    first_check = min(LOGIN_TIMEOUT, IDLE_TIMEOUT) if IDLE_TIMEOUT > 0 else LOGIN_TIMEOUT
+    timer_heap.schedule(first_check, lambda: check_idle(client_socket))
+
+def check_idle(client_socket):
+    entry = last_seen.get(client_socket)
+    if entry is None or client_socket in watching:
+        return  # Gone, or a spectator
+    seen, username = entry
+    # LOGIN_TIMEOUT is for connections that never speak the protocol. A
+    # client that has sent CODECS may be waiting on a person typing a name,
+    # so it gets the same limit as a player.
+    limit = LOGIN_TIMEOUT if username is None and client_socket not in client_codecs else IDLE_TIMEOUT
+    if limit <= 0:
+        return
+    room = client_rooms.get(username) if username is not None else None
+    if room is not None and not room.started:
+        # The client has nothing to send until the game starts (the host's /s
+        # or a table filling up), so waiting for it doesn't count as idle
+        seen = time.monotonic()
+        last_seen[client_socket] = (seen, username)
+    idle = time.monotonic() - seen
+    if idle < limit:
+        timer_heap.schedule(limit - idle, lambda: check_idle(client_socket))
+        return
+    idle_reaped.inc()
+    log.info(f"Disconnecting {username or client_socket.getpeername()} after {idle:.0f}s idle")
+    send_to_client(client_socket, "Disconnected for being idle.", 'text')
+    client_socket.shutdown()  # Its reader sees EOF and runs the normal disconnect
+
+def recover_games():
+    # Bring back the games journaled before the last shutdown or crash
+    for name, game, room_bots in store.recover():
+        room = rooms.restore(name, game, room_bots)
+        for username in room.members:
+            if username in room.bots:
+                clients[username] = BotConnection(username)
+                client_rooms[username] = room
+            else:
+                away[username] = room
+                report_name(router.NAME_TAKEN, username)
+        with coalesce():
+            announce_turn(room)  # Gets any bot whose turn it is thinking again
+
+def forget_room(room):
+    # RoomManager callback for a room that is gone
+    end_game(room)
+    for username in [username for username, seat in away.items() if seat is room]:
+        del away[username]
+        sessions.pop(username, None)
+        timer = away_timers.pop(username, None)
+        if timer is not None:
+            timer.cancel()
+        release_name(username)
+    matched_rooms.discard(room)
+    for client_socket in list(room.feed.watchers):
+        del watching[client_socket]
+        send_to_client(client_socket, f"Room {room.name} has closed.", 'text')
+    room.feed.watchers.clear()
+
+rooms.on_close = forget_room
+
+def room_of(username):
+    # The player's room, or None (after telling them) if they aren't in one
+    room = client_rooms.get(username)
+    if room is None:
+        send_to_client(clients[username], "You aren't in a room; use /join <room name>.", 'text')
+    return room
+
+def command_rooms(username, command):
+    list_rooms(clients[username])
+
+def command_join(username, command):
+    if command.arg:
+        join_room(username, command.arg)
+    else:
+        send_to_client(clients[username], "Usage: /join <room name>", 'text')
+
+def command_queue(username, command):
+    # Back into the matchmaking queue from whatever room they are in
+    if matchmaker is None:
+        send_to_client(clients[username], "Matchmaking is off on this server; use /join.", 'text')
+        return
+    room = client_rooms.get(username)
+    if (room is None or not is_lobby(room)) and not join_room(username, DEFAULT_ROOM):
+        return
+    if username not in clients:
+        return  # Handed to another worker
+    if matchmaker.queued_at(username) is None:
+        queue_player(username)
+    else:
+        send_to_client(clients[username], "You are already in the queue.", 'text')
+
+def command_resync(username, command):
+    # The client's mirror of its hand drifted; send the full hand
+    room = room_of(username)
+    if room is None:
+        return
+    with room.lock:
+        send_hand(clients[username], room.game.player_hands.get(username, []))
+
+def command_draw(username, command):
+    room = room_of(username)
+    if room is None:
+        return
+    with room.lock:
+        if not room.started:
+            send_to_client(clients[username], "The game hasn't started yet.", 'text')
+        elif room.game.get_current_player() != username:
+            send_to_client(clients[username], "It's not your turn.", 'text')
+        else:
+            handle_draw_card(room, username)
+
+def command_play(username, command):
+    room = room_of(username)
+    if room is None:
+        return
+    with room.lock:
+        if not room.started:
+            send_to_client(clients[username], "The game hasn't started yet.", 'text')
+        elif command.card is None:
+            # Not a card at all, e.g. "Red Wild" or "Purple 4"
+            send_to_client(clients[username], "Invalid card format. Try again.", 'text')
+            prompt_again(room, username)
+        else:
+            handle_play_card(room, username, command.card, command.color)
+
+def command_chat(username, command):
+    room = room_of(username)
+    if room is None:
+        return
+    with room.lock:
+        broadcast(room, f"{username}: {command.arg}", 'text', username)
+
+def command_ignore(username, command):
+    pass  # Handshake frames repeated after login
+
+COMMAND_HANDLERS = {
+    commands.CHAT: command_chat,
+    commands.PLAY: command_play,
+    commands.DRAW: command_draw,
+    commands.RESYNC: command_resync,
+    commands.ROOMS: command_rooms,
+    commands.JOIN: command_join,
+    commands.QUEUE: command_queue,
+    commands.CODECS: command_ignore,
+    commands.RESUME: command_ignore,
+    commands.WATCH: command_ignore,  # Only before logging in
+}
+
+def handle_command(username, message):
+    # Process one command from a connected player
+    command = commands.parse(message)
+    COMMAND_HANDLERS[command.op](username, command)
+
+def handle_disconnect(username):
+    # Cleanup and inform other players if a client disconnects
+    clients.pop(username, None)
+    room = client_rooms.pop(username, None)
+    if room is None:
+        sessions.pop(username, None)
+    else:
+        with room.lock:
+            if room.started and username in room.game.players and username in sessions:
+                hold_seat(username, room)
+            else:
+                sessions.pop(username, None)
+                leave_room(username, room)
+    release_name(username)
+
+def handle_frames(client_socket, username, frames):
+    # Process every complete frame from one read. The first accepted frame is
+    # the username; everything after that is a command. Returns the username
+    # once the player is registered, None until then. All replies to one read
+    # are coalesced into a single write per client. Once the connection is
+    # being handed to another worker, the rest of its frames go with it.
+    commands_in.inc(len(frames))
+    with coalesce():
+        for frame in frames:
+            message = frame.decode('utf-8').strip()
+            if client_socket in handoffs:
+                handoffs[client_socket] += encode_frame(frame)
+            elif username is None and message.startswith('WATCH '):
+                watch_room(client_socket, message[6:].strip())
+            elif client_socket in watching:
+                pass  # Spectators are read-only
+            elif username is None and message.startswith('CODECS'):
+                negotiate_codec(client_socket, message)
+            elif username is None and message.startswith('RESUME '):
+                username = resume_session(client_socket, message)
+            elif username is None and message.startswith('/join '):
+                joining[client_socket] = message[6:].strip()
+            elif username is None:
+                if register_username(client_socket, message, joining.get(client_socket)):
+                    username = message
+            elif username in clients:
+                handle_command(username, message)
+    last_seen[client_socket] = (time.monotonic(), username)
+    return username
+
+def handle_client(raw_socket, client_address, handshake=b''):
     global clients
-    print(f"Connection attempt from {client_address}")
+    log.info(f"Connection attempt from {client_address}")
     username = None
+    decoder = FrameDecoder(MAX_COMMAND_SIZE)
+    active_connections.inc()
+    # Everything sent to this client goes through its queue and writer thread
+    client_socket = OutboundQueue(raw_socket)
+    watch_idle(client_socket)
 
     try:
-        while True:
-            username = client_socket.recv(1024).decode('utf-8').strip()
-            if username in clients:
-                send_to_client(client_socket, "Username has been taken, please choose another", 'text')
-                continue  # Wait for the user to enter another username
-            if not username:
-                send_to_client(client_socket, "Invalid username; username cannot be blank.", 'text')
-                continue  # Wait for the user to enter another username
-
-            clients[username] = client_socket
-            game.add_player(username)  # Add the new player to the Game
-            print(f"Connection established with {username} from {client_address}")
-            broadcast(f"{username} has joined the game.", 'text')
-            send_to_client(client_socket, "Welcome to the game! When all players have joined, the host will start the game.", 'text')
-            break  # Exit the loop as a valid username has been set
-
-        # Main loop to receive messages from this client
-        while True:
-            # Receives a message
-            received_data = client_socket.recv(1024)
-            if not received_data:
-                break  # If no message, assume the client disconnected
-
-            message = received_data.decode('utf-8').strip()
-            
-            if message.startswith('DRAW') and game.get_current_player() == username:
-                handle_draw_card(username)            
-            elif message.startswith('PLAY'): 
-                if is_valid_play(message):
-                    # Here you can process the card play because it's a valid format
-                    card_info = message.split()
-                    card_color, card_value = card_info[1], card_info[2]
-                    card_to_play = Card(card_color, card_value)
-                    handle_play_card(username, card_to_play)
-                else:
-                    # This is where you tell the client that the play is invalid
-                    send_to_client(client_socket, "Invalid card format. Try again.", 'text')
-            else:
-                broadcast(f"{username}: {message}",'text', username)
+        # Main loop to receive messages from this client. One recv may carry
+        # several frames, or only part of one. `handshake` is whatever the
+        # router already read from the client before passing it to us.
+        received_data = handshake or raw_socket.recv(RECV_SIZE)
+        while received_data:
+            bytes_in.inc(len(received_data))
+            was_registered = username is not None
+            username = handle_frames(client_socket, username, decoder.feed(received_data))
+            if username is not None and not was_registered:
+                log.info(f"Connection established with {username} from {client_address}")
+            if client_socket in handoffs:
+                # Bound for another worker: finish writing what it was sent,
+                # then the router gets the socket and whatever is still unread
+                handshake = handoffs.pop(client_socket) + bytes(decoder.buffer)
+                if client_socket.detach():
+                    hand_off(raw_socket, handshake)
+                break
+            received_data = raw_socket.recv(RECV_SIZE)
     except ConnectionResetError:
-        print(f"Connection lost with {username or client_address} unexpectedly.")
+        log.info(f"Connection lost with {username or client_address} unexpectedly.")
     except Exception as e:
-        print(f"An exception occurred with {username or client_address}: {e}")
+        log.warning(f"An exception occurred with {username or client_address}: {e}")
     finally:
-        # Cleanup and inform other players if a client disconnects
-        if username and username in clients:
-            clients.pop(username, None)
-            broadcast(f"{username} has left the game.", 'text')
-            # If a disconnect occurs during the game, handle any necessary game state adjustments here
-
-        if username in game.players:
-            game.players.remove(username)
-            # Also remove from players_drawn if using that to track who has drawn a card
-            if username in game.players_drawn:
-                del game.players_drawn[username]
-        
+        if clients.get(username) is client_socket:
+            with coalesce():
+                handle_disconnect(username)
+        stop_watching(client_socket)
+        handoffs.pop(client_socket, None)
+        joining.pop(client_socket, None)
+        last_seen.pop(client_socket, None)
+        client_codecs.pop(client_socket, None)
+        hand_seqs.pop(client_socket, None)
+        active_connections.dec()
         client_socket.close()
-        print(f"Connection closed for {username or client_address}")
+        log.info(f"Connection closed for {username or client_address}")
 
 
-def handle_draw_card(player_name):
+@metrics.timed('uno_handle_draw_card_seconds')
+def handle_draw_card(room, player_name, reprompt=True):
+    # reprompt=False always passes after the draw, for a turn played for
+    # someone who ran out of time
+    game = room.game
+    client_socket = clients.get(player_name, AWAY)
     # If it's the first turn and the current player is trying to draw, stop them
     if game.top_card is None and game.get_current_player() == game.players[0]:
-        send_to_client(clients[player_name], "You shall not pass on the first turn!", 'text')
-        send_to_client(clients[player_name], f"It's your turn to play.", 'text')
+        send_to_client(client_socket, "You shall not pass on the first turn!", 'text')
+        send_to_client(client_socket, f"It's your turn to play.", 'text')
+        send_turn_notification(client_socket, player_name)
+        return
+
+    # Owed cards from a Draw Two / Wild Draw Four: take them all, turn over
+    if game.pending_draw:
+        drawn_cards = game.take_penalty(player_name)
+        send_to_client(client_socket, f"You drew: {', '.join(map(str, drawn_cards))}", 'text')
+        for drawn_card in drawn_cards:
+            send_hand_change(client_socket, game.player_hands[player_name], 'add', drawn_card)
+        broadcast(room, f"{player_name} drew {len(drawn_cards)} cards.", 'text', player_name)
+        publish(room, f"{player_name} drew {len(drawn_cards)} cards.")
+        announce_turn(room)
         return
 
     # If the player has already drawn a card during their turn, skip them
     if game.players_drawn[player_name]:
-        send_to_client(clients[player_name], "You have already drawn a card. Turn moves to next player.", 'text')
+        send_to_client(client_socket, "You have already drawn a card. Turn moves to next player.", 'text')
         game.advance_to_next_player()
-        announce_turn()
+        announce_turn(room)
         return
 
     # Draw a card and announce it to the player
     drawn_card = game.draw_card(player_name)
-    send_to_client(clients[player_name], f"You drew: {drawn_card}", 'text')
-    send_hand(clients[player_name], game.player_hands[player_name])  # Send updated hand
+    send_to_client(client_socket, f"You drew: {drawn_card}", 'text')
+    if drawn_card is not None:
+        publish(room, f"{player_name} drew a card.")
+    if drawn_card is not None:
+        send_hand_change(client_socket, game.player_hands[player_name], 'add', drawn_card)  # Send updated hand
 
     # Allow the player to decide if they want to play if they have a playable card
-    if any(game.can_play_card(player_name, card) for card in game.player_hands[player_name]):
-        send_to_client(clients[player_name], f"It's your turn to play.", 'text')
+    if reprompt and game.has_legal_move(player_name):
+        send_to_client(client_socket, f"It's your turn to play.", 'text')
+        send_turn_notification(client_socket, player_name)
     else:
         # Player doesn't have a playable card or chooses to pass after draw, move to the next player
         game.advance_to_next_player()
-        announce_turn()
+        announce_turn(room)
 
 
 # Function to accept new connections
@@ -275,54 +1166,178 @@ def accept_connections(server_socket):
             thread = threading.Thread(target=handle_client, args=(client_socket, client_address))
             thread.start()
         except Exception as e:
-            print(f"Error accepting new connections: {e}")
+            log.error(f"Error accepting new connections: {e}")
             break
 
 
-def server_input_handler():
-    while True:
-        cmd = input("Enter '/s' to begin: ")  # Prompt for the command
-        if cmd.lower() == '/s':
-            if len(clients) >= 2:
-                start_game()
-            else:
-                print("At least two players are needed to start the game.")
-        # No 'else' block that leads to server shutdown or 'break' statement
+class BotConnection:
+    # Stands in for a socket so bots can sit in `clients` like anyone else.
+    # Bots read the game state directly, so whatever is sent is dropped.
+    def __init__(self, bot_name):
+        self.bot_name = bot_name
 
-# Main function to start the server
-def start_server(host, port):
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((host, port))
-    server_socket.listen(5)
-    print(f"Server listening on {host}:{port}")
+    def send(self, data):
+        return len(data)
+
+    def sendall(self, data):
+        pass
+
+    def getpeername(self):
+        return ('bot', self.bot_name)
+
+    def close(self):
+        pass
+
+# Stands in for a player whose seat is held while they are disconnected, so
+# their turn can be played for them when it times out
+AWAY = BotConnection('away')
+
+
+async def handle_client_async(reader, writer, handshake=b''):
+    # Same flow as handle_client, but every connection is a coroutine on one
+    # event loop. All handlers run on the loop thread, so game mutations are
+    # serialized without any locking.
+    client_socket = StreamConnection(writer)
+    client_address = client_socket.getpeername()
+    log.info(f"Connection attempt from {client_address}")
+    username = None
+    decoder = FrameDecoder(MAX_COMMAND_SIZE)
+    active_connections.inc()
+    watch_idle(client_socket)
 
     try:
-        accept_connections(server_socket)
+        received_data = handshake or await reader.read(RECV_SIZE)
+        while received_data:
+            bytes_in.inc(len(received_data))
+            was_registered = username is not None
+            username = handle_frames(client_socket, username, decoder.feed(received_data))
+            if username is not None and not was_registered:
+                log.info(f"Connection established with {username} from {client_address}")
+            if client_socket in handoffs:
+                # As in handle_client; the stream may already hold more input
+                writer.transport.pause_reading()
+                reader.feed_eof()
+                handshake = handoffs.pop(client_socket) + bytes(decoder.buffer) + await reader.read()
+                if await client_socket.detach():
+                    hand_off(writer.get_extra_info('socket'), handshake)
+                break
+            received_data = await reader.read(RECV_SIZE)
+    except ConnectionResetError:
+        log.info(f"Connection lost with {username or client_address} unexpectedly.")
+    except Exception as e:
+        log.warning(f"An exception occurred with {username or client_address}: {e}")
     finally:
-        server_socket.close()
+        if clients.get(username) is client_socket:
+            with coalesce():
+                handle_disconnect(username)
+        stop_watching(client_socket)
+        handoffs.pop(client_socket, None)
+        joining.pop(client_socket, None)
+        last_seen.pop(client_socket, None)
+        client_codecs.pop(client_socket, None)
+        hand_seqs.pop(client_socket, None)
+        active_connections.dec()
+        client_socket.close()
+        log.info(f"Connection closed for {username or client_address}")
 
 
-def get_local_ip():
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
+def start_waiting_rooms(room_name=None):
+    # '/s' starts every room that is waiting and has enough players;
+    # '/s <room>' starts just that one. The matchmaking lobby is never
+    # started: it holds everyone queued, however many that is.
+    if room_name:
+        room = rooms.get(room_name)
+        targets = [room] if room is not None else []
+        if not targets:
+            print(f"No room named {room_name}.")
+        elif is_lobby(room):
+            print(f"Room {room_name} is the matchmaking lobby; its players are seated as tables fill.")
+            targets = []
+    else:
+        targets = [room for room in rooms.list() if not room.started and not is_lobby(room)]
+    for room in targets:
+        with room.lock:
+            if room.started:
+                print(f"Room {room.name} is already playing.")
+            elif len(room.members) < 2:
+                print(f"Room {room.name}: at least two players are needed to start the game.")
+            else:
+                start_game(room)
 
-        return local_ip
-    except Exception as e:
-        print("Không thể lấy địa chỉ IP:", e)
-        return None
+def close_room(room_name):
+    for username in rooms.close(room_name):
+        client_rooms.pop(username, None)
+        if isinstance(clients.get(username), BotConnection):
+            del clients[username]
+        elif username in clients:
+            send_to_client(clients[username], f"Room {room_name} was closed by the host.", 'text')
+            clients[username].shutdown()  # Hangs up after the notice; their reader then cleans up
 
+def server_input_handler():
+    while True:
+        cmd = input("Enter '/s' to begin: ").strip()  # Prompt for the command
+        run_console_command(cmd)
 
-if __name__ == "__main__":
-    HOST = get_local_ip()
-    PORT = 65432
+def run_console_command(cmd):
+    # One operator command, typed here or forwarded by the router
+    parts = cmd.split()
+    if not parts:
+        return
+    name = cmd.split(maxsplit=1)[1] if len(parts) > 1 else None
+    if parts[0].lower() == '/s':
+        call_on_server(lambda name=name: start_waiting_rooms(name))
+    elif parts[0].lower() == '/stats':
+        print(metrics.summary())
+    elif parts[0].lower() == '/rooms':
+        for room in rooms.list():
+            print(room)
+    elif parts[0].lower() == '/close' and name:
+        call_on_server(lambda name=name: close_room(name))
+    elif parts[0].lower() == '/bot':
+        # /bot [room] [strategy]
+        room_name = parts[1] if len(parts) > 1 else DEFAULT_ROOM
+        strategy_name = parts[2] if len(parts) > 2 else 'heuristic'
+        if strategy_name not in bots.STRATEGIES:
+            print(f"Unknown bot strategy {strategy_name}; choose from {', '.join(bots.STRATEGIES)}.")
+        else:
+            call_on_server(lambda room_name=room_name, strategy_name=strategy_name: add_bot(room_name, strategy_name))
+
+
+async def start_async_server(host, port):
+    global server_loop
+    server = await asyncio.start_server(handle_client_async, host, port)
+    print(f"Server listening on {host}:{port} (asyncio)")
+
+    server_loop = asyncio.get_running_loop()
+    if store is not None:
+        recover_games()
+    start_spectator_pump()
+    server_input_thread = threading.Thread(target=server_input_handler, daemon=True)
+    server_input_thread.start()
 
+    async with server:
+        await server.serve_forever()
+
+
+def run_async_server(host, port):
+    try:
+        asyncio.run(start_async_server(host, port))
+    except KeyboardInterrupt:
+        print("Server shut down by keyboard interrupt.")
+    finally:
+        print("Shutting down the server.")
+
+
+def run_threaded_server(host, port):
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((HOST, PORT))
+    # Rebind straight away after a restart, while old connections sit in TIME_WAIT
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((host, port))
     server_socket.listen(5)
-    print(f"Server listening on {HOST}:{PORT}")
+    print(f"Server listening on {host}:{port}")
+    if store is not None:
+        recover_games()
+    start_spectator_pump()
 
     accept_thread = threading.Thread(target=accept_connections, args=(server_socket,))
     accept_thread.start()
@@ -342,4 +1357,162 @@ if __name__ == "__main__":
             client.close()
         server_socket.close()
 
-# Corrected the structure of the server's main loop.
+
+def receive_connections(serve):
+    # Worker side of the control socket: sockets the router passes over, and
+    # console commands typed at the router. serve(sock, handshake) takes over
+    # each connection.
+    while True:
+        message, fds, _, _ = socket.recv_fds(control_socket, router.MAX_CONTROL_MESSAGE, 1)
+        if not message:
+            log.error("Router went away; shutting down this worker.")
+            os._exit(1)
+        kind, body = message[:1], message[1:]
+        if kind == router.CONNECTION and fds:
+            serve(socket.socket(fileno=fds[0]), body)
+        elif kind == router.CONSOLE:
+            run_console_command(body.decode('utf-8'))
+
+def start_worker_threaded():
+    def serve(client_socket, handshake):
+        client_socket.setblocking(True)  # The router keeps the sockets it reads from non-blocking
+        thread = threading.Thread(target=handle_client, args=(client_socket, client_socket.getpeername(), handshake))
+        thread.start()
+    if store is not None:
+        recover_games()
+    start_spectator_pump()
+    receive_connections(serve)
+
+async def start_worker_async():
+    global server_loop
+    server_loop = asyncio.get_running_loop()
+
+    async def serve_passed(client_socket, handshake):
+        reader, writer = await asyncio.open_connection(sock=client_socket)
+        await handle_client_async(reader, writer, handshake)
+
+    def serve(client_socket, handshake):
+        asyncio.run_coroutine_threadsafe(serve_passed(client_socket, handshake), server_loop)
+
+    if store is not None:
+        recover_games()
+    start_spectator_pump()
+    await server_loop.run_in_executor(None, receive_connections, serve)
+
+def worker_command(args):
+    # This script's command line minus --workers, with the bot processes
+    # split between the workers
+    argv = sys.argv[1:]
+    for i, arg in enumerate(argv):
+        if arg == '--workers':
+            del argv[i:i + 2]
+            break
+        if arg.startswith('--workers='):
+            del argv[i]
+            break
+    argv += ['--bot-workers', str(max(1, args.bot_workers // args.workers))]
+    return [sys.executable, os.path.abspath(__file__), *argv]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UNO LAN server")
+    parser.add_argument('--host', default='0.0.0.0', help="address to bind (defaults to every interface)")
+    parser.add_argument('--port', type=int, default=65432)
+    parser.add_argument('--name', default=socket.gethostname(), help="server name clients see when they look for games")
+    parser.add_argument('--beacon-port', type=int, default=discovery.DISCOVERY_PORT,
+                        help="UDP port to announce this server on so clients find it by themselves (0 to stay quiet)")
+    parser.add_argument('--asyncio', action='store_true',
+                        help="serve every connection from one asyncio event loop instead of one thread per client")
+    parser.add_argument('--bot-workers', type=int, default=bot_workers,
+                        help="worker processes that compute bot moves")
+    parser.add_argument('--bot-budget', type=float, default=BOT_MOVE_BUDGET,
+                        help="seconds a bot may think about one move")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="serve plain-text metrics over HTTP on this local port (worker i of --workers uses port + i)")
+    parser.add_argument('--log-level', default='INFO',
+                        help="DEBUG logs every message sent and card dealt")
+    parser.add_argument('--data-dir', default=None,
+                        help="journal running games here and restore them on startup")
+    parser.add_argument('--grace', type=float, default=SESSION_GRACE,
+                        help="seconds a dropped player's seat is held for them to reconnect")
+    parser.add_argument('--turn-timeout', type=float, default=TURN_TIMEOUT,
+                        help="seconds a player has for each move before it is played for them (0 for no limit)")
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help="disconnect players who send nothing for this many seconds (0 to never)")
+    parser.add_argument('--match-size', type=int, default=MATCH_SIZE,
+                        help="start games automatically by queueing players into tables of this size")
+    parser.add_argument('--match-wait', type=float, default=MATCH_WAIT,
+                        help="seconds a queued player waits before empty seats are filled with bots")
+    parser.add_argument('--match-rating-band', type=float, default=MATCH_RATING_BAND,
+                        help="match players whose ratings fall in bands this wide (0 ignores ratings)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="run a router plus this many worker processes, each owning a shard of the rooms")
+    parser.add_argument('--control-fd', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-index', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-count', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed for the deals, so a run can be repeated exactly")
+    parser.add_argument('--record-dir', default=None,
+                        help="save every finished game here for replay.py")
+    parser.add_argument('--watch-delay', type=float, default=SPECTATOR_DELAY,
+                        help="seconds the spectator stream runs behind the game")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+
+    HOST = args.host
+    PORT = args.port
+    if args.beacon_port and args.control_fd is None:
+        try:
+            discovery.Beacon(PORT, args.name, args.beacon_port).start()
+        except OSError as e:
+            log.warning(f"Not announcing this server on the LAN: {e}")
+    if args.workers > 1 and args.control_fd is None:
+        router.run_router(HOST, PORT, args.workers, worker_command(args), shared_lobby=args.match_size > 0,
+                          login_timeout=LOGIN_TIMEOUT, idle_timeout=args.idle_timeout)
+        sys.exit()
+
+    data_dir = args.data_dir
+    metrics_port = args.metrics_port
+    if args.control_fd is not None:
+        # A worker: its own journal directory and metrics port
+        WORKER_INDEX = args.worker_index
+        WORKER_COUNT = args.worker_count
+        control_socket = socket.socket(fileno=args.control_fd)
+        if data_dir:
+            data_dir = os.path.join(data_dir, f"worker{WORKER_INDEX}")
+        if metrics_port:
+            metrics_port += WORKER_INDEX
+    if data_dir:
+        store = persistence.Store(data_dir)
+    if args.seed is not None:
+        # Workers of a sharded server each get their own sequence
+        game_seeds.seed(args.seed if WORKER_INDEX is None else f"{args.seed}/{WORKER_INDEX}")
+    if args.record_dir:
+        record_dir = args.record_dir
+        os.makedirs(record_dir, exist_ok=True)
+    if metrics_port:
+        metrics.serve_metrics(metrics_port)
+        print(f"Metrics on http://127.0.0.1:{metrics_port}/")
+    bot_workers = args.bot_workers
+    SESSION_GRACE = args.grace
+    SPECTATOR_DELAY = args.watch_delay
+    MATCH_SIZE = args.match_size
+    MATCH_WAIT = args.match_wait
+    MATCH_RATING_BAND = args.match_rating_band
+    if MATCH_SIZE:
+        if not 2 <= MATCH_SIZE <= 10:
+            parser.error("--match-size must be between 2 and 10")
+        matchmaker = matchmaking.Matchmaker(MATCH_SIZE, MATCH_RATING_BAND)
+    TURN_TIMEOUT = args.turn_timeout
+    IDLE_TIMEOUT = args.idle_timeout
+    BOT_MOVE_BUDGET = args.bot_budget
+
+    if control_socket is not None:
+        if args.asyncio:
+            asyncio.run(start_worker_async())
+        else:
+            start_worker_threaded()
+    elif args.asyncio:
+        run_async_server(HOST, PORT)
+    else:
+        run_threaded_server(HOST, PORT)
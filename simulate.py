@@ -0,0 +1,198 @@
+# Headless UNO simulator: plays complete games straight on card.Game with no
+# sockets and no printing, for load-testing rule changes and for comparing
+# AI policies against each other.
+#
+#   python simulate.py --games 100000 --players 4 --policies greedy,random --processes 4
+#
+# Every game is shuffled from its own seed, drawn from --seed, so a run
+# with the same seed and process count plays exactly the same games.
+# --record-dir saves stalled games as replay.py records. --engine batch plays
+# thousands of games at once on NumPy arrays (batch.py); with only greedy
+# players it plays exactly the games card.Game would for the same seed.
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+import replay
+from card import CARD_COLOR_INDEX
+from card import Deck
+from card import Game
+
+MAX_TURNS = 500  # A game still running after this many turns counts as stalled
+
+
+# Policies pick one card out of the legal moves: policy(game, player, moves, rng)
+
+def random_policy(game, player_name, moves, rng):
+    return rng.choice(moves)
+
+def greedy_policy(game, player_name, moves, rng):
+    # Hold wilds back for when nothing else fits; otherwise play the card
+    # whose color we hold the most of, so we keep matching next turn, and
+    # prefer action cards over numbers when that's a tie.
+    hand = game.player_hands[player_name]
+    colored = [card for card in moves if card.color != 'Black']
+    if not colored:
+        return moves[0]
+    return max(colored, key=lambda card: (hand.color_counts[CARD_COLOR_INDEX[card.id]], not card.value.isdigit()))
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+}
+
+
+def play_turn(game, player_name, policy, rng):
+    # One turn with the same rules the server enforces: play a legal card if
+    # there is one (stacking on a pending Draw Two / Wild Draw Four counts);
+    # otherwise take the draw penalty, or draw once and play if that made a
+    # move possible, else pass. Returns the card played, or None.
+    if not game.has_legal_move(player_name):
+        if game.pending_draw:
+            game.take_penalty(player_name)
+            return None
+        drawn = game.draw_card(player_name)
+        if drawn is None or not game.has_legal_move(player_name):
+            game.advance_to_next_player()
+            return None
+    card = policy(game, player_name, game.legal_moves(player_name), rng)
+    game.play_card(player_name, card)
+    return card
+
+
+def play_game(policies, rng, max_turns=MAX_TURNS, game=None):
+    # Play one game; policies[i] plays seat i. Returns (winning seat or None
+    # if the game stalled, number of turns taken). Pass a finished Game to
+    # play again on its deck and discard storage; start_game resets it. The
+    # deck's seed comes from rng, so rng decides the whole game.
+    names = [f"p{seat}" for seat in range(len(policies))]
+    if game is None:
+        game = Game(Deck(verbose=False))
+    if game.players != names:
+        game.players = []
+        for name in names:
+            game.add_player(name)
+    game.start_game(rng.getrandbits(64))
+    seats = dict(zip(names, policies))
+
+    # Once the deck and discard pile are used up and a whole round goes by
+    # without anyone playing, nobody can ever move again: call it stalled
+    # right away instead of spinning to max_turns.
+    idle_turns = 0
+    for turn in range(1, max_turns + 1):
+        player_name = game.get_current_player()
+        card = play_turn(game, player_name, seats[player_name], rng)
+        if card is not None:
+            if game.winner is not None:
+                return names.index(game.winner), turn
+            idle_turns = 0
+        elif not game.deck:
+            idle_turns += 1
+            if idle_turns >= len(names):
+                return None, turn
+    return None, max_turns
+
+
+def run_batch(num_games, policy_names, seed, max_turns=MAX_TURNS, record_dir=None, engine='game'):
+    # Worker entry point; returns plain counters so results pickle cheaply
+    if engine == 'batch':
+        return run_vectorized(num_games, policy_names, seed, max_turns, record_dir)
+    rng = random.Random(seed)
+    policies = [POLICIES[name] for name in policy_names]
+    wins = [0] * len(policies)
+    stalled = 0
+    turns = 0
+    game = Game(Deck(verbose=False))
+    for _ in range(num_games):
+        winner, game_turns = play_game(policies, rng, max_turns, game)
+        turns += game_turns
+        if winner is None:
+            stalled += 1
+            if record_dir is not None:
+                replay.save_record(os.path.join(record_dir, f"stalled-{game.seed:016x}.unor"), game)
+        else:
+            wins[winner] += 1
+    return {'games': num_games, 'wins': wins, 'stalled': stalled, 'turns': turns}
+
+
+def run_vectorized(num_games, policy_names, seed, max_turns=MAX_TURNS, record_dir=None):
+    # The same games on the NumPy batch engine (batch.py), imported here so
+    # the rest of the simulator doesn't need numpy
+    import batch
+
+    def save_stalled(games):
+        for index in games.stalled.nonzero()[0]:
+            replay.save_record(os.path.join(record_dir, f"stalled-{games.seeds[index]:016x}.unor"),
+                               games.replay(index))
+
+    return batch.run_games(num_games, policy_names, seed, max_turns, record_dir is not None,
+                           save_stalled if record_dir is not None else None)
+
+
+def simulate(num_games, policy_names, processes=1, seed=None, max_turns=MAX_TURNS, record_dir=None, engine='game'):
+    # Split the games over `processes` workers and merge their counters
+    if seed is None:
+        seed = random.randrange(1 << 30)
+    if record_dir is not None:
+        os.makedirs(record_dir, exist_ok=True)
+    processes = max(1, min(processes, num_games))
+    shares = [num_games // processes + (i < num_games % processes) for i in range(processes)]
+    jobs = [(share, policy_names, seed + i, max_turns, record_dir, engine) for i, share in enumerate(shares)]
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = [run_batch(*jobs[0])]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(run_batch, jobs)
+    elapsed = time.perf_counter() - start
+
+    total = {'games': 0, 'wins': [0] * len(policy_names), 'stalled': 0, 'turns': 0}
+    for result in results:
+        total['games'] += result['games']
+        total['stalled'] += result['stalled']
+        total['turns'] += result['turns']
+        for seat, wins in enumerate(result['wins']):
+            total['wins'][seat] += wins
+    total['seconds'] = elapsed
+    total['seed'] = seed
+    return total
+
+
+def print_report(stats, policy_names):
+    games = stats['games']
+    seconds = stats['seconds']
+    print(f"Played {games} games in {seconds:.2f}s ({games / seconds:,.0f} games/sec, seed {stats['seed']})")
+    print(f"Average game length: {stats['turns'] / games:.1f} turns, stalled: {stats['stalled']}")
+    for seat, name in enumerate(policy_names):
+        wins = stats['wins'][seat]
+        print(f"  seat {seat} ({name}): {wins} wins ({100 * wins / games:.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run UNO games without a server")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--policies', default='random',
+                        help=f"comma separated, cycled over the seats ({', '.join(POLICIES)})")
+    parser.add_argument('--processes', type=int, default=1, help="worker processes to spread the games over")
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--record-dir', default=None, help="save every stalled game here for replay.py")
+    parser.add_argument('--engine', choices=('game', 'batch'), default='game',
+                        help="play on card.Game one game at a time, or on the vectorized engine in batch.py (needs numpy)")
+    args = parser.parse_args()
+
+    names = args.policies.split(',')
+    for name in names:
+        if name not in POLICIES:
+            parser.error(f"unknown policy {name}")
+    if not 2 <= args.players <= 10:
+        parser.error("--players must be between 2 and 10")
+    seat_policies = [names[seat % len(names)] for seat in range(args.players)]
+
+    stats = simulate(args.games, seat_policies, args.processes, args.seed, args.max_turns, args.record_dir,
+                     args.engine)
+    print_report(stats, seat_policies)
@@ -0,0 +1,62 @@
+# Read-only spectator streams.
+#
+# Every room has a Feed: the public side of its game (plays, draws, hand
+# sizes, whose turn it is, never anyone's cards). The server encodes each
+# event once into ready-to-send frames and publishes it; the feed hands the
+# same bytes to every watcher, so a table with hundreds of spectators costs
+# one encoding per event plus one queue append per watcher.
+#
+# With a delay, events wait in the feed until they are `delay` seconds old
+# before anyone sees them, so a spectator sitting next to a player can't
+# relay what is about to happen. The server releases due events for every
+# feed on a short tick of its timer heap.
+#
+# Turn announcements are published as keyframes: each carries the whole
+# public state (top card, color, hand sizes, turn). A new watcher is sent
+# the last released keyframe and everything released after it, so it starts
+# from a complete picture without the feed keeping the whole game.
+
+import collections
+import time
+
+
+class Feed:
+    def __init__(self):
+        self.watchers = {}  # Connection -> None, a dict as an ordered set
+        self.pending = collections.deque()  # (due time, frames, keyframe) not released yet
+        self.recent = []  # Frames released since the last keyframe, for new watchers
+
+    def __len__(self):
+        return len(self.watchers)
+
+    def subscribe(self, connection):
+        if self.recent:
+            connection.sendall(b''.join(self.recent))
+        self.watchers[connection] = None
+
+    def unsubscribe(self, connection):
+        self.watchers.pop(connection, None)
+
+    def publish(self, frames, keyframe=False, delay=0):
+        # frames: one or more encoded frames joined together
+        if delay > 0:
+            self.pending.append((time.monotonic() + delay, frames, keyframe))
+        else:
+            self.release(frames, keyframe)
+
+    def release(self, frames, keyframe):
+        if keyframe:
+            self.recent = [frames]
+        else:
+            self.recent.append(frames)
+        for connection in self.watchers:
+            connection.sendall(frames)
+
+    def release_due(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        pending = self.pending
+        while pending and pending[0][0] <= now:
+            _, frames, keyframe = pending.popleft()
+            self.release(frames, keyframe)
+
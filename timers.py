@@ -0,0 +1,82 @@
+# One scheduler for every timeout in the server: turn deadlines, held seats,
+# idle connections, the spectator delay. Timers sit in a heap ordered by
+# deadline and a single thread sleeps until the earliest one is due, so
+# thousands of pending timers cost one heap entry each rather than a thread
+# or a sleeping task each. Cancelling only marks a timer; the entry is
+# dropped when it reaches the top of the heap.
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+log = logging.getLogger('timers')
+
+
+class Timer:
+    __slots__ = ('deadline', 'callback', 'cancelled')
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerHeap:
+    # dispatch(callback) runs each due callback; the server passes
+    # call_on_server so callbacks land on the thread that owns game state.
+    def __init__(self, dispatch=None):
+        self.heap = []  # (deadline, sequence number, Timer)
+        self.sequence = itertools.count()  # Keeps equal deadlines in order
+        self.dispatch = dispatch or (lambda callback: callback())
+        self.ready = threading.Condition(threading.Lock())
+        self.thread = None
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, delay, callback):
+        # Run callback once, `delay` seconds from now. Returns the Timer.
+        timer = Timer(time.monotonic() + delay, callback)
+        with self.ready:
+            heapq.heappush(self.heap, (timer.deadline, next(self.sequence), timer))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            elif self.heap[0][2] is timer:
+                self.ready.notify()  # New earliest deadline; wake up sooner
+        return timer
+
+    def pop_due(self):
+        # Wait until at least one live timer is due and return all that are
+        heap = self.heap
+        with self.ready:
+            while True:
+                while heap and heap[0][2].cancelled:
+                    heapq.heappop(heap)
+                if not heap:
+                    self.ready.wait()
+                    continue
+                wait = heap[0][0] - time.monotonic()
+                if wait <= 0:
+                    break
+                self.ready.wait(wait)
+            now = time.monotonic()
+            due = []
+            while heap and heap[0][0] <= now:
+                timer = heapq.heappop(heap)[2]
+                if not timer.cancelled:
+                    due.append(timer)
+            return due
+
+    def run(self):
+        while True:
+            for timer in self.pop_due():
+                try:
+                    self.dispatch(timer.callback)
+                except Exception as e:
+                    log.warning(f"Timer callback failed: {e}")